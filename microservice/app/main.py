@@ -1,8 +1,10 @@
+import asyncio
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-import pycuda.driver as cuda
 from app.routes import router
+from app.src.model_registry import registry
+from app.src.session_manager import session_manager
 import torch
 torch.cuda.empty_cache()
 
@@ -16,16 +18,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def _models_loaded(future):
+    # Ошибка загрузки сохраняется в реестре и отдаётся /ready
+    if future.cancelled() or future.exception() is None:
+        return
+    if registry.error is None:
+        registry.error = future.exception()
+    print(f"Фоновая загрузка моделей завершилась ошибкой: {future.exception()!r}")
+
+
 async def startup():
-    global ctx
-    ctx = cuda.Context.attach()
     torch.cuda.empty_cache()
+    # Модели загружаются и прогреваются в фоне, готовность отдаёт /ready.
+    # CUDA контекст pycuda реестр делает текущим сам в каждом потоке моделей
+    app.state.model_loading = asyncio.get_running_loop().run_in_executor(None, registry.load)
+    app.state.model_loading.add_done_callback(_models_loaded)
+    # Лимиты сессий камер и фоновое закрытие неактивных сессий
+    session_manager.load_config()
+    asyncio.create_task(session_manager.run_eviction())
 
 
 async def shutdown():
-    global ctx
-    if ctx is not None:
-        ctx.detach()
+    registry.close()
 
 @app.get("/")
 async def root():
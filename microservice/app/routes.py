@@ -1,106 +1,110 @@
 import asyncio
 import json
-import time
-import base64
-import cv2
-from app.src.webcam_processing import process_frame_and_render, send_websocket_data
-import numpy as np
+from app.src import frame_protocol
+from app.src.camera_session import RESPONSE_MODES
+from app.src.webcam_processing import error_message
 from fastapi import APIRouter, UploadFile, WebSocket, WebSocketDisconnect
-from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from uvicorn.protocols.utils import ClientDisconnected
-from app.src.video_processing import process_video, initialize_components
+from app.src.video_processing import process_video
+from app.src.model_registry import registry
+from app.src.session_manager import CLOSE_POLICY_VIOLATION, session_manager
 
 
 router = APIRouter()
 
-active_connections = {}
-
 @router.websocket("/ws/camera/{model_name}")
-async def camera_websocket_endpoint(websocket: WebSocket, model_name: str):
-    """WebSocket маршрут для обработки видеопотока с фронтенда."""
-    await websocket.accept()
-    active_connections[model_name] = websocket
-    print(f"Клиент подключился к модели: {model_name}")
-
-    components = initialize_components()
-    components["model_name"] = model_name
-
-    frame_count = 0
-    start_time = time.time()
-    timestamp_prev = 0
+async def camera_websocket_endpoint(websocket: WebSocket, model_name: str, response: str = "frame"):
+    """WebSocket маршрут для обработки видеопотока с фронтенда.
 
+    Цикл маршрута только принимает сообщения, инференс выполняет воркер сессии
+    в пуле потоков. Пока воркер занят, новый кадр вытесняет необработанный.
+    Параметр response=keypoints включает ответ только данными людей без кадра JPEG.
+    """
+    await websocket.accept()
+    if response not in RESPONSE_MODES:
+        print(f"Отклонено подключение: неизвестный режим ответа {response}")
+        await websocket.close(code=CLOSE_POLICY_VIOLATION)
+        return
+    session = await session_manager.admit(websocket, model_name)
+    if session is None:
+        return
+    print(f"Клиент подключился к модели: {model_name}, сессия {session.id}")
+
+    worker_task = None
     try:
-        while True:
-            # 1. Принимаем кадр от клиента
-            try:
-                frame_data = await websocket.receive_text()
-                print(f"Получен кадр (первые 50 символов): {frame_data[:50]}...")
-
-                frame_bytes = base64.b64decode(frame_data)
-                np_arr = np.frombuffer(frame_bytes, np.uint8)
-                bgr_frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-
-                if bgr_frame is None:
-                    print("Ошибка: некорректный кадр!")
-                    continue
-
-                print("Кадр успешно декодирован.")
-            except Exception as e:
-                print(f"Ошибка при декодировании данных кадра: {e}")
-                await websocket.send_text(json.dumps({"error": "Invalid frame data"}))
-                continue
-
-            # 2. Обработка кадра
-            try:
-                predictions, render_image = process_frame_and_render(bgr_frame, components)
-                print("Кадр обработан.")
-            except Exception as e:
-                print(f"Ошибка обработки кадра: {e}")
-                await websocket.send_text(json.dumps({"error": "Error processing frame"}))
-                continue
-
-            # 3. Отправляем обработанные данные клиенту каждую секунду
-            timestamp = time.time() - start_time
-            frame_count += 1
+        # Модели общие для всех сессий, для соединения создаются только трекер и классификатор
+        components = await run_in_threadpool(registry.create_components, model_name, True)
+        worker_task = session.start(components, response)
+        del components
 
-            if timestamp - timestamp_prev >= 1:
+        while True:
+            # Принимаем кадр от клиента: бинарное сообщение протокола или base64 текст
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if worker_task.done():
+                # воркер завершился с ошибкой, например при отправке ответа
+                worker_task.result()
+
+            if message.get("bytes") is not None:
                 try:
-                    print(f"Отправка обработанных данных клиенту. Всего кадров: {frame_count}")
-                    await send_websocket_data(websocket, render_image, predictions, timestamp, frame_count)
-                    print("Данные отправлены клиенту.")
-                    timestamp_prev = timestamp
-                except Exception as e:
-                    print(f"Ошибка отправки данных клиенту: {e}")
-                    break
+                    header, payload = frame_protocol.unpack_message(message["bytes"])
+                except frame_protocol.ProtocolError as e:
+                    print(f"Ошибка при разборе сообщения кадра: {e}")
+                    await websocket.send_text(error_message("Invalid frame data"))
+                    continue
+                if header.msg_type != frame_protocol.FRAME_JPEG:
+                    print(f"Ошибка: неожиданный тип сообщения {header.msg_type}")
+                    await websocket.send_bytes(error_message("Expected a JPEG frame", header))
+                    continue
+                session.submit(header, payload)
+            elif message.get("text"):
+                # старые клиенты присылают JPEG в base64, он декодируется в воркере
+                session.submit(None, message["text"])
 
     except WebSocketDisconnect:
-        print(f"Клиент с моделью {model_name} отключился.")
+        print(f"Клиент с моделью {model_name} отключился, сессия {session.id}.")
     except Exception as e:
         print(f"Общая ошибка в обработке WebSocket: {e}")
         await websocket.send_text(json.dumps({"error": str(e)}))
     finally:
-        # Убираем соединение из активных
-        active_connections.pop(model_name, None)
-        print(f"Соединение для модели {model_name} закрыто.")
+        stats = session.stats()
+        session_manager.close(session.id)
+        if worker_task is not None:
+            worker_task.cancel()
+        print(f"Соединение сессии {session.id} закрыто. Статистика сессии: {stats}")
 
 
 @router.get("/ping")
 async def health_check():
     return {"status": "alive"}
 
+@router.get("/ready")
+async def readiness_check():
+    """Возвращает готовность моделей: 200 после прогрева, 503 до него."""
+    status = registry.status()
+    return JSONResponse(status, status_code=200 if registry.is_ready else 503)
+
 @router.get("/api/status")
 async def get_status():
     """Возвращает статус API."""
-    return {
+    status = {
         "status": "running",
-        "active_connections": len(active_connections)
+        "active_connections": len(session_manager),
+        **session_manager.stats(),
     }
+    if registry.scheduler is not None:
+        status["batching"] = registry.scheduler.stats()
+    return status
 
 @router.post("/process_video")
 async def process_video_route(file: UploadFile):
     """Маршрут для обработки загруженного видео."""
     try:
-        processed_video_path, log = process_video(file)
+        # обработка видео занимает минуты, цикл событий остаётся свободным для камер и /ping
+        processed_video_path, log = await run_in_threadpool(process_video, file)
 
         def stream_video_file():
             with open(processed_video_path, "rb") as f:
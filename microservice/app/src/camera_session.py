@@ -0,0 +1,179 @@
+import asyncio
+import base64
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from app.src.webcam_processing import (
+    encode_keypoints_data, encode_log_data, encode_websocket_data, error_message,
+    process_frame_and_render)
+
+# ответ с отрисованным кадром JPEG или только с данными людей для отрисовки на клиенте
+RESPONSE_MODES = ('frame', 'keypoints')
+
+
+class LatestFrameMailbox:
+    """Почтовый ящик на один кадр для одного читателя.
+
+    Новый кадр вытесняет ещё не обработанный, поэтому задержка обработки
+    не растёт, когда клиент присылает кадры быстрее, чем идёт инференс.
+    """
+
+    def __init__(self):
+        self._item = None
+        self._event = asyncio.Event()
+        self.closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, item):
+        if self._item is not None:
+            self.dropped += 1
+        self._item = item
+        self.received += 1
+        self._event.set()
+
+    async def get(self):
+        """Ждёт и забирает последний кадр, None после закрытия."""
+        while self._item is None and not self.closed:
+            self._event.clear()
+            await self._event.wait()
+        if self.closed:
+            return None
+        item, self._item = self._item, None
+        return item
+
+    @property
+    def pending(self):
+        return self._item is not None
+
+    def close(self):
+        """Будит ожидающий get, он вернёт None. Необработанный кадр освобождается."""
+        self.closed = True
+        self._item = None
+        self._event.set()
+
+
+def _rate(times):
+    """Частота событий по временам последних событий, в секундах."""
+    if len(times) < 2 or times[-1] == times[0]:
+        return 0.0
+    return (len(times) - 1) / (times[-1] - times[0])
+
+
+class CameraSessionWorker:
+    """Обработка кадров одной сессии камеры вне цикла событий.
+
+    Приём сообщений кладёт кадры в LatestFrameMailbox, а воркер по одному
+    забирает последний кадр и выполняет декодирование, инференс, отрисовку
+    и кодирование ответа в собственном потоке сессии. Цикл событий остаётся
+    свободным для других камер и /ping, а устаревшие кадры отбрасываются.
+    Общий пул потоков по умолчанию не используется: его размер ограничил бы
+    число одновременно обрабатываемых сессий и размер пачек планировщика.
+
+    В режиме ответа 'keypoints' отрисовка и кодирование JPEG не выполняются:
+    данные людей отправляются для каждого кадра, лог - раз в send_interval секунд.
+    """
+
+    def __init__(self, websocket, components, send_interval=1.0, response_mode='frame'):
+        if response_mode not in RESPONSE_MODES:
+            raise ValueError(f"Неизвестный режим ответа: {response_mode}, доступны {RESPONSE_MODES}")
+        self.websocket = websocket
+        self.components = components
+        self.send_interval = send_interval
+        self.response_mode = response_mode
+        self.mailbox = LatestFrameMailbox()
+        # кадры сессии обрабатываются по одному, одного потока достаточно
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='camera-session')
+        self.processed = 0
+        self.latency = 0.0
+        self.busy = False
+        # времена последних принятых и обработанных кадров для оценки fps
+        self._received_times = deque(maxlen=30)
+        self._processed_times = deque(maxlen=30)
+        self._start_time = time.time()
+        self._timestamp_prev = 0
+
+    def submit(self, header, payload):
+        """Передаёт кадр воркеру: заголовок бинарного протокола (или None) и данные кадра."""
+        now = time.time()
+        self._received_times.append(now)
+        self.mailbox.put((header, payload, now))
+
+    def close(self):
+        self.mailbox.close()
+        # кадр в обработке завершится, после него поток сессии остановится
+        self._executor.shutdown(wait=False)
+
+    def stats(self):
+        """Счётчики сессии: принятые, обработанные и отброшенные кадры, fps приёма и
+        обработки, кадры в очереди и в обработке, задержка последнего кадра."""
+        return {
+            "received": self.mailbox.received,
+            "processed": self.processed,
+            "dropped": self.mailbox.dropped,
+            "fps_in": round(_rate(self._received_times), 1),
+            "fps_out": round(_rate(self._processed_times), 1),
+            "queue_depth": int(self.mailbox.pending) + int(self.busy),
+            "latency_ms": round(self.latency * 1000, 1),
+        }
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.mailbox.get()
+            if item is None:
+                break
+            header, payload, received_at = item
+            self.busy = True
+            try:
+                messages = await loop.run_in_executor(self._executor, self._process, header, payload)
+            finally:
+                self.busy = False
+            self.latency = time.time() - received_at
+            self._processed_times.append(time.time())
+            for message in messages:
+                if isinstance(message, bytes):
+                    await self.websocket.send_bytes(message)
+                else:
+                    await self.websocket.send_text(message)
+
+    def _process(self, header, payload):
+        """Обрабатывает кадр в потоке сессии, возвращает сообщения для отправки клиенту."""
+        try:
+            if header is None:
+                # старые клиенты присылают JPEG в base64
+                payload = base64.b64decode(payload)
+            bgr_frame = cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_COLOR)
+        except Exception as e:
+            print(f"Ошибка при декодировании данных кадра: {e}")
+            return [error_message("Invalid frame data", header)]
+        if bgr_frame is None:
+            print("Ошибка: некорректный кадр!")
+            return []
+
+        is_keypoints = self.response_mode == 'keypoints'
+        predictions, render_image = process_frame_and_render(
+            bgr_frame, self.components, render=not is_keypoints)
+        self.processed += 1
+
+        messages = []
+        if is_keypoints:
+            messages += encode_keypoints_data(predictions, bgr_frame.shape[:2], header)
+
+        # лог (и кадр в режиме 'frame') отправляются клиенту раз в send_interval секунд
+        timestamp = time.time() - self._start_time
+        if timestamp - self._timestamp_prev < self.send_interval:
+            return messages
+        self._timestamp_prev = timestamp
+        print(f"Отправка обработанных данных клиенту. Статистика сессии: {self.stats()}")
+        if is_keypoints:
+            classes = getattr(predictions, 'action_labels', None)
+            return messages + encode_log_data(
+                predictions, timestamp, self.processed, header,
+                {"Session": self.stats(), "Classes": classes})
+        return encode_websocket_data(
+            render_image, predictions, timestamp, self.processed, header, self.stats())
@@ -0,0 +1,112 @@
+"""Бинарный протокол кадров WebSocket камеры.
+
+Каждое сообщение - один бинарный WebSocket фрейм: заголовок фиксированного
+размера и полезная нагрузка без base64 и JSON обёртки.
+
+Заголовок (network byte order, 20 байт):
+    magic (2s)        b'SS'
+    version (B)       версия протокола
+    msg_type (B)      FRAME_JPEG, METADATA, ERROR или KEYPOINTS
+    seq (I)           номер кадра клиента, ответы повторяют номер исходного кадра
+    timestamp (d)     время захвата кадра клиентом, в секундах
+    payload_len (I)   размер полезной нагрузки в байтах
+
+Полезная нагрузка: FRAME_JPEG - сырые байты JPEG, METADATA и ERROR - JSON в utf-8,
+KEYPOINTS - данные людей кадра для отрисовки на клиенте (little-endian):
+    width, height, count (3 x uint16)  размер исходного кадра и число людей
+    count записей PERSON_DTYPE         по 88 байт на человека
+
+Копия протокола для Django клиентов лежит в videoanalytics/utils/frame_protocol.py,
+изменения нужно вносить в оба файла, расхождение ловит tests/test_frame_protocol.py.
+"""
+import json
+import struct
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+MAGIC = b'SS'
+VERSION = 1
+
+FRAME_JPEG = 1
+METADATA = 2
+ERROR = 3
+KEYPOINTS = 4
+
+HEADER = struct.Struct('!2sBBIdI')
+HEADER_SIZE = HEADER.size
+
+KEYPOINTS_HEADER = struct.Struct('<HHH')
+PERSON_DTYPE = np.dtype([
+    ('id', '<i4'),                  # id трека
+    ('bbox', '<i2', (4,)),          # xmin, ymin, xmax, ymax трека в пикселях
+    ('keypoints', '<i2', (18, 2)),  # x, y суставов trtpose в пикселях, -1 для ненайденных
+    ('action', '<i2'),              # индекс действия, -1 если действия нет
+    ('score', '<u2'),               # уверенность действия, умноженная на 65535
+])
+
+
+class ProtocolError(ValueError):
+    """Сообщение не соответствует протоколу."""
+
+
+class FrameHeader(NamedTuple):
+    version: int
+    msg_type: int
+    seq: int
+    timestamp: float
+    payload_len: int
+
+
+def pack_message(msg_type, seq, payload, timestamp=None):
+    """Собирает сообщение из заголовка и полезной нагрузки (bytes или numpy буфер)."""
+    payload = memoryview(payload).cast('B')
+    if timestamp is None:
+        timestamp = time.time()
+    header = HEADER.pack(MAGIC, VERSION, msg_type, seq & 0xFFFFFFFF, timestamp, len(payload))
+    return b''.join((header, payload))
+
+
+def pack_json(msg_type, seq, data, timestamp=None):
+    """Собирает METADATA или ERROR сообщение из JSON-сериализуемых данных."""
+    payload = json.dumps(data, default=str).encode('utf-8')
+    return pack_message(msg_type, seq, payload, timestamp)
+
+
+def unpack_message(data):
+    """Разбирает сообщение.
+
+    Возвращает заголовок и полезную нагрузку как memoryview без копирования.
+    Бросает ProtocolError для сообщений чужого формата или версии.
+    """
+    if len(data) < HEADER_SIZE:
+        raise ProtocolError(f"Сообщение короче заголовка: {len(data)} байт")
+    magic, version, msg_type, seq, timestamp, payload_len = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ProtocolError(f"Неизвестная сигнатура сообщения: {magic!r}")
+    if version != VERSION:
+        raise ProtocolError(f"Неподдерживаемая версия протокола: {version}")
+    payload = memoryview(data)[HEADER_SIZE:]
+    if len(payload) != payload_len:
+        raise ProtocolError(
+            f"Размер полезной нагрузки {len(payload)} не совпадает с заголовком {payload_len}")
+    return FrameHeader(version, msg_type, seq, timestamp, payload_len), payload
+
+
+def unpack_json(payload):
+    """Декодирует JSON полезную нагрузку METADATA или ERROR сообщения."""
+    return json.loads(bytes(payload).decode('utf-8'))
+
+
+def pack_people(width, height, people):
+    """Собирает полезную нагрузку KEYPOINTS из массива записей PERSON_DTYPE."""
+    people = np.ascontiguousarray(people, dtype=PERSON_DTYPE)
+    return b''.join((KEYPOINTS_HEADER.pack(width, height, len(people)), people.tobytes()))
+
+
+def unpack_people(payload):
+    """Разбирает полезную нагрузку KEYPOINTS: ширина и высота кадра и записи PERSON_DTYPE."""
+    width, height, count = KEYPOINTS_HEADER.unpack_from(payload)
+    people = np.frombuffer(payload, dtype=PERSON_DTYPE, count=count, offset=KEYPOINTS_HEADER.size)
+    return width, height, people
@@ -0,0 +1,240 @@
+import contextlib
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import numpy as np
+
+
+class BatchQueue:
+    """Очередь запросов к одной модели, исполняемых пачками в отдельном потоке.
+
+    Поток ждёт первый запрос, затем добирает запросы других сессий не дольше
+    max_wait_ms или до max_batch запросов и выполняет их одним вызовом
+    run_batch. Вызывающий поток сессии блокируется до получения своего
+    результата, но не дольше timeout секунд. Ошибка пачки передаётся каждому
+    её запросу и сохраняется в stats, после close ожидающие и новые запросы
+    завершаются ошибкой.
+    """
+
+    _CLOSED = object()
+
+    def __init__(self, name, run_batch, max_batch=16, max_wait_ms=10, lock=None, timeout=None):
+        self.name = name
+        self.run_batch = run_batch
+        self.max_batch = max(int(max_batch), 1)
+        self.max_wait = max_wait_ms / 1000
+        self.lock = lock or contextlib.nullcontext()
+        self.timeout = timeout
+        self.num_batches = 0
+        self.num_requests = 0
+        self.num_errors = 0
+        self.last_error = None
+        self._closed = False
+        # новые запросы не попадают в очередь после маркера закрытия
+        self._put_lock = threading.Lock()
+        self._requests = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name=f"{name}-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, *args):
+        """Ставит запрос в очередь и ждёт его результат."""
+        future = Future()
+        with self._put_lock:
+            if self._closed:
+                raise RuntimeError(f"Очередь {self.name} закрыта")
+            self._requests.put((args, future))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # запрос ещё в очереди: поток пачек его пропустит
+            future.cancel()
+            raise TimeoutError(f"Очередь {self.name} не ответила за {self.timeout} с") from None
+
+    def close(self):
+        """Останавливает поток пачек и завершает ожидающие запросы ошибкой."""
+        with self._put_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._requests.put(self._CLOSED)
+        self._thread.join(timeout=5)
+
+    def stats(self):
+        return {
+            "batches": self.num_batches,
+            "requests": self.num_requests,
+            "mean_batch": round(self.num_requests / max(self.num_batches, 1), 2),
+            "errors": self.num_errors,
+            "last_error": self.last_error,
+        }
+
+    def _collect(self):
+        """Пачка запросов и признак закрытия очереди."""
+        batch = []
+        closed = False
+        deadline = None
+        while len(batch) < self.max_batch:
+            if deadline is None:
+                request = self._requests.get()
+                deadline = time.monotonic() + self.max_wait
+            else:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self._requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+            if request is self._CLOSED:
+                closed = True
+                break
+            # отменённые по таймауту запросы не выполняются
+            if request[1].set_running_or_notify_cancel():
+                batch.append(request)
+        return batch, closed
+
+    def _run(self, batch):
+        futures = [future for _, future in batch]
+        try:
+            with self.lock:
+                results = self.run_batch([args for args, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(
+                    f"run_batch вернул {len(results)} результатов на {len(batch)} запросов")
+        except Exception as e:
+            self.num_errors += 1
+            self.last_error = repr(e)
+            print(f"Ошибка пакетного инференса {self.name}: {e}")
+            for future in futures:
+                future.set_exception(e)
+            return
+        self.num_batches += 1
+        self.num_requests += len(batch)
+        for future, result in zip(futures, results):
+            future.set_result(result)
+
+    def _fail_pending(self, batch):
+        """Завершает ошибкой пачку и все запросы, поставленные до закрытия очереди."""
+        error = RuntimeError(f"Очередь {self.name} закрыта")
+        for _, future in batch:
+            future.set_exception(error)
+        while True:
+            try:
+                request = self._requests.get_nowait()
+            except queue.Empty:
+                return
+            if request is not self._CLOSED and request[1].set_running_or_notify_cancel():
+                request[1].set_exception(error)
+
+    def _loop(self):
+        while True:
+            batch, closed = self._collect()
+            # после close запросы не выполняются, даже уже собранные в пачку
+            if closed or self._closed:
+                self._fail_pending(batch)
+                return
+            if batch:
+                self._run(batch)
+
+
+class BatchedPoseEstimator:
+    """Заместитель оценщика поз для сессии: predict идёт через общую очередь пачек."""
+
+    def __init__(self, batch_queue):
+        self._queue = batch_queue
+
+    def predict(self, image, get_bbox=False):
+        return self._queue.submit(image, get_bbox)
+
+
+class BatchedFeatureExtractor:
+    """Заместитель reid экстрактора для трекера сессии: extract идёт через общую очередь пачек."""
+
+    def __init__(self, batch_queue, extractor):
+        self._queue = batch_queue
+        self._extractor = extractor
+        self.data_meta = extractor.data_meta
+        self.max_dist = getattr(extractor, 'max_dist', None)
+
+    def extract(self, image, boxes, keypoints=None):
+        return self._queue.submit(image, boxes, keypoints)
+
+    def __call__(self, images):
+        # вырезанные кадры нужны только для прогрева, его выполняет реестр напрямую
+        return self._extractor(images)
+
+
+class InferenceScheduler:
+    """Планировщик инференса камер: объединяет кадры всех сессий в пачки.
+
+    Оценка поз и reid выполняются в своих потоках пачками кадров разных
+    сессий, а трекеры и классификаторы остаются у сессий. Сессии получают
+    заместители моделей с тем же интерфейсом, что и сами модели.
+
+    args:
+        max_batch (int): максимальное число кадров в пачке.
+        max_wait_ms (float): сколько ждать кадры других сессий после первого кадра пачки.
+        max_crops (int): максимальное число вырезок людей в одном вызове reid модели.
+        timeout (float): сколько секунд сессия ждёт результат своего кадра, None без ограничения.
+        lock (threading.Lock): блокировка моделей реестра, общая с обработкой видео.
+    """
+
+    def __init__(self, pose_estimator, reid_extractor=None, max_batch=16, max_wait_ms=10,
+                 max_crops=64, timeout=None, lock=None, **kwargs):
+        self._pose_model = pose_estimator
+        self._reid_model = reid_extractor
+        self.max_crops = max(int(max_crops), 1)
+        self.pose_queue = BatchQueue('pose', self._run_pose, max_batch, max_wait_ms, lock, timeout)
+        self.pose_estimator = BatchedPoseEstimator(self.pose_queue)
+
+        self.reid_queue = None
+        self.feature_extractor = None
+        if reid_extractor is not None:
+            self.reid_queue = BatchQueue('reid', self._run_reid, max_batch, max_wait_ms, lock, timeout)
+            self.feature_extractor = BatchedFeatureExtractor(self.reid_queue, reid_extractor)
+
+    def _run_pose(self, requests):
+        images, get_bbox = zip(*requests)
+        return self._pose_model.predict_batch(list(images), list(get_bbox))
+
+    def _run_reid(self, requests):
+        # вырезки пачки делятся на вызовы модели не больше max_crops, как и
+        # пачки кадров TrtPose, вырезки одного кадра при необходимости тоже
+        pieces = []
+        for idx, (image, boxes, keypoints) in enumerate(requests):
+            boxes = np.asarray(boxes).reshape(-1, 4)
+            for start in range(0, max(len(boxes), 1), self.max_crops):
+                stop = start + self.max_crops
+                pieces.append((idx, image, boxes[start:stop],
+                               None if keypoints is None else keypoints[start:stop]))
+
+        features = [[] for _ in requests]
+        chunk, num_crops = [], 0
+        for piece in pieces + [None]:
+            if piece is None or (chunk and num_crops + len(piece[2]) > self.max_crops):
+                _, images, boxes, keypoints = zip(*chunk)
+                chunk_features = self._reid_model.extract_many(
+                    list(images), list(boxes), list(keypoints))
+                for (idx, *_), piece_features in zip(chunk, chunk_features):
+                    features[idx].append(piece_features)
+                chunk, num_crops = [], 0
+            if piece is not None:
+                chunk.append(piece)
+                num_crops += len(piece[2])
+        return [parts[0] if len(parts) == 1 else np.concatenate(parts) for parts in features]
+
+    def close(self):
+        """Останавливает потоки пачек, ожидающие кадры завершаются ошибкой."""
+        self.pose_queue.close()
+        if self.reid_queue is not None:
+            self.reid_queue.close()
+
+    def stats(self):
+        """Число пачек, средний размер пачки и ошибки по моделям."""
+        stats = {"pose": self.pose_queue.stats()}
+        if self.reid_queue is not None:
+            stats["reid"] = self.reid_queue.stats()
+        return stats
@@ -19,14 +19,15 @@ from sklearn.decomposition import PCA
 from torch import nn
 
 import numpy as np
-from collections import deque
+from collections import OrderedDict, deque
 import cv2
 
 import torch
-from app.src.lib.action_classifier.dnn.feature_procs import FeatureGenerator
+from app.src.lib.action_classifier.dnn.feature_procs import BatchFeatureGenerator, RingFeatureGenerator
 
 # -- Settings
 NUM_FEATURES_FROM_PCA = 50
+SCORES_HIST_SIZE = 2  # number of recent predictions averaged by smooth_scores
 
 
 # -- Classes
@@ -57,9 +58,129 @@ class MLPClassifier(nn.Module):
         return x
 
 
+class FusedMLPClassifier(nn.Module):
+    ''' MLPClassifier with the PCA projection folded into the first linear layer
+        and every BatchNorm folded into the preceding linear layer.
+        It takes the raw feature vector, i.e. `fused(x) == model(pca.transform(x))`.
+    '''
+
+    def __init__(self, layers):
+        super(FusedMLPClassifier, self).__init__()
+        self.layers = layers
+
+    @classmethod
+    @torch.no_grad()
+    def from_mlp(cls, model, pca):
+        device = next(model.parameters()).device
+
+        # PCA.transform: z = (x - mean) @ components.T / sqrt(explained_variance)
+        proj_w = torch.as_tensor(pca.components_, dtype=torch.float64)
+        if pca.whiten:
+            scale = np.sqrt(pca.explained_variance_)
+            scale[scale < np.finfo(scale.dtype).eps] = np.finfo(scale.dtype).eps
+            proj_w = proj_w / torch.as_tensor(scale, dtype=torch.float64)[:, None]
+        proj_b = -proj_w @ torch.as_tensor(pca.mean_, dtype=torch.float64)
+
+        layers = []
+        for idx, (linear, batch_norm, _) in enumerate(model.hidden_layers):
+            weight = linear.weight.detach().double().cpu()
+            bias = linear.bias.detach().double().cpu()
+            if idx == 0:
+                bias = weight @ proj_b + bias
+                weight = weight @ proj_w
+            # BatchNorm in eval mode: y = (x - running_mean) / sqrt(running_var + eps) * gamma + beta
+            bn_scale = batch_norm.weight.detach().double().cpu() / torch.sqrt(
+                batch_norm.running_var.detach().double().cpu() + batch_norm.eps)
+            weight = weight * bn_scale[:, None]
+            bias = (bias - batch_norm.running_mean.detach().double().cpu()) * bn_scale \
+                + batch_norm.bias.detach().double().cpu()
+
+            fused_linear = nn.Linear(weight.shape[1], weight.shape[0])
+            fused_linear.weight.copy_(weight.float())
+            fused_linear.bias.copy_(bias.float())
+            layers += [fused_linear, nn.ReLU()]
+
+        output_layer = nn.Linear(model.output_layer.in_features, model.output_layer.out_features)
+        output_layer.load_state_dict(model.output_layer.state_dict())
+        layers += [output_layer, nn.Softmax(dim=1)]
+        return cls(nn.Sequential(*layers)).to(device).eval()
+
+    def forward(self, x):
+        return self.layers(x)
+
+
+def load_action_model(model_path, num_classes, device=None):
+    """Load the MLP action classifier weights in inference mode."""
+    device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    if not os.path.isfile(model_path):
+        raise FileNotFoundError(f"Model file not found at path: {model_path}")
+    model = MLPClassifier(
+        input_size=NUM_FEATURES_FROM_PCA, hidden_sizes=[1024, 512], output_size=num_classes
+    ).to(device)
+    model.load_state_dict(torch.load(model_path, map_location=device))
+    model.eval()
+    return model
+
+
+def load_pca(model_path):
+    """Load the PCA stored as `pca.pkl` next to the classifier weights."""
+    with open(os.path.join(os.path.dirname(model_path), "pca.pkl"), 'rb') as f:
+        return joblib.load(f)
+
+
+def verify_fused_classifier(model, pca, fused_model, num_samples=256, atol=1e-4):
+    """Check that the fused network matches `model(pca.transform(x))`.
+    Inputs are drawn from a unit gaussian in the (whitened) PCA space and mapped back
+    to raw features. Raises ValueError if the class probabilities differ by more than `atol`.
+    """
+    rng = np.random.default_rng(0)
+    latent = rng.standard_normal((num_samples, pca.n_components_))
+    if not pca.whiten:
+        latent *= np.sqrt(pca.explained_variance_)
+    features = pca.inverse_transform(latent)
+
+    device = next(model.parameters()).device
+    expected = predict_scores(model, pca, features, device)
+    fused = predict_scores(fused_model, pca, features, device)
+    max_diff = np.abs(expected - fused).max()
+    if max_diff > atol:
+        raise ValueError(f"Fused classifier output differs from the PCA + MLP output by {max_diff:.2e}")
+    return max_diff
+
+
+def fuse_classifier(model, pca):
+    """Fold the PCA and the BatchNorm layers into the MLP and verify the result.
+    Falls back to the unfused model if the outputs do not match.
+    """
+    fused_model = FusedMLPClassifier.from_mlp(model, pca)
+    try:
+        verify_fused_classifier(model, pca, fused_model)
+    except ValueError as e:
+        print(f'[WARNING] {e}. Using the unfused classifier.')
+        return model
+    return fused_model
+
+
+def predict_scores(model, pca, features, device):
+    """Run the PCA and the MLP on a batch of feature vectors.
+    A FusedMLPClassifier already contains the PCA and takes the features as is.
+
+    args:
+        features (np.ndarray): (N, num_features) raw feature vectors.
+    return:
+        scores (np.ndarray): (N, num_classes) class probabilities.
+    """
+    if not isinstance(model, FusedMLPClassifier):
+        features = pca.transform(features)
+    features_tensor = torch.as_tensor(features, dtype=torch.float32, device=device)
+    with torch.no_grad():
+        return model(features_tensor).cpu().numpy()
+
+
 class ClassifierOnlineTest(object):
-    def __init__(self, model_path, action_labels, window_size, human_id=0, threshold=0.7):
-        self.model = None
+    def __init__(self, model_path, action_labels, window_size, human_id=0, threshold=0.7,
+                 model=None, pca=None, feature_generator=None):
+        self.model = model
         self.human_id = human_id
         self.model_path = model_path
         self.action_labels = action_labels
@@ -67,57 +188,54 @@ class ClassifierOnlineTest(object):
         self.window_size = window_size
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-        self.load_model()
+        # weights loaded once elsewhere (e.g. by the model registry) are reused as is
+        if self.model is None:
+            self.load_model()
 
-        self.feature_generator = FeatureGenerator(window_size)
-        with open(os.path.join(os.path.dirname(model_path), "pca.pkl"), 'rb') as f:
-            self.pca = joblib.load(f)
+        self.feature_generator = feature_generator or RingFeatureGenerator(window_size)
+        self.pca = pca if pca is not None else load_pca(model_path)
         self.reset()
 
     def load_model(self):
-        self.model = MLPClassifier(
-            input_size=50, hidden_sizes=[1024, 512], output_size=len(self.action_labels)
-        ).to(self.device)
-        model_path = self.model_path
-
-        if not os.path.isfile(model_path):
-            raise FileNotFoundError(f"Model file not found at path: {model_path}")
-        self.model.load_state_dict(torch.load(self.model_path))
-        self.model.eval()
+        self.model = load_action_model(self.model_path, len(self.action_labels), self.device)
 
     def reset(self):
         self.feature_generator.reset()
-        self.scores_hist = deque()
+        self.scores_hist = deque(maxlen=SCORES_HIST_SIZE)
         self.scores = None
 
     def predict(self, skeleton):
         is_features_good, features = self.feature_generator.add_cur_skeleton(skeleton)
 
         if is_features_good:
-            features_pca = self.pca.transform(features.reshape(1, -1))
-            features_tensor = torch.tensor(features_pca, dtype=torch.float32)
-            with torch.no_grad():
-                curr_scores = self.model(features_tensor.cuda())
-            self.scores = self.smooth_scores(curr_scores.cpu().numpy()[0])
-
-            if self.scores.max() < self.threshold:
-                prediced_label = ['', 0]
-            else:
-                predicted_idx = self.scores.argmax()
-                prediced_label = [self.action_labels[predicted_idx], self.scores.max()]
+            curr_scores = predict_scores(self.model, self.pca, features.reshape(1, -1), self.device)
+            predicted_idx = self.update_scores(curr_scores[0])
+            prediced_label = self.get_label(predicted_idx)
         else:
             prediced_label = ['', 0]
 
         return prediced_label
 
+    def update_scores(self, curr_scores):
+        ''' Smooth the scores predicted for the current frame.
+            Returns the index of the predicted action, -1 if no score reaches the threshold.
+        '''
+        self.scores = self.smooth_scores(curr_scores)
+
+        if self.scores.max() < self.threshold:
+            return -1
+        return self.scores.argmax()
+
+    def get_label(self, predicted_idx):
+        if predicted_idx < 0:
+            return ['', 0]
+        return [self.action_labels[predicted_idx], self.scores.max()]
+
     def smooth_scores(self, curr_scores):
         ''' Smooth the current prediction score
             by taking the average with previous scores
         '''
-        self.scores_hist.append(curr_scores)
-        DEQUE_MAX_SIZE = 2
-        if len(self.scores_hist) > DEQUE_MAX_SIZE:
-            self.scores_hist.popleft()
+        self.scores_hist.append(curr_scores)  # bounded by SCORES_HIST_SIZE
 
         if 1:  # Use sum
             score_sums = np.zeros((len(self.action_labels),))
@@ -159,40 +277,102 @@ class ClassifierOnlineTest(object):
 class MultiPersonClassifier(object):
     ''' This is a wrapper around ClassifierOnlineTest
         for recognizing actions of multiple people.
-    '''
 
-    def __init__(self, model_path, classes, window_size=5, threshold=0.7):
+        The MLP and the PCA are loaded once and shared by every person, a person
+        only keeps its own feature window and score history. People that left the
+        view are evicted after `max_missing_frames` frames, and at most
+        `max_tracks` people are kept (least recently seen are evicted first).
+        With `fuse_pca` the PCA and the BatchNorm layers are folded into the MLP
+        of a model the classifier loads itself; a shared `model` is used as given.
+    '''
 
-        self.dict_id2clf = {}  # human id -> action_classifier of this person
+    def __init__(self, model_path, classes, window_size=5, threshold=0.7, model=None, pca=None,
+                 max_tracks=100, max_missing_frames=0, fuse_pca=False):
+
+        self.classes = classes
+        self.dict_id2clf = OrderedDict()  # human id -> action_classifier of this person
+        self.dict_id2last_seen = {}  # human id -> index of the last frame the person was seen
+        self.max_tracks = max_tracks
+        self.max_missing_frames = max_missing_frames
+        self._frame_idx = 0
+        # feature windows of all people live in one set of ring buffers
+        self.feature_generator = BatchFeatureGenerator(window_size, capacity=min(max_tracks, 16))
         if isinstance(model_path, (list, tuple)):
             model_path = os.path.join(*model_path)
+
+        # Load the shared weights only once for all people.
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.pca = pca if pca is not None else load_pca(model_path)
+        # A shared model is used as given, its owner (the model registry) fuses it once
+        if model is None:
+            model = load_action_model(model_path, len(classes), self.device)
+            if fuse_pca:
+                model = fuse_classifier(model, self.pca)
+        self.model = model
+
         # Define a function for creating action_classifier for new people.
         self._create_classifier = lambda human_id: ClassifierOnlineTest(
-            model_path, classes, window_size, human_id, threshold=threshold)
+            model_path, classes, window_size, human_id, threshold=threshold,
+            model=self.model, pca=self.pca,
+            feature_generator=RingFeatureGenerator(
+                window_size, self.feature_generator, self.feature_generator.acquire()))
 
     def classify(self, predictions):
-        ''' Classify the action type of each skeleton in dict_id2skeleton '''
-
-        dict_id2skeleton = {pred.id: pred.flatten_keypoints for pred in predictions}
-        # Clear people not in view
-        old_ids = set(self.dict_id2clf)
-        cur_ids = set(dict_id2skeleton)
-        humans_not_in_view = list(old_ids - cur_ids)  # check person is missed or not
-        for human in humans_not_in_view:
-            del self.dict_id2clf[human]
-
-        # Predict each person's action
-        # actions = {}
-        for idx, (id, skeleton) in enumerate(dict_id2skeleton.items()):
-            if id not in self.dict_id2clf:  # add this new person
-                self.dict_id2clf[id] = self._create_classifier(id)
+        ''' Classify the action type of each tracked skeleton of the FrameResult.
+            Fills `action_idx` and `action_scores` of the predictions in place.
+        '''
 
-            classifier = self.dict_id2clf[id]
-            # actions[id] = action_classifier.predict(skeleton)  # predict label
-            predictions[idx].action = classifier.predict(skeleton)
+        ids = predictions.ids.tolist()
+        self._frame_idx += 1
+        for id in ids:
+            self.dict_id2last_seen[id] = self._frame_idx
+        self._evict()
 
+        # Update the feature windows of all people in one call, then predict
+        # the actions of all people with ready features in a single batch
+        classifiers = []
+        for id in ids:
+            if id not in self.dict_id2clf:  # add this new person
+                self.dict_id2clf[id] = self._create_classifier(id)
+            else:
+                self.dict_id2clf.move_to_end(id)
+            classifiers.append(self.dict_id2clf[id])
+
+        slots = [classifier.feature_generator.slot for classifier in classifiers]
+        is_features_good, batch_features = self.feature_generator.add_skeletons(
+            slots, predictions.skeletons)
+
+        predictions.action_labels = self.classes
+        predictions.action_idx[:] = -1
+        predictions.action_scores[:] = 0
+        if len(batch_features) > 0:
+            batch_scores = predict_scores(self.model, self.pca, batch_features, self.device)
+            for idx, curr_scores in zip(np.flatnonzero(is_features_good), batch_scores):
+                classifier = classifiers[idx]
+                predicted_idx = classifier.update_scores(curr_scores)
+                if predicted_idx >= 0:
+                    predictions.action_idx[idx] = predicted_idx
+                    predictions.action_scores[idx] = classifier.scores.max()
+
+        self._evict_overflow()
         return predictions
 
+    def _evict(self):
+        ''' Drop the people who have not been seen for more than max_missing_frames '''
+        for id in list(self.dict_id2clf):
+            if self._frame_idx - self.dict_id2last_seen[id] > self.max_missing_frames:
+                self._remove(id)
+
+    def _evict_overflow(self):
+        ''' Keep at most max_tracks people, dropping the least recently seen '''
+        while len(self.dict_id2clf) > self.max_tracks:
+            self._remove(next(iter(self.dict_id2clf)))
+
+    def _remove(self, id):
+        classifier = self.dict_id2clf.pop(id)
+        del self.dict_id2last_seen[id]
+        self.feature_generator.release(classifier.feature_generator.slot)
+
     def get_classifier(self, id):
         ''' Get the action_classifier based on the person id.
         Arguments:
@@ -463,3 +463,189 @@ class FeatureGenerator(object):
             features.append(next_feature)
         features = np.array(features)
         return features
+
+
+# -- Vectorized ring buffer feature generators for online inference
+
+def _batch_body_height(x):
+    ''' Vectorized ProcFtr.get_body_height for a (N, 26) array of skeletons '''
+    x0, y0 = x[:, 2*NECK], x[:, 2*NECK+1]
+    x11, y11 = x[:, 2*L_THIGH], x[:, 2*L_THIGH+1]
+    x12, y12 = x[:, 2*R_THIGH], x[:, 2*R_THIGH+1]
+    x1 = np.where(y11 == NaN, x12, np.where(y12 == NaN, x11, (x11 + x12) / 2))
+    y1 = np.where(y11 == NaN, y12, np.where(y12 == NaN, y11, (y11 + y12) / 2))
+    height = np.sqrt((x0-x1)**2 + (y0-y1)**2)
+    return np.where((y11 == NaN) & (y12 == NaN), 1.0, height)
+
+
+class BatchFeatureGenerator(object):
+    ''' Computes the features of FeatureGenerator for many tracks at once.
+
+    Every track owns a slot in preallocated ring buffers of shape
+    (capacity, window_size, ...). The filled skeleton, its body height and the
+    neck displacement since the previous frame are computed once when the
+    skeleton is added, so building the features of a full window is a handful
+    of array operations for all tracks together. The features match
+    FeatureGenerator up to float rounding of the vectorized arithmetic.
+    '''
+
+    def __init__(self, window_size, capacity=16):
+        self._window_size = window_size
+        self._capacity = 0
+        self._x = np.zeros((0, window_size, TOTAL_JOINTS*2))
+        self._heights = np.zeros((0, window_size))
+        self._v_center = np.zeros((0, window_size, 2))
+        self._count = np.zeros((0,), dtype=np.int64)
+        self._pos = np.zeros((0,), dtype=np.int64)
+        self._free_slots = []
+        self._grow(capacity)
+
+    @property
+    def num_features(self):
+        w = self._window_size
+        return w*TOTAL_JOINTS*2 + (w-1)*TOTAL_JOINTS*2 + (w-1)*2*10
+
+    def _grow(self, capacity):
+        extra = capacity - self._capacity
+        if extra <= 0:
+            return
+        pad = lambda a: np.concatenate((a, np.zeros((extra,) + a.shape[1:], dtype=a.dtype)))
+        self._x = pad(self._x)
+        self._heights = pad(self._heights)
+        self._v_center = pad(self._v_center)
+        self._count = pad(self._count)
+        self._pos = pad(self._pos)
+        self._free_slots += list(range(capacity - 1, self._capacity - 1, -1))
+        self._capacity = capacity
+
+    def acquire(self):
+        ''' Reserve an empty slot for a new track '''
+        if not self._free_slots:
+            self._grow(max(1, 2 * self._capacity))
+        slot = self._free_slots.pop()
+        self.reset([slot])
+        return slot
+
+    def release(self, slot):
+        ''' Give the slot of a track that left back to the pool '''
+        self.reset([slot])
+        self._free_slots.append(slot)
+
+    def reset(self, slots):
+        self._count[slots] = 0
+        self._pos[slots] = 0
+
+    def add_skeletons(self, slots, skeletons):
+        ''' Add the current skeleton of every given track.
+        Arguments:
+            slots {list of int}: distinct slots of the tracks.
+            skeletons {np.array}: (N, 36) openpose skeletons, one row per slot.
+        Returns:
+            is_success {np.array}: (N,) bool, True for tracks whose window is full.
+            features {np.array}: (K, num_features) features of the successful tracks.
+        '''
+        slots = np.asarray(slots, dtype=np.int64)
+        x = np.array(skeletons, dtype=np.float64).reshape(len(slots), -1)[:, 2:2+TOTAL_JOINTS*2]
+        is_success = np.zeros(len(slots), dtype=bool)
+
+        # Tracks without a neck and a thigh restart their window
+        is_valid = (x[:, 2*NECK] != NaN) & (
+            (x[:, 2*L_THIGH] != NaN) | (x[:, 2*R_THIGH] != NaN))
+        self.reset(slots[~is_valid])
+        if not is_valid.any():
+            return is_success, np.zeros((0, self.num_features))
+        slots, x = slots[is_valid], x[is_valid]
+
+        count, pos = self._count[slots], self._pos[slots]
+        prev_pos = (pos - 1) % self._window_size
+        has_prev = count > 0
+        pre_x = self._x[slots, prev_pos]
+
+        x_filled = self._fill_invalid_data(x, pre_x, self._heights[slots, prev_pos], has_prev)
+
+        # Push to the ring buffers
+        self._x[slots, pos] = x_filled
+        self._heights[slots, pos] = _batch_body_height(x_filled)
+        self._v_center[slots, pos] = x_filled[:, 0:2] - pre_x[:, 0:2]
+        self._count[slots] = np.minimum(count + 1, self._window_size)
+        self._pos[slots] = (pos + 1) % self._window_size
+
+        is_ready = self._count[slots] >= self._window_size
+        is_success[np.flatnonzero(is_valid)[is_ready]] = True
+        return is_success, self._window_features(slots[is_ready])
+
+    def _fill_invalid_data(self, x, pre_x, pre_height, has_prev):
+        ''' Vectorized FeatureGenerator._fill_invalid_data '''
+        cur_px0, cur_py0 = x[:, 2*NECK], x[:, 2*NECK+1]
+        cur_height = _batch_body_height(x)
+
+        # Fill from the standing skeleton if there is no previous data
+        # or there is a knee or an ankle (same conditions as FeatureGenerator)
+        is_lack_knee = (x[:, 2*L_KNEE] != NaN) | (x[:, 2*R_KNEE] != NaN)
+        is_lack_ankle = (x[:, 2*L_ANKLE] != NaN) | (x[:, 2*R_ANKLE] != NaN)
+        use_stand = ~has_prev | is_lack_knee | is_lack_ankle
+
+        base = np.empty_like(x)
+        base[:, 0::2] = cur_px0[:, None]
+        base[:, 1::2] = cur_py0[:, None]
+        stand_filled = np.where(
+            x == NaN, base + cur_height[:, None] * STAND_SKEL_NORMED, x)
+
+        # Otherwise fill from the previous skeleton relative to the neck
+        # Rows without a previous skeleton get inf/nan here, they take stand_filled
+        bad = x[:, 0::2] == NaN
+        prev_filled = x.copy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = (cur_height / pre_height)[:, None]
+            prev_filled[:, 0::2] = np.where(
+                bad, cur_px0[:, None] + (pre_x[:, 0::2] - pre_x[:, 0:1]) * scale, x[:, 0::2])
+            prev_filled[:, 1::2] = np.where(
+                bad, cur_py0[:, None] + (pre_x[:, 1::2] - pre_x[:, 1:2]) * scale, x[:, 1::2])
+
+        return np.where(use_stand[:, None], stand_filled, prev_filled)
+
+    def _window_features(self, slots):
+        ''' Build the features of the full windows of the given slots '''
+        if len(slots) == 0:
+            return np.zeros((0, self.num_features))
+        # Indices of the window in chronological order, the oldest entry is at pos
+        order = (self._pos[slots][:, None] + np.arange(self._window_size)) % self._window_size
+        rows = slots[:, None]
+        x = self._x[rows, order]
+        mean_height = self._heights[rows, order].mean(axis=1)[:, None]
+
+        # -- Normalize all 1~t features
+        xnorm = x.copy()
+        xnorm[:, :, 0::2] -= x[:, :, 0:1]
+        xnorm[:, :, 1::2] -= x[:, :, 1:2]
+        xnorm /= mean_height[:, :, None]
+
+        f_poses = xnorm.reshape(len(slots), -1)
+        f_v_joints = np.diff(xnorm, axis=1).reshape(len(slots), -1)
+        f_v_center = self._v_center[rows, order[:, 1:]].reshape(len(slots), -1) / mean_height
+        f_v_center = np.repeat(f_v_center, 10, axis=1)  # repeat to add weight
+
+        return np.concatenate((f_poses, f_v_joints, f_v_center), axis=1)
+
+
+class RingFeatureGenerator(object):
+    ''' FeatureGenerator interface for one track backed by a BatchFeatureGenerator slot.
+        Without a `batch_generator` the track gets a private one-slot buffer.
+    '''
+
+    def __init__(self, window_size, batch_generator=None, slot=None):
+        if batch_generator is None:
+            batch_generator = BatchFeatureGenerator(window_size, capacity=1)
+            slot = batch_generator.acquire()
+        self.batch_generator = batch_generator
+        self.slot = slot
+
+    def reset(self):
+        self.batch_generator.reset([self.slot])
+
+    def add_cur_skeleton(self, skeleton):
+        is_success, features = self.batch_generator.add_skeletons(
+            [self.slot], np.asarray(skeleton)[None])
+        if not is_success[0]:
+            return False, None
+        return True, features[0]
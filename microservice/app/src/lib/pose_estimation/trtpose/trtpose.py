@@ -1,5 +1,6 @@
 import os
 import json
+import warnings
 from collections import OrderedDict
 
 import torch
@@ -11,7 +12,7 @@ import torchvision.transforms as transforms
 from trt_pose import models, coco
 from trt_pose.parse_objects import ParseObjects
 
-from app.src.lib.utils.annotation import Annotation
+from app.src.lib.utils.annotation import FrameResult
 
 
 POSE_META = {
@@ -25,6 +26,86 @@ POSE_META = {
 }
 
 
+def _to_numpy(data):
+    return data.numpy() if isinstance(data, torch.Tensor) else np.asarray(data)
+
+
+def _engine_max_batch_size(engine, input_name):
+    """Largest batch a TensorRT engine accepts: the max batch size of implicit batch
+    engines, the batch dimension or the max optimization profile shape otherwise."""
+    if getattr(engine, 'has_implicit_batch_dimension', False):
+        return engine.max_batch_size
+    if hasattr(engine, 'get_tensor_shape'):  # TensorRT >= 8.5
+        batch = engine.get_tensor_shape(input_name)[0]
+        if batch < 0:
+            batch = engine.get_tensor_profile_shape(input_name, 0)[2][0]
+    else:
+        binding = engine.get_binding_index(input_name)
+        batch = engine.get_binding_shape(binding)[0]
+        if batch < 0:
+            batch = engine.get_profile_shape(0, binding)[2][0]
+    return int(batch)
+
+
+def decode_keypoints(counts, objects, peaks, batch_idx=0, num_parts=POSE_META['num_parts']):
+    """Decode trtpose parse_objects output of one image into a keypoints array.
+    args:
+        counts, objects, peaks: outputs of `ParseObjects`.
+        batch_idx (int): image index in the batch.
+    return:
+        keypoints (np.ndarray): (N, num_parts, 3) array of (joint index, x, y)
+            in normalized coordinates, missing joints are (joint index, 0, 0).
+    """
+    count = int(_to_numpy(counts).reshape(-1)[batch_idx])
+    objects = _to_numpy(objects)[batch_idx, :count].astype(np.int64)  # (N, C) peak index per joint
+    peaks = _to_numpy(peaks)[batch_idx]  # (C, max_peaks, 2) of (y, x)
+    num_joints, max_peaks = min(objects.shape[1], num_parts), peaks.shape[1]
+    objects = objects[:, :num_joints]
+
+    is_found = (objects >= 0) & (objects < max_peaks)
+    joint_peaks = peaks[np.arange(num_joints)[None], np.clip(objects, 0, max_peaks - 1)]
+
+    keypoints = np.zeros((count, num_parts, 3), dtype=np.float64)
+    keypoints[:, :, 0] = np.arange(num_parts)
+    keypoints[:, :num_joints, 1] = np.where(is_found, joint_peaks[..., 1], 0.0)
+    keypoints[:, :num_joints, 2] = np.where(is_found, joint_peaks[..., 0], 0.0)
+    return keypoints
+
+
+def filter_keypoints(keypoints, min_total_joints, min_leg_joints, include_head=True):
+    """Mask of people with enough keypoints.
+    Counts non zero coordinates over all joints (or body joints only without the head)
+    and over the leg joints.
+    """
+    coords = keypoints[:, :, 1:] if include_head else keypoints[:, 5:, 1:]
+    num_valid_joints = np.count_nonzero(coords, axis=(1, 2))
+    num_leg_joints = np.count_nonzero(coords[:, -7:-1], axis=(1, 2))
+    return (num_valid_joints >= min_total_joints) & (num_leg_joints >= min_leg_joints)
+
+
+def keypoints_to_bboxes(keypoints, img_w, img_h, ratio=0.1):
+    """Bboxes around the keypoints of every person, expanded by `ratio` for more background.
+    return:
+        bboxes (np.ndarray): (N, 4) bboxes of (xmin, ymin, width, height) in pixels.
+        is_valid (np.ndarray): (N,) False for bboxes with width or height less than 1.
+    """
+    coords = np.where(keypoints[:, :, 1:] != 0, keypoints[:, :, 1:], np.nan)
+    coords[..., 0] *= img_w
+    coords[..., 1] *= img_h
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # people without any keypoint
+        mins = np.nanmin(coords, axis=1)
+        maxs = np.nanmax(coords, axis=1)
+
+    size = maxs - mins
+    img_size = np.array([img_w, img_h])
+    new_mins = np.clip(mins - ratio * size, 0, img_size)
+    new_maxs = np.clip(maxs + ratio * size, 0, img_size)
+    bboxes = np.concatenate((new_mins, new_maxs - new_mins), axis=1)
+    is_valid = ~((bboxes[:, 2] < 1) | (bboxes[:, 3] < 1))
+    return bboxes, is_valid
+
+
 class TrtPose:
     """trtpose wrapper for pose prediction"""
 
@@ -48,6 +129,8 @@ class TrtPose:
             model_path = os.path.join(*model_path)
         self.height,self.width = size
         self.model_path = model_path
+        # largest batch the model runs in one call, None for no limit
+        self.max_batch_size = None
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 
         # load humanpose json data
@@ -72,6 +155,8 @@ class TrtPose:
         model_trt = torch2trt.TRTModule()
         model_trt.load_state_dict(torch.load(model_file))
         model_trt.eval()
+        self.max_batch_size = _engine_max_batch_size(model_trt.engine, model_trt.input_names[0])
+        print(f'[INFO] TensorRT trtpose engine max batch size : {self.max_batch_size}')
         return model_trt
 
     def _load_torch_model(self, model_file, backbone='densenet121'):
@@ -116,7 +201,7 @@ class TrtPose:
         args:
             image (np.ndarray[r,g,b]): rgb input image.
         return:
-            predictions (list): list of annotation object with only good person keypoints
+            predictions (FrameResult): keypoints (and bboxes) of people with good keypoints
         """
         self.img_h, self.img_w = image.shape[:2]
         pil_img, tensor_img = self._preprocess(image)
@@ -124,83 +209,54 @@ class TrtPose:
         cmap, paf = self.model(tensor_img)
         cmap, paf = cmap.cpu(), paf.cpu()
         counts, objects, peaks = self.parse_objects(cmap, paf) # cmap threhold=0.15, link_threshold=0.15
-        predictions = self.get_keypoints(objects, counts, peaks, get_bbox=get_bbox)
+        predictions = self.get_keypoints(objects, counts, peaks, get_bbox=get_bbox, image_size=image.shape[:2])
         return predictions
 
+    @torch.no_grad()
+    def predict_batch(self, images, get_bbox=False):
+        """predict pose estimation on a batch of rgb images, one model call per
+        max_batch_size images. Model errors propagate to the caller.
+        Images can have different sizes, they are all resized to the model input.
+        args:
+            images (List[np.ndarray[r,g,b]]): rgb input images.
+            get_bbox (bool or List[bool]): compute bboxes, for all or for every image.
+        return:
+            predictions (List[FrameResult]): keypoints (and bboxes) of every image.
+        """
+        if isinstance(get_bbox, bool):
+            get_bbox = [get_bbox] * len(images)
+        if len(images) == 1 or self.max_batch_size == 1:
+            return [self.predict(image, get_bbox=bbox) for image, bbox in zip(images, get_bbox)]
+        # TensorRT engines run at most max_batch_size images per call
+        chunk = self.max_batch_size or len(images)
+        if len(images) > chunk:
+            return [prediction for start in range(0, len(images), chunk)
+                    for prediction in self.predict_batch(
+                        images[start:start + chunk], get_bbox[start:start + chunk])]
+
+        tensor_imgs = torch.cat([self._preprocess(image)[1] for image in images], dim=0)
+        cmap, paf = self.model(tensor_imgs)
+        cmap, paf = cmap.cpu(), paf.cpu()
+        counts, objects, peaks = self.parse_objects(cmap, paf)
+        self.img_h, self.img_w = images[-1].shape[:2]
+        return [
+            self.get_keypoints(objects, counts, peaks, get_bbox=bbox,
+                               image_size=image.shape[:2], batch_idx=batch_idx)
+            for batch_idx, (image, bbox) in enumerate(zip(images, get_bbox))]
+
     def get_bbox_from_keypoints(self, keypoints):
-        def expand_bbox(xmin, xmax, ymin, ymax, img_width, img_height):
-            """expand bbox for containing more background"""
-            width = xmax - xmin
-            height = ymax - ymin
-            ratio = 0.1   # expand ratio
-            new_xmin = np.clip(xmin - ratio * width, 0, img_width)
-            new_xmax = np.clip(xmax + ratio * width, 0, img_width)
-            new_ymin = np.clip(ymin - ratio * height, 0, img_height)
-            new_ymax = np.clip(ymax + ratio * height, 0, img_height)
-            new_width = new_xmax - new_xmin
-            new_height = new_ymax - new_ymin
-            return [new_xmin, new_ymin, new_width, new_height]
-
-        keypoints = np.where(keypoints[:, 1:] !=0, keypoints[:, 1:], np.nan)
-        keypoints[:, 0] *= self.img_w
-        keypoints[:, 1] *= self.img_h
-        xmin = np.nanmin(keypoints[:,0])
-        ymin = np.nanmin(keypoints[:,1])
-        xmax = np.nanmax(keypoints[:,0])
-        ymax = np.nanmax(keypoints[:,1])
-        bbox = expand_bbox(xmin, xmax, ymin, ymax, self.img_w, self.img_h)
+        bboxes, is_valid = keypoints_to_bboxes(keypoints[None], self.img_w, self.img_h)
         # discard bbox with width and height == 0
-        if bbox[2] < 1 or bbox[3] < 1 :
-            return None
-        return bbox
+        return list(bboxes[0]) if is_valid[0] else None
 
-    def get_keypoints(self, humans, counts, peaks, get_bbox=False):
+    def get_keypoints(self, humans, counts, peaks, get_bbox=False, image_size=None, batch_idx=0):
         """Get all persons keypoint from predictions obtained via TRT pose."""
-        def is_good_person_keypoints(keypoints):
-            # Если не включаем голову, берем ключевые точки начиная с индекса 5
-            total_keypoints = keypoints[5:, 1:] if not self.include_head else keypoints[:, 1:]
-            # Определяем количество валидных (ненулевых) точек
-            num_valid_joints = np.count_nonzero(total_keypoints)
-            # Для ног берем последние 6-7 точек (зависит от вашей топологии)
-            num_leg_joints = np.count_nonzero(total_keypoints[-7:-1])
-            return num_valid_joints >= self.min_total_joints and num_leg_joints >= self.min_leg_joints
-
-        predictions = []
-        for cnt in range(counts):
-            keypoints = np.zeros((18, 3), dtype=np.float64)
-            # Получаем данные для текущего человека
-            human = humans[0][cnt]
-            C = human.shape[0]
-            for j in range(C):
-                k = int(human[j])
-                if k >= 0:
-                    # Пробуем извлечь данные для j-й ключевой точки
-                    try:
-                        peak_val = peaks[0][j][k]
-                        # Убедимся, что peak_val имеет хотя бы 2 элемента (координаты)
-                        if len(peak_val) >= 2:
-                            peak = (j, float(peak_val[1]), float(peak_val[0]))
-                        else:
-                            # Если данные короче ожидаемого, используем нули
-                            peak = (j, 0.0, 0.0)
-                    except Exception as e:
-                        print(f"[WARNING] Не удалось получить данные для ключевой точки {j} у человека {cnt}: {e}")
-                        peak = (j, 0.0, 0.0)
-                else:
-                    peak = (j, 0.0, 0.0)
-                # Преобразуем peak в массив фиксированной длины и записываем в keypoints
-                try:
-                    # Если peak – кортеж с 3 элементами, он корректно преобразуется в массив
-                    keypoints[j] = np.array(peak, dtype=np.float64)
-                except Exception as e:
-                    print(f"[WARNING] Не удалось записать keypoint для индекса {j} у человека {cnt}: {e}")
-                    keypoints[j] = np.array([j, 0.0, 0.0], dtype=np.float64)
-
-            if is_good_person_keypoints(keypoints):
-                ann = Annotation(keypoints)
-                if get_bbox:
-                    ann.bbox = self.get_bbox_from_keypoints(ann.keypoints)
-                predictions.append(ann)
-
-        return predictions
+        img_h, img_w = image_size if image_size is not None else (self.img_h, self.img_w)
 
+        keypoints = decode_keypoints(counts, humans, peaks, batch_idx=batch_idx)
+        keypoints = keypoints[filter_keypoints(
+            keypoints, self.min_total_joints, self.min_leg_joints, self.include_head)]
+        if not get_bbox:
+            return FrameResult(keypoints)
+        bboxes, is_valid = keypoints_to_bboxes(keypoints, img_w, img_h)
+        return FrameResult(keypoints, bboxes, is_valid)
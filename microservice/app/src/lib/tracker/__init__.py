@@ -1,13 +1,22 @@
 # -*- coding: utf-8 -*-
 from .deepsort.deepsort import DeepSort
+from .sort.sort import Sort
 
 # from .norfair.norfair import NorFair
 
 trackers = {
     'deepsort': DeepSort,
+    'sort': Sort,
     # 'norfair' : NorFair #TODO add implementation on master branch
 }
 
 
+def get_tracker_name(name, **kwargs):
+    """Resolve `deepsort` configured without reid model (`reid_name: none`) to `sort`."""
+    if name == 'deepsort' and 'reid_name' in kwargs and kwargs['reid_name'] in (None, 'none'):
+        return 'sort'
+    return name
+
+
 def get_tracker(name, **kwargs):
-    return trackers[name](**kwargs)
+    return trackers[get_tracker_name(name, **kwargs)](**kwargs)
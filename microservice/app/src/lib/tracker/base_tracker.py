@@ -0,0 +1,104 @@
+import cv2
+import numpy as np
+import torch
+
+from .deepsort.sort.tracker import Tracker
+
+__all__ = ['BaseTracker']
+
+
+class BaseTracker(object):
+    """Kalman filter tracker of the people of a FrameResult.
+
+    It owns the `Tracker` state and the frame loop: the tracks are predicted,
+    the detections of the frame are built by `_create_detections` and
+    associated, and the tracked ids and bboxes are written to the predictions.
+    Subclasses decide which appearance features the detections carry,
+    `metric` None associates by IOU and Mahalanobis gating only.
+    """
+
+    def __init__(self, metric=None, max_iou_distance=0.7, max_age=70, n_init=3,
+                 spatial_index_min_pairs=None):
+        self.tracker = Tracker(
+            metric,
+            max_iou_distance=max_iou_distance,
+            max_age=max_age,
+            n_init=n_init,
+            spatial_index_min_pairs=spatial_index_min_pairs
+        )
+
+    def predict(self, rgb_img, predictions, debug=False):
+        """Update tracker state via analyis of current keypoint's bboxes with previous tracked bbox.
+        args:
+            predictions (FrameResult): keypoints and bboxes, (xmin, ymin, w, h), of the frame.
+            img (np.ndarray): original rgb image.
+        return:
+            tracked_predictions (FrameResult): rows of the tracked persons with
+                    tracked ids and tracked bboxes (top,left,btm,right) filled in.
+            debug_img (np.ndarray or None)
+        """
+
+        # generate detections from the people with a valid bbox
+        det_rows = np.flatnonzero(predictions.has_bbox)
+        if len(det_rows) == 0:
+            print("[ERROR] Нет корректных bbox для обработки.")
+        bbox_tlwh = predictions.bboxes[det_rows]
+        bbox_tlbr = self.tlwh_to_tlbr(bbox_tlwh)
+
+        self.tracker.predict() # update track_id's time_since_update and age increasement
+        detections = self._create_detections(rgb_img, predictions, det_rows, bbox_tlwh, bbox_tlbr)
+
+        # update tracker and predictions object
+        self.tracker.update(detections, predictions, det_rows) # update predictions with tracked ID and bbox
+        # filter untracked persons' keypoints
+        tracked_predictions = predictions.select(predictions.ids > 0)
+        if debug:
+            debug_img = rgb_img[...,::-1].copy()
+            self.debug_bboxes(debug_img, self.tracker.tracks, bbox_tlbr)
+            return tracked_predictions, debug_img
+
+        return tracked_predictions, None
+
+    def _create_detections(self, rgb_img, predictions, det_rows, bbox_tlwh, bbox_tlbr):
+        """Detections of the frame, called after the tracks are predicted.
+        return:
+            detections (List[Detection]): one detection per row of `det_rows`.
+        """
+        raise NotImplementedError
+
+    def gallery_memory_usage(self):
+        """Memory used by the appearance gallery of the tracks, None without a gallery."""
+        return None
+
+    def reid_stats(self):
+        """Number of extracted and reused reid embeddings, None without a reid model."""
+        return None
+
+    def increment_ages(self):
+        self.tracker.increment_ages()
+
+    @staticmethod
+    def tlwh_to_tlbr(bbox_tlwh):
+        if isinstance(bbox_tlwh, np.ndarray):
+            bbox_tlbr = bbox_tlwh.copy()
+        elif isinstance(bbox_tlwh, torch.Tensor):
+            bbox_tlbr = bbox_tlwh.clone()
+
+        bbox_tlbr[:, 2] += bbox_tlwh[:, 0]
+        bbox_tlbr[:, 3] += bbox_tlwh[:, 1]
+        return bbox_tlbr
+
+    @staticmethod
+    def debug_bboxes(image, tracks, detections):
+        for track in tracks:
+            # if track.is_comfirmed: continue
+            x1, y1, x2, y2 = map(int, track.to_tlbr())
+            text = f'{track.track_id}: update[{track.time_since_update}]'
+            cv2.rectangle(image, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            cv2.putText(image, text, ((x1+x2)//2, (y1+y2)//2),
+                        cv2.FONT_HERSHEY_COMPLEX, 0.8, (0, 255, 0), 2)
+        for idx, det in enumerate(detections):
+            x1, y1, x2, y2 = map(int, det)
+            cv2.rectangle(image, (x1,y1), (x2,y2), (255,0,0), 2)
+            cv2.putText(image, f'{idx}: detect', (x1,y1-5),
+                        cv2.FONT_HERSHEY_COMPLEX, 0.8, (255,0,0), 2)
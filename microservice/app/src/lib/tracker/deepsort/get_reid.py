@@ -3,6 +3,7 @@ from .models.wide_resnet import WideResnet
 from .models.siamese_net import SiameseNet
 from .models.osnet import osnet_ibn_x1_0
 from .models.mudeep import MuDeep
+from .hsv_descriptor import HsvStripeExtractor
 
 
 _reid_model = {
@@ -11,9 +12,22 @@ _reid_model = {
         'osnet_ibn_x1_0': osnet_ibn_x1_0
         }
 
+# appearance descriptors computed without a network, for low-power devices
+_handcrafted_extractors = {
+        'hsv_stripes': HsvStripeExtractor,
+        }
+
 def get_reid_network(reid_name, num_classes=751, reid=False):
     avai_models = list(_reid_model.keys())
     if reid_name not in avai_models:
         raise KeyError('Unknown model: {}. Must be one of {}'.format(
             reid_name, avai_models))
     return _reid_model[reid_name](num_classes=num_classes, reid=reid)
+
+def get_feature_extractor(reid_name, **kwargs):
+    """Build the reid feature extractor: a handcrafted descriptor or a reid network."""
+    if reid_name in _handcrafted_extractors:
+        return _handcrafted_extractors[reid_name](**kwargs)
+    # imported here as it initializes CUDA, which the handcrafted descriptors do not need
+    from .reid_feature_extractor import FeatureExtractor
+    return FeatureExtractor(reid_name=reid_name, **kwargs)
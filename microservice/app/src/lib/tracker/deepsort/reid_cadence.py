@@ -0,0 +1,82 @@
+import numpy as np
+
+from .sort import iou_matching
+
+
+class ReidCadence(object):
+    """Decide which detections need a fresh reid embedding.
+
+    A detection reuses the last embedding of a track instead of running the
+    reid model when all of these hold:
+        * the track is confirmed and was matched in the previous frame,
+        * its last embedding was extracted less than `interval` frames ago,
+        * the detection overlaps the predicted track box with IOU >= `min_iou`,
+        * no other detection or track overlaps the pair with IOU above
+          `max_crossing_iou`, i.e. the people are not crossing.
+    New tracks, low overlaps and crossings always get a fresh embedding.
+
+    args:
+        interval (int): frames an embedding is reused at most, 1 extracts
+            every detection on every frame.
+        min_iou (float): minimum IOU between the detection and the predicted
+            track box to reuse the track embedding.
+        max_crossing_iou (float): maximum IOU with any other box of the pair.
+    """
+
+    def __init__(self, interval=1, min_iou=0.7, max_crossing_iou=0.3):
+        self.interval = interval
+        self.min_iou = min_iou
+        self.max_crossing_iou = max_crossing_iou
+        self.num_extracted = 0
+        self.num_reused = 0
+
+    def select(self, tracks, bbox_tlwh):
+        """Select the detections to extract embeddings for.
+
+        args:
+            tracks (List[Track]): tracks after the Kalman prediction step.
+            bbox_tlwh (np.ndarray): (N, 4) detection bboxes of (xmin, ymin, w, h).
+        return:
+            needs_feature (np.ndarray): (N,) True for detections to run reid on.
+            features (list): the reused track embedding of the other detections,
+                None for the detections in `needs_feature`.
+        """
+        num_detections = len(bbox_tlwh)
+        needs_feature = np.ones(num_detections, dtype=bool)
+        features = [None] * num_detections
+
+        candidates = [
+            i for i, t in enumerate(tracks)
+            if self.interval > 1 and t.is_confirmed() and t.time_since_update == 1
+            and t.last_feature is not None and t.time_since_feature < self.interval]
+        if candidates and num_detections > 0:
+            track_tlwh = iou_matching.tracks_to_tlwh(
+                tracks, list(range(len(tracks))))
+            ious = iou_matching.iou_matrix(
+                np.asarray(bbox_tlwh, dtype=np.float64).reshape(-1, 4), track_tlwh)
+            for det_idx in range(num_detections):
+                track_idx = int(np.argmax(ious[det_idx]))
+                if track_idx not in candidates or ious[det_idx, track_idx] < self.min_iou:
+                    continue
+                # the other tracks of the detection and the other detections of the track
+                other_tracks = np.delete(ious[det_idx], track_idx)
+                other_detections = np.delete(ious[:, track_idx], det_idx)
+                if other_tracks.max(initial=0) > self.max_crossing_iou or \
+                        other_detections.max(initial=0) > self.max_crossing_iou:
+                    continue
+                needs_feature[det_idx] = False
+                features[det_idx] = tracks[track_idx].last_feature
+
+        num_extracted = int(needs_feature.sum())
+        self.num_extracted += num_extracted
+        self.num_reused += num_detections - num_extracted
+        return needs_feature, features
+
+    def stats(self):
+        """Number of extracted and reused embeddings so far."""
+        total = max(self.num_extracted + self.num_reused, 1)
+        return {
+            'extracted': self.num_extracted,
+            'reused': self.num_reused,
+            'reuse_rate': self.num_reused / total,
+        }
@@ -5,14 +5,14 @@ import torch
 torch.tensor(1, device='cuda') # temp fix for pycuda gpu allocation conflict
 import numpy as np
 try:
+    # the caller makes a CUDA context current, in the service the model lock of the registry does
     import pycuda.driver as cuda
-    import pycuda.autoinit
     import tensorrt as trt
 except: print("pycuda or tensorrt not installed.")
 from PIL import Image
-from torchvision import transforms
 
 from . import tracker_utils as utils
+from .reid_preprocess import ReidPreprocessor
 
 def np_transform(image, data_meta):
     h, w = data_meta['size']
@@ -42,12 +42,9 @@ class FeatureExtractor:
 
         else:
             self.extractor = self._load_torch_model(model_path)
-        # setup transforms
-        self.tfms = transforms.Compose([
-            transforms.Resize(self.data_meta['size']),
-            transforms.ToTensor(),
-            transforms.Normalize(self.data_meta['mean'], self.data_meta['std'])
-        ])
+        # setup batched preprocessing with reused buffers
+        self.preprocessor = ReidPreprocessor(
+            self.data_meta['size'], self.data_meta['mean'], self.data_meta['std'])
 
     def _load_trt_model(self, model_path):
         """Load TensorRT engine."""
@@ -67,9 +64,7 @@ class FeatureExtractor:
         return model
 
     def _preprocess(self, images):
-        imgs = [self.tfms(Image.fromarray(image))[None] for image in images]
-        img_batch = torch.cat(imgs, dim=0).float()
-        return img_batch
+        return torch.from_numpy(self.preprocessor(images))
 
     def inference_trt(self, batch_images: np.ndarray):
         """Predict with TensorRT engine."""
@@ -100,7 +95,32 @@ class FeatureExtractor:
 
     @torch.no_grad()
     def __call__(self, images):
-        batch_images = self._preprocess(images)
+        """Extract reid features of a list of rgb person crops."""
+        return self._inference(self._preprocess(images))
+
+    @torch.no_grad()
+    def extract(self, image, boxes, keypoints=None):
+        """Extract reid features of the (xmin, ymin, xmax, ymax) boxes of an rgb image.
+        The keypoints are not used by the reid networks.
+        """
+        return self._inference(torch.from_numpy(self.preprocessor.from_image(image, boxes)))
+
+    @torch.no_grad()
+    def extract_many(self, images, boxes, keypoints=None):
+        """Extract reid features of the boxes of several images with one model call.
+        args:
+            images (List[np.ndarray]): rgb images.
+            boxes (List[np.ndarray]): (N_i, 4) boxes of (xmin, ymin, xmax, ymax) of every image.
+        return:
+            features (List[np.ndarray]): (N_i, dim) features of every image.
+        """
+        sizes = [len(np.asarray(b).reshape(-1, 4)) for b in boxes]
+        if sum(sizes) == 0:
+            return [np.array([]) for _ in sizes]
+        features = self._inference(torch.from_numpy(self.preprocessor.from_images(images, boxes)))
+        return np.split(features, np.cumsum(sizes)[:-1])
+
+    def _inference(self, batch_images):
         if self.is_trt:
             # run with trt engine
             features = self.inference_trt(batch_images.numpy())
@@ -0,0 +1,88 @@
+import numpy as np
+from PIL import Image
+
+
+class ReidPreprocessor:
+    """Batched crop, resize and normalize of person images for the reid model.
+
+    Every crop is resized with the bilinear PIL resize the reid models were
+    trained with and copied into a uint8 staging buffer, and the whole batch is converted to a normalized float32
+    (N, 3, H, W) array in one vectorized step. Both buffers are kept and
+    reused across frames, they only grow when a larger batch arrives.
+
+    args:
+        size (tuple): (height, width) of the reid model input.
+        mean (list): per channel mean of the normalization, for [0, 1] images.
+        std (list): per channel std of the normalization, for [0, 1] images.
+    """
+
+    def __init__(self, size, mean, std):
+        self.height, self.width = size
+        std = np.asarray(std, dtype=np.float32).reshape(1, 3, 1, 1)
+        mean = np.asarray(mean, dtype=np.float32).reshape(1, 3, 1, 1)
+        # (x / 255 - mean) / std == x * scale - offset
+        self._scale = 1. / (255. * std)
+        self._offset = mean / std
+        self._staging = np.empty((0, self.height, self.width, 3), dtype=np.uint8)
+        self._batch = np.empty((0, 3, self.height, self.width), dtype=np.float32)
+
+    def _reserve(self, num_crops):
+        if num_crops > len(self._batch):
+            capacity = max(num_crops, 2 * len(self._batch), 8)
+            self._staging = np.empty((capacity, self.height, self.width, 3), dtype=np.uint8)
+            self._batch = np.empty((capacity, 3, self.height, self.width), dtype=np.float32)
+
+    def _resize_into(self, idx, crop):
+        # same antialiased bilinear resize as the training transform, cv2
+        # INTER_AREA/INTER_LINEAR drift up to 0.4 in normalized units on textured crops
+        resized = Image.fromarray(crop).resize((self.width, self.height), resample=Image.BILINEAR)
+        self._staging[idx] = np.asarray(resized)
+
+    def _normalize(self, num_crops):
+        batch = self._batch[:num_crops]
+        np.multiply(self._staging[:num_crops].transpose(0, 3, 1, 2), self._scale, out=batch)
+        batch -= self._offset
+        return batch
+
+    def __call__(self, crops):
+        """Preprocess a list of (h, w, 3) uint8 crops.
+        return:
+            batch (np.ndarray): (N, 3, H, W) float32, a view of the reused
+                buffer that stays valid until the next call.
+        """
+        self._reserve(len(crops))
+        for idx, crop in enumerate(crops):
+            self._resize_into(idx, np.ascontiguousarray(crop))
+        return self._normalize(len(crops))
+
+    def from_image(self, image, boxes):
+        """Crop the boxes of (xmin, ymin, xmax, ymax) from the image and preprocess them.
+        Boxes are clipped to the image and are at least one pixel large.
+        return:
+            batch (np.ndarray): (N, 3, H, W) float32, a view of the reused
+                buffer that stays valid until the next call.
+        """
+        return self.from_images([image], [boxes])
+
+    def from_images(self, images, boxes):
+        """Preprocess the boxes of several images into one batch, in image order.
+        args:
+            images (List[np.ndarray]): rgb images.
+            boxes (List[np.ndarray]): (N_i, 4) boxes of (xmin, ymin, xmax, ymax) of every image.
+        return:
+            batch (np.ndarray): (sum N_i, 3, H, W) float32, a view of the reused
+                buffer that stays valid until the next call.
+        """
+        boxes = [np.asarray(b).reshape(-1, 4).astype(np.int64) for b in boxes]
+        self._reserve(sum(len(b) for b in boxes))
+        idx = 0
+        for image, image_boxes in zip(images, boxes):
+            img_h, img_w = image.shape[:2]
+            x1 = np.clip(image_boxes[:, 0], 0, img_w - 1)
+            y1 = np.clip(image_boxes[:, 1], 0, img_h - 1)
+            x2 = np.clip(image_boxes[:, 2], x1 + 1, img_w)
+            y2 = np.clip(image_boxes[:, 3], y1 + 1, img_h)
+            for i in range(len(image_boxes)):
+                self._resize_into(idx, image[y1[i]:y2[i], x1[i]:x2[i]])
+                idx += 1
+        return self._normalize(idx)
@@ -10,8 +10,12 @@ class Detection(object):
     ----------
     tlwh : array_like
         Bounding box in format `(x, y, w, h)`.
-    feature : array_like
+    feature : Optional[array_like]
         A feature vector that describes the object contained in this image.
+    is_reused_feature : Optional[bool]
+        True if `feature` is the last embedding of a track rather than one
+        extracted from this image. Reused features are not added to the
+        track's gallery.
 
     Attributes
     ----------
@@ -24,10 +28,11 @@ class Detection(object):
 
     """
 
-    def __init__(self, tlwh, feature):
+    def __init__(self, tlwh, feature, is_reused_feature=False):
         self.tlwh = np.asarray(tlwh, dtype=np.float64)
         # self.confidence = float(confidence)
-        self.feature = np.asarray(feature, dtype=np.float32)
+        self.feature = np.asarray(feature, dtype=np.float32) if feature is not None else None
+        self.is_reused_feature = is_reused_feature
 
     def to_tlbr(self):
         """Convert bounding box to format `(min x, min y, max x, max y)`, i.e.,
@@ -39,8 +39,82 @@ def iou(bbox, candidates):
     return area_intersection / (area_bbox + area_candidates - area_intersection)
 
 
+def iou_matrix(bboxes, candidates):
+    """Compute intersection over union between all pairs of bounding boxes.
+
+    Parameters
+    ----------
+    bboxes : ndarray
+        An Nx4 matrix of bounding boxes in format `(top left x, top left y,
+        width, height)`.
+    candidates : ndarray
+        An Mx4 matrix of candidate bounding boxes in the same format.
+
+    Returns
+    -------
+    ndarray
+        The NxM matrix of intersection over union in [0, 1], where element
+        (i, j) is the `iou` between `bboxes[i]` and `candidates[j]`.
+
+    """
+    bboxes_tl = bboxes[:, np.newaxis, :2]
+    bboxes_br = bboxes[:, np.newaxis, :2] + bboxes[:, np.newaxis, 2:]
+    candidates_tl = candidates[np.newaxis, :, :2]
+    candidates_br = candidates[np.newaxis, :, :2] + candidates[np.newaxis, :, 2:]
+
+    wh = np.maximum(0., np.minimum(bboxes_br, candidates_br)
+                    - np.maximum(bboxes_tl, candidates_tl))
+    area_intersection = wh.prod(axis=2)
+    area_bboxes = bboxes[:, 2:].prod(axis=1)
+    area_candidates = candidates[:, 2:].prod(axis=1)
+    return area_intersection / (
+        area_bboxes[:, np.newaxis] + area_candidates[np.newaxis, :] - area_intersection)
+
+
+def iou_pairs(bboxes, candidates, rows, cols):
+    """Compute intersection over union of the given pairs of bounding boxes.
+
+    Parameters
+    ----------
+    bboxes : ndarray
+        An Nx4 matrix of bounding boxes in format `(top left x, top left y,
+        width, height)`.
+    candidates : ndarray
+        An Mx4 matrix of candidate bounding boxes in the same format.
+    rows : ndarray
+        Indices into `bboxes` of the pairs.
+    cols : ndarray
+        Indices into `candidates` of the pairs.
+
+    Returns
+    -------
+    ndarray
+        The intersection over union of `bboxes[rows[k]]` and
+        `candidates[cols[k]]` for every pair k.
+
+    """
+    bboxes, candidates = bboxes[rows], candidates[cols]
+    tl = np.maximum(bboxes[:, :2], candidates[:, :2])
+    br = np.minimum(bboxes[:, :2] + bboxes[:, 2:], candidates[:, :2] + candidates[:, 2:])
+    area_intersection = np.maximum(0., br - tl).prod(axis=1)
+    area_bboxes = bboxes[:, 2:].prod(axis=1)
+    area_candidates = candidates[:, 2:].prod(axis=1)
+    return area_intersection / (area_bboxes + area_candidates - area_intersection)
+
+
+def tracks_to_tlwh(tracks, track_indices):
+    """Get the current bounding boxes of the given tracks as an Nx4 matrix in
+    format `(top left x, top left y, width, height)`."""
+    if len(track_indices) == 0:
+        return np.zeros((0, 4))
+    ret = np.stack([tracks[i].mean[:4] for i in track_indices])
+    ret[:, 2] *= ret[:, 3]
+    ret[:, :2] -= ret[:, 2:] / 2
+    return ret
+
+
 def iou_cost(tracks, detections, track_indices=None,
-             detection_indices=None):
+             detection_indices=None, track_tlwh=None, detection_tlwh=None):
     """An intersection over union distance metric.
 
     Parameters
@@ -55,6 +129,12 @@ def iou_cost(tracks, detections, track_indices=None,
     detection_indices : Optional[List[int]]
         A list of indices to detections that should be matched. Defaults
         to all `detections`.
+    track_tlwh : Optional[ndarray]
+        Precomputed bounding boxes of all `tracks` in format `(top left x,
+        top left y, width, height)`. Computed from the track states if None.
+    detection_tlwh : Optional[ndarray]
+        Precomputed bounding boxes of all `detections` in the same format.
+        Gathered from the detections if None.
 
     Returns
     -------
@@ -69,14 +149,19 @@ def iou_cost(tracks, detections, track_indices=None,
     if detection_indices is None:
         detection_indices = np.arange(len(detections))
 
-    cost_matrix = np.zeros((len(track_indices), len(detection_indices)))
-    for row, track_idx in enumerate(track_indices):
-        if tracks[track_idx].time_since_update > 1:
-            cost_matrix[row, :] = linear_assignment.INFTY_COST
-            continue
-
-        bbox = tracks[track_idx].to_tlwh()
+    if track_tlwh is None:
+        bboxes = tracks_to_tlwh(tracks, track_indices)
+    else:
+        bboxes = np.asarray(track_tlwh).reshape(-1, 4)[np.asarray(track_indices, dtype=int)]
+    if detection_tlwh is None:
         candidates = np.asarray(
-            [detections[i].tlwh for i in detection_indices])
-        cost_matrix[row, :] = 1. - iou(bbox, candidates)
-    return cost_matrix
\ No newline at end of file
+            [detections[i].tlwh for i in detection_indices]).reshape(-1, 4)
+    else:
+        candidates = np.asarray(detection_tlwh).reshape(-1, 4)[
+            np.asarray(detection_indices, dtype=int)]
+
+    cost_matrix = 1. - iou_matrix(bboxes, candidates)
+    is_stale = np.array(
+        [tracks[i].time_since_update > 1 for i in track_indices], dtype=bool)
+    cost_matrix[is_stale, :] = linear_assignment.INFTY_COST
+    return cost_matrix
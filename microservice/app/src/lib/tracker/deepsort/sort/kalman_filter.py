@@ -227,3 +227,149 @@ class KalmanFilter(object):
             overwrite_b=True)
         squared_maha = np.sum(z * z, axis=0)
         return squared_maha
+
+    def _multi_diag(self, std):
+        """Stack of diagonal matrices with the squared `std` rows on the diagonal."""
+        num, ndim = std.shape
+        diag = np.zeros((num, ndim, ndim))
+        idx = np.arange(ndim)
+        diag[:, idx, idx] = np.square(std)
+        return diag
+
+    def multi_predict(self, mean, covariance):
+        """Run Kalman filter prediction step for a stack of states.
+
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional mean vectors of the object states at the
+            previous time step.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices of the object states at
+            the previous time step.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the mean vectors and covariance matrices of the predicted
+            states.
+
+        """
+        height = mean[:, 3]
+        std = np.stack([
+            self._std_weight_position * height,
+            self._std_weight_position * height,
+            np.full_like(height, 1e-2),
+            self._std_weight_position * height,
+            self._std_weight_velocity * height,
+            self._std_weight_velocity * height,
+            np.full_like(height, 1e-5),
+            self._std_weight_velocity * height], axis=1)
+        motion_cov = self._multi_diag(std)
+
+        mean = np.dot(mean, self._motion_mat.T)
+        covariance = np.matmul(
+            np.matmul(self._motion_mat, covariance), self._motion_mat.T) + motion_cov
+
+        return mean, covariance
+
+    def multi_project(self, mean, covariance):
+        """Project a stack of state distributions to measurement space.
+
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional mean vectors of the states.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices of the states.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the Nx4 projected means and Nx4x4 covariance matrices of
+            the given state estimates.
+
+        """
+        height = mean[:, 3]
+        std = np.stack([
+            self._std_weight_position * height,
+            self._std_weight_position * height,
+            np.full_like(height, 1e-1),
+            self._std_weight_position * height], axis=1)
+        innovation_cov = self._multi_diag(std)
+
+        mean = np.dot(mean, self._update_mat.T)
+        covariance = np.matmul(
+            np.matmul(self._update_mat, covariance), self._update_mat.T)
+        return mean, covariance + innovation_cov
+
+    def multi_update(self, mean, covariance, measurement):
+        """Run Kalman filter correction step for a stack of states.
+
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional predicted mean vectors.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices of the states.
+        measurement : ndarray
+            The Nx4 dimensional measurement vectors (x, y, a, h), the i-th
+            measurement is associated with the i-th state.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the measurement-corrected state distributions.
+
+        """
+        projected_mean, projected_cov = self.multi_project(mean, covariance)
+
+        # K = P H^T S^-1, solved as S K^T = H P^T with S symmetric
+        kalman_gain = np.linalg.solve(
+            projected_cov,
+            np.matmul(self._update_mat, np.swapaxes(covariance, 1, 2)))
+        kalman_gain = np.swapaxes(kalman_gain, 1, 2)
+        innovation = measurement - projected_mean
+
+        new_mean = mean + np.einsum('nij,nj->ni', kalman_gain, innovation)
+        new_covariance = covariance - np.matmul(
+            np.matmul(kalman_gain, projected_cov), np.swapaxes(kalman_gain, 1, 2))
+        return new_mean, new_covariance
+
+    def multi_gating_distance(self, mean, covariance, measurements,
+                              only_position=False):
+        """Compute gating distances between a stack of state distributions and
+        measurements.
+
+        Parameters
+        ----------
+        mean : ndarray
+            Mean vectors over the state distributions (Nx8 dimensional).
+        covariance : ndarray
+            Covariances of the state distributions (Nx8x8 dimensional).
+        measurements : ndarray
+            An Mx4 dimensional matrix of M measurements, each in
+            format (x, y, a, h).
+        only_position : Optional[bool]
+            If True, distance computation is done with respect to the bounding
+            box center position only.
+
+        Returns
+        -------
+        ndarray
+            Returns an NxM array, where element (i, j) contains the squared
+            Mahalanobis distance between the i-th state distribution and
+            `measurements[j]`.
+
+        """
+        mean, covariance = self.multi_project(mean, covariance)
+        measurements = np.asarray(measurements).reshape(-1, 4)
+        if only_position:
+            mean, covariance = mean[:, :2], covariance[:, :2, :2]
+            measurements = measurements[:, :2]
+
+        cholesky_factor = np.linalg.cholesky(covariance)
+        d = measurements[np.newaxis, :, :] - mean[:, np.newaxis, :]
+        z = np.linalg.solve(cholesky_factor, np.swapaxes(d, 1, 2))
+        squared_maha = np.sum(z * z, axis=1)
+        return squared_maha
@@ -1,9 +1,12 @@
 # vim: expandtab:ts=4:sw=4
 from __future__ import absolute_import
 import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
 # from sklearn.utils.linear_assignment_ import linear_assignment
 from scipy.optimize import linear_sum_assignment as linear_assignment
 from . import kalman_filter
+from . import spatial_index
 
 
 INFTY_COST = 1e+5
@@ -56,24 +59,58 @@ def min_cost_matching(
     cost_matrix = distance_metric(
         tracks, detections, track_indices, detection_indices)
     cost_matrix[cost_matrix > max_distance] = max_distance + 1e-5
+    return min_cost_matching_from_cost(
+        cost_matrix, max_distance, track_indices, detection_indices)
 
+
+def min_cost_matching_from_cost(
+        cost_matrix, max_distance, track_indices, detection_indices):
+    """Solve linear assignment problem on a precomputed cost matrix.
+
+    Parameters
+    ----------
+    cost_matrix : ndarray
+        The NxM dimensional cost matrix, where entry (i, j) is the association
+        cost between `track_indices[i]` and `detection_indices[j]`.
+    max_distance : float
+        Gating threshold. Associations with cost larger than this value are
+        disregarded.
+    track_indices : List[int]
+        List of track indices that maps rows in `cost_matrix` to tracks.
+    detection_indices : List[int]
+        List of detection indices that maps columns in `cost_matrix` to
+        detections.
+
+    Returns
+    -------
+    (List[(int, int)], List[int], List[int])
+        Returns a tuple with the following three entries:
+        * A list of matched track and detection indices.
+        * A list of unmatched track indices.
+        * A list of unmatched detection indices.
+
+    """
     row_indices, col_indices = linear_assignment(cost_matrix) # hungarian assigment on cost matrix
+    is_match = cost_matrix[row_indices, col_indices] <= max_distance
 
-    matches, unmatched_tracks, unmatched_detections = [], [], []
-    for col, detection_idx in enumerate(detection_indices):
-        if col not in col_indices:
-            unmatched_detections.append(detection_idx)
-    for row, track_idx in enumerate(track_indices):
-        if row not in row_indices:
-            unmatched_tracks.append(track_idx)
-    for row, col in zip(row_indices, col_indices):
+    is_row_assigned = np.zeros(cost_matrix.shape[0], dtype=bool)
+    is_row_assigned[row_indices] = True
+    is_col_assigned = np.zeros(cost_matrix.shape[1], dtype=bool)
+    is_col_assigned[col_indices] = True
+
+    # unassigned rows/columns first, then the assigned pairs that are too costly
+    unmatched_tracks = [track_indices[row] for row in np.flatnonzero(~is_row_assigned)]
+    unmatched_detections = [
+        detection_indices[col] for col in np.flatnonzero(~is_col_assigned)]
+    matches = []
+    for row, col, matched in zip(row_indices, col_indices, is_match):
         track_idx = track_indices[row]
         detection_idx = detection_indices[col]
-        if cost_matrix[row, col] > max_distance:
+        if matched:
+            matches.append((track_idx, detection_idx))
+        else:
             unmatched_tracks.append(track_idx)
             unmatched_detections.append(detection_idx)
-        else:
-            matches.append((track_idx, detection_idx))
     return matches, unmatched_tracks, unmatched_detections
 
 
@@ -120,26 +157,32 @@ def matching_cascade(
     if detection_indices is None:
         detection_indices = list(range(len(detections)))
 
-    unmatched_detections = detection_indices
-    matches = []
+    if len(track_indices) == 0 or len(detection_indices) == 0:
+        return [], list(set(track_indices)), detection_indices  # Nothing to match.
 
-    for level in range(cascade_depth):
-        if len(unmatched_detections) == 0:  # No detections left
-            break
+    # Appearance and gating costs only depend on the (track, detection) pair,
+    # so they are computed once and every cascade level takes its rows.
+    cost_matrix = distance_metric(
+        tracks, detections, track_indices, detection_indices)
+    cost_matrix[cost_matrix > max_distance] = max_distance + 1e-5
+    track_ages = np.array([tracks[k].time_since_update for k in track_indices])
 
-        track_indices_l = [
-            k for k in track_indices
-            if tracks[k].time_since_update == 1 + level
-        ]
-        if len(track_indices_l) == 0:  # Nothing to match at this level
+    unmatched_cols = list(range(len(detection_indices)))
+    matches = []
+    for age in np.unique(track_ages):  # levels without tracks are never visited
+        if age < 1 or age > cascade_depth:
             continue
+        if len(unmatched_cols) == 0:  # No detections left
+            break
 
-        matches_l, _, unmatched_detections = \
-            min_cost_matching(
-                distance_metric, max_distance, tracks, detections,
-                track_indices_l, unmatched_detections)
-        matches += matches_l
+        rows_l = np.flatnonzero(track_ages == age)
+        matches_l, _, unmatched_cols = min_cost_matching_from_cost(
+            cost_matrix[np.ix_(rows_l, unmatched_cols)], max_distance,
+            rows_l, unmatched_cols)
+        matches += [
+            (track_indices[row], detection_indices[col]) for row, col in matches_l]
 
+    unmatched_detections = [detection_indices[col] for col in unmatched_cols]
     unmatched_tracks = list(set(track_indices) - set(k for k, _ in matches))
     return matches, unmatched_tracks, unmatched_detections
 
@@ -183,11 +226,231 @@ def gate_cost_matrix(
     """
     gating_dim = 2 if only_position else 4
     gating_threshold = kalman_filter.chi2inv95[gating_dim]
+    gating_distance = gating_distance_matrix(
+        kf, tracks, detections, track_indices, detection_indices, only_position)
+    cost_matrix[gating_distance > gating_threshold] = gated_cost
+    return cost_matrix
+
+
+def gating_distance_matrix(
+        kf, tracks, detections, track_indices, detection_indices,
+        only_position=False):
+    """Compute the squared Mahalanobis distances between all given tracks
+    and detections in one vectorized pass.
+
+    Parameters
+    ----------
+    kf : The Kalman filter.
+    tracks : List[track.Track]
+        A list of predicted tracks at the current time step.
+    detections : List[detection.Detection]
+        A list of detections at the current time step.
+    track_indices : List[int]
+        List of track indices that maps rows of the result to tracks in
+        `tracks`.
+    detection_indices : List[int]
+        List of detection indices that maps columns of the result to
+        detections in `detections`.
+    only_position : Optional[bool]
+        If True, only the x, y position of the state distribution is
+        considered. Defaults to False.
+
+    Returns
+    -------
+    ndarray
+        Returns the NxM dimensional matrix of squared Mahalanobis distances,
+        where N is the number of track indices and M is the number of
+        detection indices.
+
+    """
+    if len(track_indices) == 0:
+        return np.zeros((0, len(detection_indices)))
+    mean = np.stack([tracks[i].mean for i in track_indices])
+    covariance = np.stack([tracks[i].covariance for i in track_indices])
+    measurements = np.asarray(
+        [detections[i].to_xyah() for i in detection_indices]).reshape(-1, 4)
+    return kf.multi_gating_distance(mean, covariance, measurements, only_position)
+
+
+def gated_pairs(kf, tracks, detections, track_indices, detection_indices):
+    """Find the track and detection pairs that pass the Mahalanobis gate,
+    without computing the dense gating distance matrix.
+
+    Candidate detections of a track are looked up in a spatial grid with the
+    per-axis window `sqrt(chi2inv95[4] * S_ii)` around the projected track
+    position, where S is the projected covariance. A measurement outside of
+    this window can not pass the gate, so no feasible pair is missed.
+
+    Parameters
+    ----------
+    kf : The Kalman filter.
+    tracks : List[track.Track]
+        A list of predicted tracks at the current time step.
+    detections : List[detection.Detection]
+        A list of detections at the current time step.
+    track_indices : List[int]
+        List of candidate track indices.
+    detection_indices : List[int]
+        List of candidate detection indices.
+
+    Returns
+    -------
+    (ndarray, ndarray)
+        The positions in `track_indices` and `detection_indices` of the pairs
+        that pass the gate.
+
+    """
+    if len(track_indices) == 0 or len(detection_indices) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    gating_threshold = kalman_filter.chi2inv95[4]
+    mean, covariance = kf.multi_project(
+        np.stack([tracks[i].mean for i in track_indices]),
+        np.stack([tracks[i].covariance for i in track_indices]))
     measurements = np.asarray(
-        [detections[i].to_xyah() for i in detection_indices])
-    for row, track_idx in enumerate(track_indices):
-        track = tracks[track_idx]
-        gating_distance = kf.gating_distance(
-            track.mean, track.covariance, measurements, only_position)
-        cost_matrix[row, gating_distance > gating_threshold] = gated_cost
-    return cost_matrix
\ No newline at end of file
+        [detections[i].to_xyah() for i in detection_indices]).reshape(-1, 4)
+
+    half_window = np.sqrt(gating_threshold * np.diagonal(covariance, axis1=1, axis2=2)[:, :2])
+    windows = np.c_[mean[:, :2] - half_window, mean[:, :2] + half_window]
+    rows, cols = spatial_index.points_in_boxes(windows, measurements[:, :2])
+
+    cholesky_factor = np.linalg.cholesky(covariance)
+    d = measurements[cols] - mean[rows]
+    z = np.linalg.solve(cholesky_factor[rows], d[:, :, np.newaxis])[:, :, 0]
+    is_feasible = np.sum(z * z, axis=1) <= gating_threshold
+    return rows[is_feasible], cols[is_feasible]
+
+
+def min_cost_matching_sparse(
+        rows, cols, costs, max_distance, track_indices, detection_indices):
+    """Solve linear assignment problem on a sparse set of candidate pairs.
+
+    Pairs that are not given, or whose cost is larger than `max_distance`,
+    can not be matched. The remaining pairs are split into connected
+    components, each solved separately, which gives the same total cost as
+    solving the dense problem.
+
+    Parameters
+    ----------
+    rows : ndarray
+        Positions in `track_indices` of the candidate pairs.
+    cols : ndarray
+        Positions in `detection_indices` of the candidate pairs.
+    costs : ndarray
+        Association costs of the candidate pairs.
+    max_distance : float
+        Gating threshold. Associations with cost larger than this value are
+        disregarded.
+    track_indices : List[int]
+        List of track indices.
+    detection_indices : List[int]
+        List of detection indices.
+
+    Returns
+    -------
+    (List[(int, int)], List[int], List[int])
+        Returns a tuple with the following three entries:
+        * A list of matched track and detection indices.
+        * A list of unmatched track indices.
+        * A list of unmatched detection indices.
+
+    """
+    num_tracks, num_detections = len(track_indices), len(detection_indices)
+    is_feasible = costs <= max_distance
+    rows, cols, costs = rows[is_feasible], cols[is_feasible], costs[is_feasible]
+
+    matched_rows, matched_cols = [], []
+    if len(rows) > 0:
+        graph = scipy.sparse.coo_matrix(
+            (np.ones(len(rows)), (rows, num_tracks + cols)),
+            shape=(num_tracks + num_detections, num_tracks + num_detections))
+        _, labels = scipy.sparse.csgraph.connected_components(graph, directed=False)
+
+        edge_labels = labels[rows]
+        order = np.argsort(edge_labels, kind='stable')
+        _, starts = np.unique(edge_labels[order], return_index=True)
+        for edges in np.split(order, starts[1:]):
+            if len(edges) == 1:  # a single candidate pair
+                matched_rows.append(rows[edges])
+                matched_cols.append(cols[edges])
+                continue
+            sub_rows, row_inv = np.unique(rows[edges], return_inverse=True)
+            sub_cols, col_inv = np.unique(cols[edges], return_inverse=True)
+            cost_matrix = np.full((len(sub_rows), len(sub_cols)), max_distance + 1e-5)
+            cost_matrix[row_inv, col_inv] = costs[edges]
+            row_indices, col_indices = linear_assignment(cost_matrix)
+            is_match = cost_matrix[row_indices, col_indices] <= max_distance
+            matched_rows.append(sub_rows[row_indices[is_match]])
+            matched_cols.append(sub_cols[col_indices[is_match]])
+
+    matched_rows = np.concatenate(matched_rows) if matched_rows else np.zeros(0, dtype=np.int64)
+    matched_cols = np.concatenate(matched_cols) if matched_cols else np.zeros(0, dtype=np.int64)
+    order = np.argsort(matched_rows, kind='stable')
+    matches = [(track_indices[row], detection_indices[col])
+               for row, col in zip(matched_rows[order], matched_cols[order])]
+
+    is_row_matched = np.zeros(num_tracks, dtype=bool)
+    is_row_matched[matched_rows] = True
+    is_col_matched = np.zeros(num_detections, dtype=bool)
+    is_col_matched[matched_cols] = True
+    unmatched_tracks = [track_indices[row] for row in np.flatnonzero(~is_row_matched)]
+    unmatched_detections = [
+        detection_indices[col] for col in np.flatnonzero(~is_col_matched)]
+    return matches, unmatched_tracks, unmatched_detections
+
+
+def matching_cascade_sparse(
+        rows, cols, costs, max_distance, cascade_depth, tracks, track_indices,
+        detection_indices):
+    """Run matching cascade on a sparse set of candidate pairs.
+
+    Parameters
+    ----------
+    rows : ndarray
+        Positions in `track_indices` of the candidate pairs.
+    cols : ndarray
+        Positions in `detection_indices` of the candidate pairs.
+    costs : ndarray
+        Association costs of the candidate pairs.
+    max_distance : float
+        Gating threshold. Associations with cost larger than this value are
+        disregarded.
+    cascade_depth: int
+        The cascade depth, should be se to the maximum track age.
+    tracks : List[track.Track]
+        A list of predicted tracks at the current time step.
+    track_indices : List[int]
+        List of track indices.
+    detection_indices : List[int]
+        List of detection indices.
+
+    Returns
+    -------
+    (List[(int, int)], List[int], List[int])
+        Returns a tuple with the following three entries:
+        * A list of matched track and detection indices.
+        * A list of unmatched track indices.
+        * A list of unmatched detection indices.
+
+    """
+    track_ages = np.array([tracks[k].time_since_update for k in track_indices])
+    is_col_free = np.ones(len(detection_indices), dtype=bool)
+    positions = range(len(track_indices)), range(len(detection_indices))
+
+    matches = []
+    for age in np.unique(track_ages):  # levels without tracks are never visited
+        if age < 1 or age > cascade_depth:
+            continue
+        if not is_col_free.any():  # No detections left
+            break
+
+        level = (track_ages[rows] == age) & is_col_free[cols]
+        matches_l, _, _ = min_cost_matching_sparse(
+            rows[level], cols[level], costs[level], max_distance, *positions)
+        for row, col in matches_l:
+            matches.append((track_indices[row], detection_indices[col]))
+            is_col_free[col] = False
+
+    unmatched_detections = [detection_indices[col] for col in np.flatnonzero(is_col_free)]
+    unmatched_tracks = list(set(track_indices) - set(k for k, _ in matches))
+    return matches, unmatched_tracks, unmatched_detections
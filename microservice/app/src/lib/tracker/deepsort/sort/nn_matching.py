@@ -1,6 +1,13 @@
 # vim: expandtab:ts=4:sw=4
 import numpy as np
 
+# gallery storage type -> dtype of the stored samples
+STORAGE_DTYPES = {
+    "float32": np.float32,
+    "float16": np.float16,
+    "int8": np.int8,
+}
+
 def l1_norm(v):
     norm = np.sum(v)
     return v / norm
@@ -105,6 +112,14 @@ class NearestNeighborDistanceMetric(object):
     A nearest neighbor distance metric that, for each target, returns
     the closest distance to any sample that has been observed so far.
 
+    Samples are kept in a preallocated gallery array of shape
+    (targets, budget, dim), used as a ring buffer per target. Cosine samples
+    are normalized once on insertion, and the distances of all targets are
+    computed with one matrix product followed by a per-target minimum.
+
+    Compact storage keeps the samples as float16, or as int8 with one scale
+    per sample, and distances are still accumulated in float32.
+
     Parameters
     ----------
     metric : str
@@ -115,27 +130,142 @@ class NearestNeighborDistanceMetric(object):
     budget : Optional[int]
         If not None, fix samples per class to at most this number. Removes
         the oldest samples when the budget is reached.
+    storage : Optional[str]
+        Sample storage type, one of "float32", "float16" or "int8". Defaults
+        to "float32".
 
     Attributes
     ----------
     samples : Dict[int -> List[ndarray]]
         A dictionary that maps from target identities to the list of samples
-        that have been observed so far.
+        that have been observed so far (oldest first), normalized for the
+        cosine metric. Built from the gallery on access.
 
     """
 
-    def __init__(self, metric, matching_threshold, budget=None):
+    _initial_targets = 16
+    _initial_samples = 16
 
-        if metric == "euclidean":
-            self._metric = _nn_euclidean_distance
-        elif metric == "cosine":
-            self._metric = _nn_cosine_distance
-        else:
+    def __init__(self, metric, matching_threshold, budget=None, storage="float32"):
+
+        if metric not in ("euclidean", "cosine"):
             raise ValueError(
                 "Invalid metric; must be either 'euclidean' or 'cosine'")
+        if storage not in STORAGE_DTYPES:
+            raise ValueError(
+                "Invalid storage; must be one of {}".format(list(STORAGE_DTYPES)))
+        self.metric = metric
         self.matching_threshold = matching_threshold
         self.budget = budget
-        self.samples = {}
+        self.storage = storage
+
+        self._gallery = None  # (targets, samples, dim) ring buffers
+        self._sq_norms = None  # (targets, samples) squared sample norms
+        self._scales = None  # (targets, samples) int8 dequantization scales
+        self._counts = np.zeros(0, dtype=np.int64)  # stored samples per slot
+        self._heads = np.zeros(0, dtype=np.int64)  # next write position per slot
+        self._slots = {}  # target -> gallery slot
+        self._free_slots = []
+
+    @property
+    def samples(self):
+        samples = {}
+        for target, slot in self._slots.items():
+            count, width = self._counts[slot], self._gallery.shape[1]
+            order = (self._heads[slot] - count + np.arange(count)) % width
+            samples[target] = list(self._decode(slot, order))
+        return samples
+
+    def memory_usage(self):
+        """Report the gallery memory usage.
+
+        Returns
+        -------
+        Dict[str -> int or str]
+            The storage type, the number of targets and stored samples, the
+            allocated gallery size and the size taken by the stored samples,
+            both in bytes.
+
+        """
+        arrays = [a for a in (self._gallery, self._sq_norms, self._scales) if a is not None]
+        num_samples = int(self._counts.sum())
+        sample_bytes = sum(a[0, 0].nbytes for a in arrays)
+        return {
+            "storage": self.storage,
+            "targets": len(self._slots),
+            "samples": num_samples,
+            "allocated_bytes": sum(a.nbytes for a in arrays),
+            "used_bytes": num_samples * sample_bytes,
+        }
+
+    def _allocate(self, dim):
+        num_samples = self.budget if self.budget is not None else self._initial_samples
+        self._gallery = np.zeros((self._initial_targets, num_samples, dim),
+                                 dtype=STORAGE_DTYPES[self.storage])
+        self._sq_norms = np.zeros((self._initial_targets, num_samples), dtype=np.float32)
+        if self.storage == "int8":
+            self._scales = np.zeros((self._initial_targets, num_samples), dtype=np.float32)
+        self._counts = np.zeros(self._initial_targets, dtype=np.int64)
+        self._heads = np.zeros(self._initial_targets, dtype=np.int64)
+        self._free_slots = list(range(self._initial_targets - 1, -1, -1))
+
+    def _grow_targets(self):
+        num_targets = len(self._counts)
+        self._gallery = np.pad(self._gallery, [(0, num_targets), (0, 0), (0, 0)])
+        self._sq_norms = np.pad(self._sq_norms, [(0, num_targets), (0, 0)])
+        if self._scales is not None:
+            self._scales = np.pad(self._scales, [(0, num_targets), (0, 0)])
+        self._counts = np.pad(self._counts, (0, num_targets))
+        self._heads = np.pad(self._heads, (0, num_targets))
+        self._free_slots.extend(range(2 * num_targets - 1, num_targets - 1, -1))
+
+    def _grow_samples(self):
+        # only used without budget: samples are never overwritten then, so
+        # every ring starts at position 0 and continues after its last sample
+        width = self._gallery.shape[1]
+        self._gallery = np.pad(self._gallery, [(0, 0), (0, width), (0, 0)])
+        self._sq_norms = np.pad(self._sq_norms, [(0, 0), (0, width)])
+        if self._scales is not None:
+            self._scales = np.pad(self._scales, [(0, 0), (0, width)])
+        self._heads = self._counts.copy()
+
+    def _acquire(self, target):
+        if not self._free_slots:
+            self._grow_targets()
+        slot = self._free_slots.pop()
+        self._counts[slot] = 0
+        self._heads[slot] = 0
+        self._slots[target] = slot
+        return slot
+
+    def _prepare(self, features):
+        features = np.asarray(features, dtype=np.float32)
+        if self.metric == "cosine":
+            features = features / np.linalg.norm(features, axis=1, keepdims=True)
+        return features
+
+    def _encode(self, features):
+        """Convert float32 features to the storage type.
+
+        Returns the stored samples, their scales (None unless int8) and the
+        squared norms of the samples as they are decoded.
+        """
+        if self.storage == "int8":
+            scales = np.abs(features).max(axis=1) / 127.
+            scales[scales == 0] = 1.
+            stored = np.rint(features / scales[:, None]).astype(np.int8)
+            decoded = stored * scales[:, None]
+        else:
+            scales = None
+            stored = features.astype(STORAGE_DTYPES[self.storage])
+            decoded = stored.astype(np.float32)
+        return stored, scales, np.square(decoded).sum(axis=1)
+
+    def _decode(self, slots, positions=slice(None)):
+        samples = self._gallery[slots, positions].astype(np.float32)
+        if self._scales is not None:
+            samples *= self._scales[slots, positions][..., None]
+        return samples
 
     def partial_fit(self, features, targets, active_targets):
         """Update the distance metric with new data.
@@ -150,13 +280,31 @@ class NearestNeighborDistanceMetric(object):
             A list of targets that are currently present in the scene.
 
         """
-        for feature, target in zip(features, targets):
-            self.samples.setdefault(target, []).append(feature)
-            if self.budget is not None:
-                self.samples[target] = self.samples[target][-self.budget:]
-        self.samples = {k: self.samples[k] for k in active_targets}
-        # for i in self.samples:
-        #     print(f'{i} samples : {self.samples[i].__len__()}')
+        if len(features) > 0:
+            features, scales, sq_norms = self._encode(self._prepare(features))
+            if self._gallery is None:
+                self._allocate(features.shape[1])
+
+            for idx, (feature, sq_norm, target) in enumerate(zip(features, sq_norms, targets)):
+                slot = self._slots.get(target)
+                if slot is None:
+                    slot = self._acquire(target)
+                if self.budget is None and self._counts[slot] == self._gallery.shape[1]:
+                    self._grow_samples()
+                width = self._gallery.shape[1]
+                head = self._heads[slot]
+                self._gallery[slot, head] = feature
+                self._sq_norms[slot, head] = sq_norm
+                if scales is not None:
+                    self._scales[slot, head] = scales[idx]
+                self._heads[slot] = (head + 1) % width
+                self._counts[slot] = min(self._counts[slot] + 1, width)
+
+        active_targets = set(active_targets)
+        for target in [t for t in self._slots if t not in active_targets]:
+            slot = self._slots.pop(target)
+            self._counts[slot] = 0
+            self._free_slots.append(slot)
 
     def distance(self, features, targets):
         """Compute distance between features and targets.
@@ -176,7 +324,124 @@ class NearestNeighborDistanceMetric(object):
             `targets[i]` and `features[j]`.
 
         """
-        cost_matrix = np.zeros((len(targets), len(features)))
-        for i, target in enumerate(targets):
-            cost_matrix[i, :] = self._metric(self.samples[target], features)
-        return cost_matrix
\ No newline at end of file
+        if len(targets) == 0 or len(features) == 0:
+            return np.zeros((len(targets), len(features)))
+
+        slots = np.array([self._slots[target] for target in targets])
+        features = self._prepare(features)
+        gallery = self._gallery[slots].astype(np.float32, copy=False)  # (T, S, dim)
+        num_targets, num_samples, dim = gallery.shape
+
+        dots = np.dot(gallery.reshape(-1, dim), features.T).reshape(
+            num_targets, num_samples, len(features))
+        if self._scales is not None:
+            dots *= self._scales[slots][:, :, None]
+        if self.metric == "cosine":
+            distances = 1. - dots
+        else:
+            distances = -2. * dots + self._sq_norms[slots][:, :, None] \
+                + np.square(features).sum(axis=1)[None, None, :]
+        is_stored = np.arange(num_samples)[None, :] < self._counts[slots][:, None]
+        distances = np.where(is_stored[:, :, None], distances, np.inf)
+
+        cost_matrix = distances.min(axis=1)
+        if self.metric == "euclidean":
+            cost_matrix = np.maximum(0.0, cost_matrix)
+        return cost_matrix
+
+    def distance_pairs(self, features, targets, rows, cols):
+        """Compute distance between the given pairs of features and targets
+        only.
+
+        Parameters
+        ----------
+        features : ndarray
+            An NxM matrix of N features of dimensionality M.
+        targets : List[int]
+            A list of targets.
+        rows : ndarray
+            Positions in `targets` of the pairs.
+        cols : ndarray
+            Positions in `features` of the pairs.
+
+        Returns
+        -------
+        ndarray
+            Returns an array of length len(rows), where element k contains
+            the closest distance between `targets[rows[k]]` and
+            `features[cols[k]]`.
+
+        """
+        costs = np.zeros(len(rows))
+        if len(rows) == 0:
+            return costs
+
+        features = self._prepare(features)
+        order = np.argsort(rows, kind='stable')
+        _, starts = np.unique(rows[order], return_index=True)
+        for pairs in np.split(order, starts[1:]):
+            slot = self._slots[targets[rows[pairs[0]]]]
+            samples = self._decode(slot, slice(0, self._counts[slot]))
+            queries = features[cols[pairs]]
+            dots = np.dot(samples, queries.T)
+            if self.metric == "cosine":
+                distances = 1. - dots
+            else:
+                distances = -2. * dots + self._sq_norms[slot, :len(samples), None] \
+                    + np.square(queries).sum(axis=1)[None, :]
+            costs[pairs] = distances.min(axis=0)
+
+        if self.metric == "euclidean":
+            costs = np.maximum(0.0, costs)
+        return costs
+
+
+def compare_storage(samples, features, matching_threshold, storage,
+                    metric="cosine"):
+    """Measure the effect of a compact gallery storage on match decisions.
+
+    The same samples are stored once as float32 and once with `storage`, and
+    the distances of `features` to every target are compared.
+
+    Parameters
+    ----------
+    samples : Dict[int -> ndarray]
+        A dictionary that maps from target identities to a KxM matrix of
+        their samples.
+    features : ndarray
+        An NxM matrix of N query features.
+    matching_threshold : float
+        The matching threshold the decisions are taken with.
+    storage : str
+        The compact storage type, "float16" or "int8".
+    metric : Optional[str]
+        Either "euclidean" or "cosine".
+
+    Returns
+    -------
+    Dict[str -> float or int or dict]
+        The maximum absolute distance error, the number of (target, feature)
+        pairs and of pairs whose `distance <= matching_threshold` decision
+        flips, the flip rate and the memory usage of both galleries.
+
+    """
+    targets = list(samples)
+    budget = max(len(s) for s in samples.values())
+    reference = NearestNeighborDistanceMetric(metric, matching_threshold, budget)
+    compact = NearestNeighborDistanceMetric(metric, matching_threshold, budget, storage)
+    for gallery in (reference, compact):
+        for target in targets:
+            gallery.partial_fit(samples[target], [target] * len(samples[target]), targets)
+
+    expected = reference.distance(features, targets)
+    actual = compact.distance(features, targets)
+    flipped = int(np.count_nonzero(
+        (expected <= matching_threshold) != (actual <= matching_threshold)))
+    return {
+        "max_abs_error": float(np.abs(expected - actual).max(initial=0.)),
+        "pairs": expected.size,
+        "flipped": flipped,
+        "flip_rate": flipped / max(expected.size, 1),
+        "reference_memory": reference.memory_usage(),
+        "memory": compact.memory_usage(),
+    }
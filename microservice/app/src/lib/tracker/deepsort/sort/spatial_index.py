@@ -0,0 +1,136 @@
+# vim: expandtab:ts=4:sw=4
+import numpy as np
+
+
+class GridIndex(object):
+    """
+    A uniform grid over 2D points for axis-aligned box range queries.
+
+    Every point is bucketed into the grid cell it falls in, so a box query
+    only visits the points of the cells the box overlaps instead of all
+    points.
+
+    Parameters
+    ----------
+    points : ndarray
+        An Nx2 matrix of (x, y) points.
+    cell_size : array_like
+        The (width, height) of a grid cell.
+
+    """
+
+    def __init__(self, points, cell_size):
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        self.cell_size = np.maximum(np.asarray(cell_size, dtype=np.float64), 1e-6)
+
+        cells = np.floor(self.points / self.cell_size).astype(np.int64)
+        order = np.lexsort((cells[:, 1], cells[:, 0]))
+        unique_cells, starts, counts = np.unique(
+            cells[order], axis=0, return_index=True, return_counts=True)
+        self._cells = {
+            (cx, cy): order[start:start + count] for (cx, cy), start, count in
+            zip(unique_cells.tolist(), starts, counts)}
+
+    def query(self, boxes):
+        """Find the points inside every box.
+
+        Parameters
+        ----------
+        boxes : ndarray
+            An Mx4 matrix of boxes in format `(min x, min y, max x, max y)`.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            The box and point indices of all (box, point) pairs where the point
+            lies inside the box.
+
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        cell_min = np.floor(boxes[:, :2] / self.cell_size).astype(np.int64)
+        cell_max = np.floor(boxes[:, 2:] / self.cell_size).astype(np.int64)
+        num_cells = np.prod(np.maximum(cell_max - cell_min + 1, 0), axis=1)
+
+        all_points = np.arange(len(self.points))
+        rows, cols = [], []
+        for row, ((x0, y0), (x1, y1), n) in enumerate(zip(
+                cell_min.tolist(), cell_max.tolist(), num_cells)):
+            if n > len(self._cells):
+                # the box covers more cells than are occupied, test every point
+                candidates = all_points
+            else:
+                buckets = [self._cells.get((cx, cy)) for cx in range(x0, x1 + 1)
+                           for cy in range(y0, y1 + 1)]
+                buckets = [b for b in buckets if b is not None]
+                if not buckets:
+                    continue
+                candidates = np.concatenate(buckets)
+            rows.append(np.full(len(candidates), row))
+            cols.append(candidates)
+
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        rows, cols = np.concatenate(rows), np.concatenate(cols)
+        points = self.points[cols]
+        inside = np.all((points >= boxes[rows, :2]) & (points <= boxes[rows, 2:]), axis=1)
+        return rows[inside], cols[inside]
+
+
+def points_in_boxes(boxes, points):
+    """Find all (box, point) pairs where the point lies inside the box, using
+    a grid with cells of the median box size.
+
+    Parameters
+    ----------
+    boxes : ndarray
+        An Mx4 matrix of boxes in format `(min x, min y, max x, max y)`.
+    points : ndarray
+        An Nx2 matrix of (x, y) points.
+
+    Returns
+    -------
+    (ndarray, ndarray)
+        The box and point indices of the pairs.
+
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    if len(boxes) == 0 or len(points) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    cell_size = np.median(boxes[:, 2:] - boxes[:, :2], axis=0)
+    return GridIndex(points, cell_size).query(boxes)
+
+
+def overlapping_pairs(bboxes, candidates):
+    """Find the pairs of overlapping bounding boxes.
+
+    Parameters
+    ----------
+    bboxes : ndarray
+        An Mx4 matrix of bounding boxes in format `(top left x, top left y,
+        width, height)`.
+    candidates : ndarray
+        An Nx4 matrix of candidate bounding boxes in the same format.
+
+    Returns
+    -------
+    (ndarray, ndarray)
+        The bbox and candidate indices of all pairs with a non-empty
+        intersection.
+
+    """
+    bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    candidates = np.asarray(candidates, dtype=np.float64).reshape(-1, 4)
+    if len(bboxes) == 0 or len(candidates) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    # a candidate overlapping a bbox has its center inside the bbox grown by
+    # half of the largest candidate size
+    half_size = candidates[:, 2:].max(axis=0) / 2
+    boxes = np.c_[bboxes[:, :2] - half_size, bboxes[:, :2] + bboxes[:, 2:] + half_size]
+    rows, cols = points_in_boxes(boxes, candidates[:, :2] + candidates[:, 2:] / 2)
+
+    tl = np.maximum(bboxes[rows, :2], candidates[cols, :2])
+    br = np.minimum(bboxes[rows, :2] + bboxes[rows, 2:],
+                    candidates[cols, :2] + candidates[cols, 2:])
+    overlap = np.all(br > tl, axis=1)
+    return rows[overlap], cols[overlap]
@@ -60,6 +60,10 @@ class Track:
     features : List[ndarray]
         A cache of features. On each measurement update, the associated feature
         vector is added to this list.
+    last_feature : ndarray | NoneType
+        The last feature vector extracted for this track.
+    time_since_feature : int
+        Total number of frames since `last_feature` was extracted.
 
     """
 
@@ -76,6 +80,8 @@ class Track:
         self.features = []
         if feature is not None:
             self.features.append(feature)
+        self.last_feature = feature
+        self.time_since_feature = 0
 
         self._n_init = n_init
         self._max_age = max_age
@@ -112,6 +118,7 @@ class Track:
     def increment_age(self):
         self.age += 1
         self.time_since_update += 1
+        self.time_since_feature += 1
 
     def predict(self, kf):
         """Propagate the state distribution to the current time step using a
@@ -138,9 +145,29 @@ class Track:
             The associated detection.
 
         """
-        self.mean, self.covariance = kf.update(
+        mean, covariance = kf.update(
             self.mean, self.covariance, detection.to_xyah())
-        self.features.append(detection.feature)
+        self.apply_update(mean, covariance, detection)
+
+    def apply_update(self, mean, covariance, detection):
+        """Set the measurement-corrected state distribution and update the
+        feature cache and the track state.
+
+        Parameters
+        ----------
+        mean : ndarray
+            The corrected mean vector (8 dimensional).
+        covariance : ndarray
+            The corrected covariance matrix (8x8 dimensional).
+        detection : Detection
+            The associated detection.
+
+        """
+        self.mean, self.covariance = mean, covariance
+        if detection.feature is not None and not detection.is_reused_feature:
+            self.features.append(detection.feature)
+            self.last_feature = detection.feature
+            self.time_since_feature = 0
 
         self.hits += 1
         self.time_since_update = 0
@@ -1,8 +1,11 @@
 # vim: expandtab:ts=4:sw=4
+import functools
+
 import numpy as np
 from . import kalman_filter
 from . import linear_assignment
 from . import iou_matching
+from . import spatial_index
 from .track import Track
 
 
@@ -12,14 +15,20 @@ class Tracker:
 
     Parameters
     ----------
-    metric : nn_matching.NearestNeighborDistanceMetric
-        A distance metric for measurement-to-track association.
+    metric : Optional[nn_matching.NearestNeighborDistanceMetric]
+        A distance metric for measurement-to-track association. If None,
+        confirmed tracks are associated by IOU within the Mahalanobis gate
+        instead of by appearance.
     max_age : int
         Maximum number of missed misses before a track is deleted.
     n_init : int
         Number of consecutive detections before the track is confirmed. The
         track state is set to `Deleted` if a miss occurs within the first
         `n_init` frames.
+    spatial_index_min_pairs : Optional[int]
+        Minimum number of track x detection pairs from which the candidate
+        pairs are narrowed with a spatial grid and the assignment is solved
+        per connected component. None always uses dense cost matrices.
 
     Attributes
     ----------
@@ -36,11 +45,13 @@ class Tracker:
 
     """
 
-    def __init__(self, metric, max_iou_distance=0.7, max_age=70, n_init=3):
+    def __init__(self, metric, max_iou_distance=0.7, max_age=70, n_init=3,
+                 spatial_index_min_pairs=None):
         self.metric = metric
         self.max_iou_distance = max_iou_distance
         self.max_age = max_age
         self.n_init = n_init
+        self.spatial_index_min_pairs = spatial_index_min_pairs
 
         self.kf = kalman_filter.KalmanFilter()
         self.tracks = []
@@ -50,37 +61,51 @@ class Tracker:
         """Propagate track state distributions one time step forward.
         This function should be called once every time step, before `update`.
         """
-        for track in self.tracks:
-            track.predict(self.kf)
+        if not self.tracks:
+            return
+        mean, covariance = self.kf.multi_predict(
+            np.stack([track.mean for track in self.tracks]),
+            np.stack([track.covariance for track in self.tracks]))
+        for track, track_mean, track_covariance in zip(self.tracks, mean, covariance):
+            track.mean, track.covariance = track_mean, track_covariance
+            track.increment_age()
 
     def increment_ages(self):
         for track in self.tracks:
             track.increment_age()
             track.mark_missed()
 
-    def update(self, detections, predictions):
+    def update(self, detections, predictions, detection_rows=None):
         """Perform measurement update and track management.
 
         Parameters
         ----------
         detections : List[deep_sort.detection.Detection]
             A list of detections at the current time step.
-        predictions : List[annoation.Annotation]
-            A list of annoations object to update the tracked person info.
+        predictions : annotation.FrameResult
+            Frame results whose tracked ids and bboxes are updated in place.
+        detection_rows : Optional[ndarray]
+            Row of `predictions` for every detection. Defaults to the
+            detection index.
         """
 
 
         # Run matching cascade.
         matches, unmatched_tracks, unmatched_detections = self._match(detections)
         # Update track set.
-        for track_idx, pred_idx in matches:
-            self.tracks[track_idx].update(
-                self.kf, detections[pred_idx])
-            track_id = self.tracks[track_idx].track_id
-            track_box_tlbr = self.tracks[track_idx].to_tlbr()
-            # update track_id, tracked_color, tlbr_bbox of predictions object
-            predictions[pred_idx].set_tracked_id(track_id)
-            predictions[pred_idx].bbox = track_box_tlbr
+        if matches:
+            track_indices, detection_indices = zip(*matches)
+            mean, covariance = self.kf.multi_update(
+                np.stack([self.tracks[i].mean for i in track_indices]),
+                np.stack([self.tracks[i].covariance for i in track_indices]),
+                np.stack([detections[i].to_xyah() for i in detection_indices]))
+            for i, (track_idx, detection_idx) in enumerate(matches):
+                track = self.tracks[track_idx]
+                track.apply_update(mean[i], covariance[i], detections[detection_idx])
+                # update track_id and tlbr_bbox of the predictions row
+                row = detection_idx if detection_rows is None else detection_rows[detection_idx]
+                predictions.ids[row] = track.track_id
+                predictions.track_bboxes[row] = track.to_tlbr()
 
         for track_idx in unmatched_tracks:
             self.tracks[track_idx].mark_missed()
@@ -89,6 +114,8 @@ class Tracker:
         self.tracks = [t for t in self.tracks if not t.is_deleted()]
 
         # Update distance metric.
+        if self.metric is None:
+            return
         features, targets, active_targets = [], [], []
         for track in self.tracks:
             if not track.is_confirmed():
@@ -101,11 +128,17 @@ class Tracker:
             np.asarray(features), np.asarray(targets), active_targets)
 
     def _match(self, detections):
+        detection_tlwh = np.asarray([d.tlwh for d in detections]).reshape(-1, 4)
 
         def gated_metric(tracks, dets, track_indices, detection_indices):
-            features = np.array([dets[i].feature for i in detection_indices])
-            targets = np.array([tracks[i].track_id for i in track_indices])
-            cost_matrix = self.metric.distance(features, targets)
+            if self.metric is None:
+                cost_matrix = 1. - iou_matching.iou_matrix(
+                    iou_matching.tracks_to_tlwh(tracks, track_indices),
+                    detection_tlwh[np.asarray(detection_indices, dtype=int)])
+            else:
+                features = np.array([dets[i].feature for i in detection_indices])
+                targets = np.array([tracks[i].track_id for i in track_indices])
+                cost_matrix = self.metric.distance(features, targets)
             cost_matrix = linear_assignment.gate_cost_matrix(
                 self.kf, cost_matrix, tracks, dets, track_indices,
                 detection_indices)
@@ -118,10 +151,18 @@ class Tracker:
         unconfirmed_tracks = [
             i for i, t in enumerate(self.tracks) if not t.is_confirmed()]
 
+        # Crowded scenes only score the spatially close pairs
+        use_spatial_index = self.spatial_index_min_pairs is not None and \
+            len(self.tracks) * len(detections) >= self.spatial_index_min_pairs
+
         # Associate confirmed tracks using appearance features.
-        matches_a, unmatched_tracks_a, unmatched_detections = linear_assignment.matching_cascade(
-                gated_metric, self.metric.matching_threshold, self.max_age,
-                self.tracks, detections, confirmed_tracks)
+        if use_spatial_index:
+            matches_a, unmatched_tracks_a, unmatched_detections = \
+                self._match_appearance_sparse(detections, detection_tlwh, confirmed_tracks)
+        else:
+            matches_a, unmatched_tracks_a, unmatched_detections = linear_assignment.matching_cascade(
+                    gated_metric, self._matching_threshold, self.max_age,
+                    self.tracks, detections, confirmed_tracks)
 
         # # Associate remaining tracks together with unconfirmed tracks using IOU.
         iou_track_candidates = unconfirmed_tracks + [
@@ -132,9 +173,14 @@ class Tracker:
             k for k in unmatched_tracks_a if
             self.tracks[k].time_since_update != 1]
 
-        matches_b, unmatched_tracks_b, unmatched_detections = linear_assignment.min_cost_matching(
-                iou_matching.iou_cost, self.max_iou_distance, self.tracks,
-                detections, iou_track_candidates, unmatched_detections)
+        if use_spatial_index:
+            matches_b, unmatched_tracks_b, unmatched_detections = self._match_iou_sparse(
+                detection_tlwh, iou_track_candidates, unmatched_detections)
+        else:
+            iou_cost = functools.partial(iou_matching.iou_cost, detection_tlwh=detection_tlwh)
+            matches_b, unmatched_tracks_b, unmatched_detections = linear_assignment.min_cost_matching(
+                    iou_cost, self.max_iou_distance, self.tracks,
+                    detections, iou_track_candidates, unmatched_detections)
 
         matches = matches_a + matches_b
         unmatched_tracks = list(set(unmatched_tracks_a + unmatched_tracks_b))
@@ -142,9 +188,49 @@ class Tracker:
         # unmatched_tracks = list(set(unmatched_tracks_b))
         return matches, unmatched_tracks, unmatched_detections
 
+    @property
+    def _matching_threshold(self):
+        if self.metric is None:
+            return self.max_iou_distance
+        return self.metric.matching_threshold
+
+    def _match_appearance_sparse(self, detections, detection_tlwh, track_indices):
+        """Matching cascade of the given tracks on the gated candidate pairs."""
+        detection_indices = list(range(len(detections)))
+        rows, cols = linear_assignment.gated_pairs(
+            self.kf, self.tracks, detections, track_indices, detection_indices)
+        if self.metric is None:
+            costs = 1. - iou_matching.iou_pairs(
+                iou_matching.tracks_to_tlwh(self.tracks, track_indices),
+                detection_tlwh, rows, cols)
+        else:
+            features = np.array([d.feature for d in detections])
+            targets = [self.tracks[i].track_id for i in track_indices]
+            costs = self.metric.distance_pairs(features, targets, rows, cols)
+        return linear_assignment.matching_cascade_sparse(
+            rows, cols, costs, self._matching_threshold, self.max_age,
+            self.tracks, track_indices, detection_indices)
+
+    def _match_iou_sparse(self, detection_tlwh, track_indices, detection_indices):
+        """IOU matching of the given tracks on the overlapping candidate pairs."""
+        # tracks missed for more than a frame can not be matched by IOU
+        stale_tracks = [
+            k for k in track_indices if self.tracks[k].time_since_update > 1]
+        track_indices = [
+            k for k in track_indices if self.tracks[k].time_since_update <= 1]
+        track_tlwh = iou_matching.tracks_to_tlwh(self.tracks, track_indices)
+        candidates_tlwh = detection_tlwh[np.asarray(detection_indices, dtype=int)]
+        rows, cols = spatial_index.overlapping_pairs(track_tlwh, candidates_tlwh)
+        costs = 1. - iou_matching.iou_pairs(track_tlwh, candidates_tlwh, rows, cols)
+        matches, unmatched_tracks, unmatched_detections = linear_assignment.min_cost_matching_sparse(
+            rows, cols, costs, self.max_iou_distance, track_indices, detection_indices)
+        return matches, unmatched_tracks + stale_tracks, unmatched_detections
+
     def _initiate_track(self, detection):
         mean, covariance = self.kf.initiate(detection.to_xyah())
+        # a reused embedding belongs to another track, it must not seed the new one
+        feature = None if detection.is_reused_feature else detection.feature
         self.tracks.append(Track(
             mean, covariance, self._next_id, self.n_init, self.max_age,
-            detection.feature))
+            feature))
         self._next_id += 1
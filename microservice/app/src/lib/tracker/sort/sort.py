@@ -0,0 +1,21 @@
+from ..base_tracker import BaseTracker
+from ..deepsort.sort.detection import Detection
+
+__all__ = ['Sort']
+
+
+class Sort(BaseTracker):
+    """Appearance-free tracker: DeepSort's Kalman filter with IOU and Mahalanobis
+    association only, without the reid feature extractor.
+
+    Use it on CPU-only devices where running the reid network for every
+    detection is too expensive. It has the same `predict`/`increment_ages`
+    interface as DeepSort.
+    """
+
+    def __init__(self, max_iou_distance=0.7, max_age=70, n_init=3,
+                 spatial_index_min_pairs=None, **kwargs):
+        super().__init__(None, max_iou_distance, max_age, n_init, spatial_index_min_pairs)
+
+    def _create_detections(self, rgb_img, predictions, det_rows, bbox_tlwh, bbox_tlbr):
+        return [Detection(bbox, None) for bbox in bbox_tlwh]
@@ -23,3 +23,107 @@ class Annotation:
 
     # def add_flatten_skeletons(self):
     #     pass
+
+
+class FrameResult:
+    """Results of all people in one frame stored as contiguous arrays.
+
+    Pose estimation creates it, and the tracker and the action classifier fill
+    their fields in place, so no per-person objects are created on the way.
+    Iterating or indexing yields `PersonView` objects with the attributes of
+    `Annotation` for code that still works person by person.
+
+    Attributes:
+        keypoints (np.ndarray): (N, 18, 3) trtpose keypoints of (joint index, x, y),
+            x and y normalized to [0, 1].
+        bboxes (np.ndarray): (N, 4) keypoints bboxes of (xmin, ymin, width, height).
+        has_bbox (np.ndarray): (N,) False for people without a valid bbox.
+        track_bboxes (np.ndarray): (N, 4) tracked bboxes of (xmin, ymin, xmax, ymax).
+        ids (np.ndarray): (N,) tracked ids, 0 for untracked people.
+        skeletons (np.ndarray): (N, 36) flattened openpose (x, y) skeletons.
+        action_idx (np.ndarray): (N,) predicted action index, -1 if there is none.
+        action_scores (np.ndarray): (N,) score of the predicted action.
+        action_labels (list): action names indexed by `action_idx`.
+    """
+
+    def __init__(self, keypoints, bboxes=None, has_bbox=None, num_parts=18):
+        self.keypoints = np.asarray(keypoints, dtype=np.float64).reshape(-1, num_parts, 3)
+        num_people = len(self.keypoints)
+        if bboxes is None:
+            self.bboxes = np.full((num_people, 4), np.nan)
+            self.has_bbox = np.zeros(num_people, dtype=bool)
+        else:
+            self.bboxes = np.asarray(bboxes, dtype=np.float64).reshape(num_people, 4)
+            self.has_bbox = np.ones(num_people, dtype=bool) if has_bbox is None \
+                else np.asarray(has_bbox, dtype=bool)
+        self.track_bboxes = np.zeros((num_people, 4))
+        self.ids = np.zeros(num_people, dtype=np.int64)
+        self.skeletons = np.zeros((num_people, num_parts * 2))
+        self.action_idx = np.full(num_people, -1, dtype=np.int64)
+        self.action_scores = np.zeros(num_people)
+        self.action_labels = None
+
+    @classmethod
+    def empty(cls, num_parts=18):
+        return cls(np.zeros((0, num_parts, 3)), num_parts=num_parts)
+
+    def __len__(self):
+        return len(self.keypoints)
+
+    def __getitem__(self, idx):
+        return PersonView(self, idx)
+
+    def __iter__(self):
+        return (PersonView(self, idx) for idx in range(len(self)))
+
+    def select(self, rows):
+        """Return a new FrameResult with the given rows (index array or boolean mask)."""
+        result = FrameResult.__new__(FrameResult)
+        for name in ('keypoints', 'bboxes', 'has_bbox', 'track_bboxes', 'ids',
+                     'skeletons', 'action_idx', 'action_scores'):
+            setattr(result, name, getattr(self, name)[rows])
+        result.action_labels = self.action_labels
+        return result
+
+    def action_of(self, idx):
+        """Action of a person in the [label, score] format of `Annotation.action`."""
+        action_idx = self.action_idx[idx]
+        if action_idx < 0:
+            return ['', 0]
+        return [self.action_labels[action_idx], self.action_scores[idx]]
+
+
+class PersonView:
+    """Read-only per-person view into a FrameResult with the attributes of `Annotation`."""
+    __slots__ = ('_result', '_idx')
+
+    def __init__(self, result, idx):
+        self._result = result
+        self._idx = idx
+
+    @property
+    def keypoints(self):
+        return self._result.keypoints[self._idx]
+
+    @property
+    def id(self):
+        track_id = int(self._result.ids[self._idx])
+        return track_id if track_id > 0 else None
+
+    @property
+    def bbox(self):
+        if self.id is not None:
+            return self._result.track_bboxes[self._idx]
+        return self._result.bboxes[self._idx] if self._result.has_bbox[self._idx] else None
+
+    @property
+    def action(self):
+        return self._result.action_of(self._idx)
+
+    @property
+    def color(self):
+        return Annotation.set_color_with_id(self.id) if self.id is not None else None
+
+    @property
+    def flatten_keypoints(self):
+        return self._result.skeletons[self._idx]
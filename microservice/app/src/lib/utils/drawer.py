@@ -5,6 +5,7 @@ from sklearn.metrics import confusion_matrix
 from sklearn.utils.multiclass import unique_labels
 
 from app.src.lib.utils.commons import *
+from app.src.lib.utils.annotation import Annotation
 
 
 class Drawer:
@@ -19,32 +20,45 @@ class Drawer:
     def render_frame(self, image, predictions, **user_text_kwargs):
         """Draw all persons [skeletons / tracked_id / action] annotations on image
         in trtpose keypoint format.
+
+        args:
+            image (np.ndarray): frame to draw on, it is copied and left unchanged.
+            predictions (FrameResult): results of all people of the frame.
         """
         render_frame = image.copy()
-        def _scale_keypoints(pred):
-            if pred.keypoints[..., 1:].max() <= 1:
-                pred.keypoints[..., 1:] *= render_frame.shape[:2][::-1]
-            pred.keypoints = pred.keypoints.astype(np.int16)
-            return pred
+        keypoints = predictions.keypoints.copy()
+        # keypoints normalized to [0, 1] are scaled to the frame size
+        is_normalized = keypoints[..., 1:].max(axis=(1, 2), initial=0) <= 1
+        keypoints[is_normalized, :, 1:] *= render_frame.shape[:2][::-1]
+        keypoints = keypoints.astype(np.int16)
+
+        # tracked people are drawn with the track bbox, the others with the keypoints bbox
+        bboxes = predictions.track_bboxes.copy()
+        is_tracked = predictions.ids > 0
+        untracked = ~is_tracked & predictions.has_bbox
+        bboxes[untracked, :2] = predictions.bboxes[untracked, :2]
+        bboxes[untracked, 2:] = predictions.bboxes[untracked, :2] + predictions.bboxes[untracked, 2:]
+        has_bbox = is_tracked | untracked
 
-        predictions = [_scale_keypoints(pred) for pred in predictions]
         # draw the results
-        for pred in predictions:
-            if pred.color is not None: self.color = pred.color
-            self.draw_trtpose(render_frame, pred)
-            if pred.bbox is not None:
-                self.draw_bbox_label(render_frame, pred)
+        for idx in range(len(predictions)):
+            track_id = int(predictions.ids[idx])
+            if track_id > 0: self.color = Annotation.set_color_with_id(track_id)
+            self.draw_trtpose(render_frame, keypoints[idx])
+            if has_bbox[idx]:
+                self.draw_bbox_label(render_frame, bboxes[idx], track_id,
+                                     predictions.action_of(idx))
 
         if len(user_text_kwargs)>0:
             render_frame = self.add_user_text(render_frame, **user_text_kwargs)
         return render_frame
 
-    def draw_trtpose(self, image, pred):
+    def draw_trtpose(self, image, keypoints):
         """Draw skeletons on image with trtpose keypoint format"""
 
         visibilities = []
         # draw circle and keypoint numbers
-        for kp in pred.keypoints:
+        for kp in keypoints:
             if kp[1]==0 or kp[2]==0:
                 visibilities.append(kp[0])
                 continue
@@ -57,12 +71,12 @@ class Drawer:
         # draw skeleton connections
         for pair in LIMB_PAIRS:
             if pair[0] in visibilities or pair[1] in visibilities: continue
-            start, end = map(tuple, [pred.keypoints[pair[0]], pred.keypoints[pair[1]]])
+            start, end = map(tuple, [keypoints[pair[0]], keypoints[pair[1]]])
             cv2.line(image, start[1:], end[1:], self.color, self.thickness)
 
-    def draw_bbox_label(self, image, pred):
+    def draw_bbox_label(self, image, bbox, track_id=0, action=None):
         scale = self.scale - 0.1
-        x1, y1, x2, y2 = pred.bbox.astype(np.int16)
+        x1, y1, x2, y2 = bbox.astype(np.int16)
         # draw person bbox
         cv2.rectangle(image, (x1,y1), (x2,y2), self.color, self.thickness)
 
@@ -80,16 +94,16 @@ class Drawer:
                 is_upper_pos = False
             return xmax, ymax, y_text, is_upper_pos
 
-        if pred.id:
-            track_label = f'{pred.id}'
+        if track_id:
+            track_label = f'{track_id}'
             *track_loc, is_upper_pos = get_label_position(track_label, is_track=True)
             cv2.rectangle(image, (x1, y1), (track_loc[0], track_loc[1]), self.color, -1)
             cv2.putText(image, track_label, (x1+1, track_loc[2]), self.font,
                         scale, COLORS['black'], self.thickness)
 
             # draw text over rectangle background
-            if pred.action[0]:
-                action_label = '{}: {:.2f}'.format(*pred.action) if pred.action[0] else ''
+            if action and action[0]:
+                action_label = '{}: {:.2f}'.format(*action)
                 if not is_upper_pos:
                     action_label = f'{track_label}-{action_label}'
                 action_loc = get_label_position(action_label)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""Staged multi-threaded frame pipeline.
+
+A source thread pulls frames from an iterable, every stage runs its worker
+callables in dedicated threads and a sink thread consumes the results. Stages
+are connected with bounded queues, so a slow stage blocks the ones upstream of
+it (backpressure) instead of letting decoded frames pile up in memory.
+
+Stages with several workers may finish frames out of order. The sink restores
+the source order with a small reorder buffer, so it always receives frames in
+the order they were produced.
+"""
+import queue
+import threading
+
+
+class _Stop:
+    """Sentinel marking the end of the frame stream."""
+
+
+_STOP = _Stop()
+
+
+class Stage:
+    """A pipeline stage.
+
+    args:
+        name (str): stage name, used for thread names.
+        workers (callable or list of callable): `fn(item) -> item`. Each callable
+            runs in its own thread; pass several callables to process frames of
+            this stage in parallel (each worker keeps its own state).
+    """
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = list(workers) if isinstance(workers, (list, tuple)) else [workers]
+
+
+class FramePipeline:
+    """Run `source` items through `stages` and deliver the results to `sink` in order.
+
+    args:
+        source (iterable): produces the input items, iterated in the source thread.
+        stages (list of Stage): processing stages in execution order.
+        sink (callable): `sink(item)` called in the sink thread for every result.
+        queue_size (int): capacity of every inter-stage queue.
+    """
+
+    _poll_interval = 0.1
+
+    def __init__(self, source, stages, sink, queue_size=8):
+        self.source = source
+        self.stages = list(stages)
+        self.sink = sink
+        self.queue_size = queue_size
+        self._stop_event = threading.Event()
+        self._errors = []
+
+    def run(self):
+        """Start all threads, wait until the stream is drained and re-raise the first error."""
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+
+        threads = [self._thread('source', self._produce, queues[0])]
+        for idx, stage in enumerate(self.stages):
+            remaining = {'count': len(stage.workers), 'lock': threading.Lock()}
+            for worker_idx, fn in enumerate(stage.workers):
+                threads.append(self._thread(
+                    f'{stage.name}-{worker_idx}', self._work,
+                    fn, queues[idx], queues[idx + 1], remaining))
+        threads.append(self._thread('sink', self._consume, queues[-1]))
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if self._errors:
+            raise self._errors[0]
+
+    def _thread(self, name, target, *args):
+        return threading.Thread(target=self._guard, args=(target, *args),
+                                name=f'pipeline-{name}', daemon=True)
+
+    def _guard(self, target, *args):
+        try:
+            target(*args)
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop_event.set()
+
+    def _put(self, q, item):
+        while not self._stop_event.is_set():
+            try:
+                q.put(item, timeout=self._poll_interval)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self._stop_event.is_set():
+            try:
+                return q.get(timeout=self._poll_interval)
+            except queue.Empty:
+                continue
+        return _STOP
+
+    def _produce(self, out_q):
+        for seq, item in enumerate(self.source):
+            if not self._put(out_q, (seq, item)):
+                return
+        self._put(out_q, _STOP)
+
+    def _work(self, fn, in_q, out_q, remaining):
+        while True:
+            item = self._get(in_q)
+            if item is _STOP:
+                with remaining['lock']:
+                    remaining['count'] -= 1
+                    is_last = remaining['count'] == 0
+                # the last worker of the stage forwards the end of stream,
+                # the others hand the sentinel back to their siblings
+                self._put(out_q if is_last else in_q, _STOP)
+                return
+            seq, payload = item
+            if not self._put(out_q, (seq, fn(payload))):
+                return
+
+    def _consume(self, in_q):
+        pending = {}
+        next_seq = 0
+        while True:
+            item = self._get(in_q)
+            if item is _STOP:
+                return
+            seq, payload = item
+            pending[seq] = payload
+            while next_seq in pending:
+                self.sink(pending.pop(next_seq))
+                next_seq += 1
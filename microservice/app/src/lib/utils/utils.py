@@ -67,31 +67,27 @@ def keypoints_to_skeletons_list(all_keypoints):
         skeletons_list.append(skeleton)
     return skeletons_list
 
+# trtpose keypoint index of every openpose keypoint, joints missing from the
+# mapping keep their own index
+_OPENPOSE_SRC_IDXS = np.arange(18)
+for _openpose_idx, _trtpose_idx in OPENPOSE_TO_TRTPOSE_IDXS:
+    _OPENPOSE_SRC_IDXS[_openpose_idx] = _trtpose_idx
+
 def trtpose_to_openpose(keypoints_list):
     """Change trtpose skeleton to openpose format"""
 
     new_keypoints = keypoints_list.copy()
-    if new_keypoints.tolist():
-        for idx1, idx2 in OPENPOSE_TO_TRTPOSE_IDXS:
-            new_keypoints[:, idx1, 1:] = keypoints_list[:, idx2, 1:] # neck
+    new_keypoints[:, :, 1:] = keypoints_list[:, _OPENPOSE_SRC_IDXS, 1:]
     return new_keypoints
 
 def convert_to_openpose_skeletons(predictions): # TODO move to annotation class method
     """Prepare trtpose keypoints for action recognition.
-    First, convert openpose keypoints format from trtpose keypoints for
-    action recognition as it's features extraction step is based on
-    openpose keypoint format.
-    Then, changed to skeletons list.
+    Gather the (x, y) of all people in openpose keypoint order, as the action
+    features extraction step is based on openpose keypoint format, and store
+    them as the (N, 36) flattened skeletons of the FrameResult.
     """
-    keypoints_list = np.array([pred.keypoints for pred in predictions])
-    openpose_keypoints = trtpose_to_openpose(keypoints_list)
-    NaN = 0
-    for i, keypoints in enumerate(openpose_keypoints):
-        skeletons = [NaN]*(18*2)
-        for j, kp in enumerate(keypoints):
-            skeletons[2*j] = kp[1]
-            skeletons[2*j+1] = kp[2]
-        predictions[i].flatten_keypoints = skeletons
+    keypoints = predictions.keypoints
+    predictions.skeletons[:] = keypoints[:, _OPENPOSE_SRC_IDXS, 1:].reshape(len(keypoints), predictions.skeletons.shape[1])
     return predictions
 
 def expand_bbox(xmin, xmax, ymin, ymax, img_width, img_height):
@@ -0,0 +1,207 @@
+import os
+import threading
+
+import numpy as np
+import torch
+try:
+    import pycuda.driver as cuda
+except ImportError:  # без pycuda TensorRT модели не используются, хватает torch
+    cuda = None
+
+from app.src.inference_scheduler import InferenceScheduler
+from app.src.lib.action_classifier import get_classifier
+from app.src.lib.action_classifier.dnn.classifier import (
+    fuse_classifier, load_action_model, load_pca, predict_scores)
+from app.src.lib.pose_estimation import get_pose_estimator
+from app.src.lib.tracker import get_tracker, get_tracker_name
+from app.src.lib.tracker.deepsort.get_reid import get_feature_extractor
+from app.src.lib.utils.config import Config
+from app.src.lib.utils.drawer import Drawer
+
+CONFIG_PATH = "app/src/configs/infer_trtpose_deepsort_dnn.yaml"
+
+
+class ModelLock:
+    """Блокировка общих моделей, которая делает CUDA контекст pycuda текущим.
+
+    Контекст pycuda привязан к потоку, а модели загружаются в потоке
+    исполнителя и вызываются из потоков сессий, пачек и обработки видео.
+    Поэтому на время блокировки контекст добавляется в стек вызывающего
+    потока. Без pycuda это обычная блокировка.
+    """
+
+    def __init__(self):
+        self.context = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self.context is not None:
+            try:
+                self.context.push()
+            except Exception:
+                self._lock.release()
+                raise
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            if self.context is not None:
+                cuda.Context.pop()
+        finally:
+            self._lock.release()
+
+
+class ModelRegistry:
+    """Реестр моделей процесса.
+
+    Конфигурация и веса (TrtPose, reid DeepSort, классификатор действий)
+    загружаются и прогреваются один раз. Сессии получают общие модели, а
+    состояние сессии (трекер, окна признаков людей) создаётся для каждой
+    сессии отдельно.
+    """
+
+    def __init__(self, config_path=CONFIG_PATH):
+        self.config_path = config_path
+        self.cfg = None
+        self.pose_estimator = None
+        self.reid_extractor = None
+        self.classifier_model = None
+        self.classifier_pca = None
+        self.scheduler = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        # сессии обрабатывают кадры в разных потоках, общие модели и их буферы не потокобезопасны
+        self.inference_lock = ModelLock()
+
+    @property
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def status(self):
+        """Статус готовности реестра для эндпоинта готовности."""
+        if self.error is not None:
+            return {"status": "error", "error": str(self.error)}
+        return {"status": "ready" if self.is_ready else "warming_up"}
+
+    def load(self):
+        """Загружает конфигурацию и веса, если они ещё не загружены."""
+        with self._lock:
+            if self._ready.is_set():
+                return
+            try:
+                self._attach_cuda()
+                with self.inference_lock:
+                    self._load()
+                    self._warmup()
+            except Exception as e:
+                self.error = e
+                print(f"Ошибка загрузки моделей: {e}")
+                raise
+            self.error = None
+            self._ready.set()
+            print("Модели загружены и прогреты.")
+
+    def close(self):
+        """Останавливает потоки планировщика, ожидающие кадры завершаются ошибкой,
+        и освобождает CUDA контекст."""
+        if self.scheduler is not None:
+            self.scheduler.close()
+        if self.inference_lock.context is not None:
+            self.inference_lock.context.detach()
+            self.inference_lock.context = None
+
+    def _attach_cuda(self):
+        """Берёт основной CUDA контекст устройства, тот же, что использует torch."""
+        if cuda is None or self.inference_lock.context is not None:
+            return
+        cuda.init()
+        self.inference_lock.context = cuda.Device(torch.cuda.current_device()).retain_primary_context()
+
+    def _load(self):
+        cfg = Config(self.config_path)
+
+        pose_estimator = get_pose_estimator(**cfg.POSE)
+
+        # reid модель нужна только DeepSort, трекер sort работает без неё
+        reid_extractor = None
+        if get_tracker_name(**cfg.TRACKER) == 'deepsort':
+            tracker_kwargs = dict(cfg.TRACKER)
+            tracker_kwargs.pop('name')
+            reid_extractor = get_feature_extractor(**tracker_kwargs)
+
+        model_path = cfg.CLASSIFIER.model_path
+        if isinstance(model_path, (list, tuple)):
+            model_path = os.path.join(*model_path)
+        classifier_model = load_action_model(model_path, len(cfg.CLASSIFIER.classes))
+        classifier_pca = load_pca(model_path)
+        if cfg.CLASSIFIER.get('fuse_pca', False):
+            classifier_model = fuse_classifier(classifier_model, classifier_pca)
+
+        self.cfg = cfg
+        self.pose_estimator = pose_estimator
+        self.reid_extractor = reid_extractor
+        self.classifier_model = classifier_model
+        self.classifier_pca = classifier_pca
+
+        # кадры камер объединяются в пачки для оценки поз и reid
+        scheduler_cfg = cfg.get('SCHEDULER', {})
+        if scheduler_cfg.get('enabled', False):
+            self.scheduler = InferenceScheduler(
+                pose_estimator, reid_extractor, lock=self.inference_lock, **scheduler_cfg)
+
+    @torch.no_grad()
+    def _warmup(self):
+        """Прогоняет пустые данные через модели, чтобы первый кадр не платил за инициализацию."""
+        size = self.cfg.POSE.size
+        height, width = size if isinstance(size, (list, tuple)) else (size, size)
+        self.pose_estimator.predict(np.zeros((height, width, 3), dtype=np.uint8), get_bbox=True)
+
+        if self.reid_extractor is not None:
+            crop_h, crop_w = self.reid_extractor.data_meta['size']
+            self.reid_extractor([np.zeros((crop_h, crop_w, 3), dtype=np.uint8)])
+
+        device = next(self.classifier_model.parameters()).device
+        features = np.zeros((1, self.classifier_pca.n_features_in_))
+        predict_scores(self.classifier_model, self.classifier_pca, features, device)
+
+    def create_components(self, model_name=None, batched=False):
+        """Создаёт компоненты сессии на основе общих моделей.
+
+        С batched=True и включённым планировщиком сессия получает заместители
+        моделей, которые выполняют оценку поз и reid пачками вместе с кадрами
+        других сессий. Блокировку моделей тогда берёт сам планировщик.
+        """
+        self.load()
+        cfg = self.cfg
+
+        pose_estimator, reid_extractor = self.pose_estimator, self.reid_extractor
+        inference_lock = self.inference_lock
+        if batched and self.scheduler is not None:
+            pose_estimator = self.scheduler.pose_estimator
+            reid_extractor = self.scheduler.feature_extractor
+            inference_lock = None
+
+        tracker = get_tracker(**cfg.TRACKER, extractor=reid_extractor)
+        action_classifier = get_classifier(
+            **cfg.CLASSIFIER, model=self.classifier_model, pca=self.classifier_pca)
+
+        components = {
+            'pose_estimator': pose_estimator,
+            'tracker': tracker,
+            'action_classifier': action_classifier,
+            'drawer': Drawer(),
+            'inference_lock': inference_lock,
+            'visualization_params': {
+                'text_color': 'green',
+                'add_blank': False,
+                'Mode': 'action',
+            }
+        }
+        if model_name is not None:
+            components['model_name'] = model_name
+        return components
+
+
+registry = ModelRegistry()
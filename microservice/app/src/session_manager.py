@@ -0,0 +1,153 @@
+import asyncio
+import time
+import uuid
+
+from app.src.camera_session import CameraSessionWorker
+from app.src.lib.utils.config import Config
+from app.src.model_registry import CONFIG_PATH
+
+# код закрытия WebSocket "Policy Violation" для подключений с неверными параметрами
+CLOSE_POLICY_VIOLATION = 1008
+# код закрытия WebSocket "Try Again Later" при превышении числа сессий
+CLOSE_TRY_AGAIN_LATER = 1013
+# код закрытия WebSocket "Going Away" для сессий без кадров дольше idle_timeout
+CLOSE_GOING_AWAY = 1001
+
+
+class CameraSession:
+    """Сессия одного WebSocket подключения камеры.
+
+    Хранит состояние сессии (трекер, классификатор, воркер) под уникальным
+    идентификатором, поэтому несколько клиентов одной модели не мешают друг другу.
+    """
+
+    def __init__(self, websocket, model_name):
+        self.id = uuid.uuid4().hex
+        self.websocket = websocket
+        self.model_name = model_name
+        self.components = None
+        self.worker = None
+        self.created_at = time.time()
+        self.last_activity = self.created_at
+
+    def start(self, components, response_mode='frame'):
+        """Запускает воркер сессии с её компонентами, возвращает задачу воркера."""
+        self.components = components
+        self.worker = CameraSessionWorker(self.websocket, components, response_mode=response_mode)
+        return asyncio.create_task(self.worker.run())
+
+    def submit(self, header, payload):
+        self.last_activity = time.time()
+        self.worker.submit(header, payload)
+
+    def close(self):
+        """Останавливает воркер и освобождает трекер и классификатор сессии."""
+        if self.worker is not None:
+            self.worker.close()
+        self.components = None
+
+    @property
+    def tracker(self):
+        return (self.components or {}).get('tracker')
+
+    def tracks_alive(self):
+        """Число подтверждённых треков трекера сессии."""
+        if self.tracker is None:
+            return 0
+        return sum(track.is_confirmed() for track in self.tracker.tracker.tracks)
+
+    def stats(self):
+        now = time.time()
+        stats = {
+            "id": self.id,
+            "model_name": self.model_name,
+            "response_mode": self.worker.response_mode if self.worker is not None else None,
+            "uptime_s": round(now - self.created_at, 1),
+            "idle_s": round(now - self.last_activity, 1),
+            "tracks_alive": self.tracks_alive(),
+            # память галереи признаков внешнего вида, None для трекера без reid
+            "gallery_memory": self.tracker.gallery_memory_usage() if self.tracker is not None else None,
+            # число извлечённых и повторно использованных reid признаков
+            "reid": self.tracker.reid_stats() if self.tracker is not None else None,
+        }
+        if self.worker is not None:
+            stats.update(self.worker.stats())
+        return stats
+
+
+class SessionManager:
+    """Реестр активных сессий камер.
+
+    Ограничивает число одновременных сессий (max_sessions, None - без
+    ограничения) и закрывает сессии, не присылавшие кадры дольше idle_timeout
+    секунд, освобождая их трекеры и классификаторы.
+    """
+
+    def __init__(self, max_sessions=None, idle_timeout=None, eviction_interval=5):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.eviction_interval = eviction_interval
+        self.sessions = {}
+
+    def load_config(self, config_path=CONFIG_PATH):
+        """Применяет настройки секции SESSIONS конфигурации."""
+        cfg = Config(config_path).get('SESSIONS', {})
+        self.max_sessions = cfg.get('max_sessions', self.max_sessions)
+        self.idle_timeout = cfg.get('idle_timeout', self.idle_timeout)
+        self.eviction_interval = cfg.get('eviction_interval', self.eviction_interval)
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def open(self, websocket, model_name):
+        """Регистрирует новую сессию, None если достигнут лимит сессий."""
+        if self.max_sessions is not None and len(self.sessions) >= self.max_sessions:
+            return None
+        session = CameraSession(websocket, model_name)
+        self.sessions[session.id] = session
+        return session
+
+    async def admit(self, websocket, model_name):
+        """Открывает сессию подключения или закрывает WebSocket с кодом 1013 при превышении лимита."""
+        session = self.open(websocket, model_name)
+        if session is None:
+            print(f"Отклонено подключение к модели {model_name}: достигнут лимит сессий.")
+            await websocket.close(code=CLOSE_TRY_AGAIN_LATER)
+        return session
+
+    def close(self, session_id):
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            session.close()
+        return session
+
+    async def evict_idle(self):
+        """Закрывает сессии без кадров дольше idle_timeout, возвращает их идентификаторы."""
+        if self.idle_timeout is None:
+            return []
+        deadline = time.time() - self.idle_timeout
+        evicted = [s for s in self.sessions.values() if s.last_activity < deadline]
+        for session in evicted:
+            print(f"Сессия {session.id} ({session.model_name}) закрыта по неактивности.")
+            self.close(session.id)
+            try:
+                await session.websocket.close(code=CLOSE_GOING_AWAY)
+            except Exception as e:
+                print(f"Ошибка закрытия WebSocket сессии {session.id}: {e}")
+        return [session.id for session in evicted]
+
+    async def run_eviction(self):
+        """Фоновая задача периодического закрытия неактивных сессий."""
+        while True:
+            await asyncio.sleep(self.eviction_interval)
+            await self.evict_idle()
+
+    def stats(self):
+        return {
+            "active_sessions": len(self.sessions),
+            "max_sessions": self.max_sessions,
+            "sessions": [session.stats() for session in self.sessions.values()],
+        }
+
+
+session_manager = SessionManager()
@@ -1,16 +1,19 @@
+import contextlib
 import json
 import os
 import tempfile
 import cv2
 from tqdm import tqdm
 
-from app.src.lib.action_classifier import get_classifier
-from app.src.lib.pose_estimation import get_pose_estimator
-from app.src.lib.tracker import get_tracker
-from app.src.lib.utils.config import Config
 from app.src.lib.utils.drawer import Drawer
+from app.src.lib.utils.pipeline import FramePipeline, Stage
 from app.src.lib.utils.utils import convert_to_openpose_skeletons
 from app.src.lib.utils.video import Video
+from app.src.model_registry import registry
+
+# Размер очередей между стадиями конвейера и число потоков рендера
+PIPELINE_QUEUE_SIZE = 8
+RENDER_WORKERS = 2
 
 
 def process_video(file):
@@ -45,31 +48,8 @@ def initialize_progress_bar(video):
    return tqdm(total=total_frames, desc="Processing video", unit="frame", dynamic_ncols=True)
 
 def initialize_components():
-    # Load configuration
-    cfg = Config("app/src/configs/infer_trtpose_deepsort_dnn.yaml")
-
-    # Initialize modules
-    pose_estimator = get_pose_estimator(**cfg.POSE)
-    tracker = get_tracker(**cfg.TRACKER)
-    action_classifier = get_classifier(**cfg.CLASSIFIER)
-    drawer = Drawer()
-
-    # Проверяем, что все компоненты корректно инициализированы
-    if not pose_estimator or not tracker or not action_classifier or not drawer:
-        print("Ошибка инициализации компонентов!")
-        raise ValueError("Не удалось инициализировать один или несколько компонентов")
-
-    return {
-        'pose_estimator': pose_estimator,
-        'tracker': tracker,
-        'action_classifier': action_classifier,
-        'drawer': drawer,
-        'visualization_params': {
-            'text_color': 'green',
-            'add_blank': False,
-            'Mode': 'action',
-        }
-    }
+    """Возвращает компоненты обработки на основе общих прогретых моделей реестра."""
+    return registry.create_components()
 
 
 def initialize_video_writer(video, output_path):
@@ -78,38 +58,73 @@ def initialize_video_writer(video, output_path):
    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
    return cv2.VideoWriter(output_path, fourcc, video.fps, (output_width, output_height))
 
-def process_frames(video, components, video_writer, progress_bar):
+def process_frames(video, components, video_writer, progress_bar,
+                   queue_size=PIPELINE_QUEUE_SIZE, render_workers=RENDER_WORKERS):
+    """Обрабатывает видео конвейером: декодирование, инференс, рендер и запись
+    выполняются в отдельных потоках и соединены ограниченными очередями.
+
+    Инференс выполняется в одном потоке, так как трекер и классификатор хранят
+    состояние между кадрами. Рендер может выполняться в нескольких потоках,
+    порядок кадров при записи восстанавливается конвейером.
+    """
     pose_estimator = components['pose_estimator']
     tracker = components['tracker']
     action_classifier = components['action_classifier']
-    drawer = components['drawer']
     user_text = components['visualization_params']
+    inference_lock = components.get('inference_lock') or contextlib.nullcontext()
+    # Drawer хранит текущий цвет, поэтому у каждого потока рендера свой экземпляр
+    drawers = [components['drawer']] + [Drawer() for _ in range(render_workers - 1)]
 
     log_entries = []
     timestamp_prev = 0
 
-    for bgr_frame, timestamp in video:
-        print(f"Обработка кадра {video.frame_cnt}, таймстамп: {timestamp}")
-
-        # Process frame
-        rgb_frame = cv2.cvtColor(bgr_frame, cv2.COLOR_BGR2RGB)
-        predictions = process_frame(rgb_frame, pose_estimator, tracker, action_classifier)
-
-        # Render and write the frame
-        render_image = drawer.render_frame(bgr_frame, predictions, **user_text)
+    def decode_frames():
+        for bgr_frame, timestamp in video:
+            rgb_frame = cv2.cvtColor(bgr_frame, cv2.COLOR_BGR2RGB)
+            yield bgr_frame, rgb_frame, timestamp, video.frame_cnt
+
+    def infer(item):
+        bgr_frame, rgb_frame, timestamp, frame_cnt = item
+        print(f"Обработка кадра {frame_cnt}, таймстамп: {timestamp}")
+        # общие модели реестра могут одновременно использовать сессии камер
+        with inference_lock:
+            predictions = process_frame(rgb_frame, pose_estimator, tracker, action_classifier)
+        return bgr_frame, predictions, timestamp, frame_cnt
+
+    def make_renderer(drawer):
+        def render(item):
+            bgr_frame, predictions, timestamp, frame_cnt = item
+            render_image = drawer.render_frame(bgr_frame, predictions, **user_text)
+            return render_image, predictions, timestamp, frame_cnt
+        return render
+
+    def encode(item):
+        nonlocal timestamp_prev
+        render_image, predictions, timestamp, frame_cnt = item
         if render_image is None:
             print("Ошибка рендера кадра!")
-            continue
+            return
         video_writer.write(render_image)
 
         # Add log entry if needed
         if timestamp - timestamp_prev >= 1:
-            log_entry = create_log_entry(predictions, timestamp, video.frame_cnt)
+            log_entry = create_log_entry(predictions, timestamp, frame_cnt)
             log_entries.append(log_entry)
             timestamp_prev = timestamp
 
         progress_bar.update(1)
 
+    pipeline = FramePipeline(
+        decode_frames(),
+        [
+            Stage('inference', infer),
+            Stage('render', [make_renderer(drawer) for drawer in drawers]),
+        ],
+        encode,
+        queue_size=queue_size,
+    )
+    pipeline.run()
+
     return log_entries
 
 
@@ -120,7 +135,7 @@ def process_frame(rgb_frame, pose_estimator, tracker, action_classifier):
 
     if len(predictions) == 0:
         tracker.increment_ages()
-        return []
+        return predictions
 
     # Track and classify
     predictions = convert_to_openpose_skeletons(predictions)
@@ -1,12 +1,22 @@
 import base64
+import contextlib
 import json
 import cv2
+from app.src import frame_protocol
+from app.src.lib.utils.annotation import FrameResult
 from app.src.video_processing import create_log_entry, process_frame
 import numpy as np
 
 
-def process_frame_and_render(bgr_frame, components):
-    """Обрабатывает кадр и рендерит визуализацию в зависимости от выбранной модели."""
+def _model_lock(components):
+    """Блокировка общих моделей реестра, если она есть в компонентах сессии."""
+    return components.get('inference_lock') or contextlib.nullcontext()
+
+
+def process_frame_and_render(bgr_frame, components, render=True):
+    """Обрабатывает кадр и рендерит визуализацию в зависимости от выбранной модели.
+    С render=False отрисовка пропускается и вместо визуализации возвращается исходный кадр.
+    """
     try:
         if bgr_frame is None or not isinstance(bgr_frame, np.ndarray):
             print("Ошибка: некорректный входной кадр!")
@@ -19,12 +29,13 @@ def process_frame_and_render(bgr_frame, components):
         if model_name == 'emotion':
             try:
                 from deepface import DeepFace
-                analysis = DeepFace.analyze(rgb_frame, actions=['emotion'], enforce_detection=False)
+                with _model_lock(components):
+                    analysis = DeepFace.analyze(rgb_frame, actions=['emotion'], enforce_detection=False)
                 if not analysis:
                     print("DeepFace не нашёл лиц на кадре.")
                     return [], bgr_frame
                 
-                render_image = bgr_frame.copy()
+                render_image = bgr_frame.copy() if render else bgr_frame
                 predictions = [{'id': 1, 'action': f"emotion: {face_data['dominant_emotion']}"} for face_data in analysis] if isinstance(analysis, list) else [{'id': 1, 'action': f"emotion: {analysis['dominant_emotion']}"}]
             except Exception as e:
                 print(f"Ошибка в анализе эмоций: {e}")
@@ -37,8 +48,11 @@ def process_frame_and_render(bgr_frame, components):
                 return [], bgr_frame
             
             try:
-                predictions = process_frame(rgb_frame, components['pose_estimator'], components['tracker'], components['action_classifier'])
-                render_image = components['drawer'].render_frame(bgr_frame, predictions, **components['visualization_params'])
+                # модели общие для всех сессий, инференс сессий идёт в разных потоках
+                with _model_lock(components):
+                    predictions = process_frame(rgb_frame, components['pose_estimator'], components['tracker'], components['action_classifier'])
+                render_image = components['drawer'].render_frame(bgr_frame, predictions, **components['visualization_params']) \
+                    if render else bgr_frame
             except Exception as e:
                 print(f"Ошибка в стандартной обработке кадра: {e}")
                 render_image = bgr_frame.copy()
@@ -52,24 +66,103 @@ def process_frame_and_render(bgr_frame, components):
 
 
 
-async def send_websocket_data(websocket, render_image, predictions, timestamp, frame_count):
-    """Формирует и отправляет данные через WebSocket."""
+def encode_websocket_data(render_image, predictions, timestamp, frame_count, header=None, session_stats=None):
+    """Кодирует кадр и лог в сообщения для отправки через WebSocket.
+
+    Для клиентов бинарного протокола (header - заголовок исходного кадра)
+    возвращает METADATA с логом и FRAME_JPEG с кадром, оба с номером и временем
+    исходного кадра. Для старых клиентов без заголовка - JSON с кадром в base64.
+    """
     try:
         log_entry = create_log_entry(predictions, timestamp, frame_count)
+        if session_stats is not None:
+            log_entry["Session"] = session_stats
         _, buffer = cv2.imencode('.jpg', render_image)
         if not _ or buffer is None:
             print("Ошибка: не удалось закодировать кадр в JPEG.")
-            return
+            return []
+
+        print(f"Отправка данных клиенту: размер кадра {len(buffer)} байт, log_entry: {log_entry}")
+        if header is not None:
+            return [
+                frame_protocol.pack_json(
+                    frame_protocol.METADATA, header.seq, log_entry, header.timestamp),
+                frame_protocol.pack_message(
+                    frame_protocol.FRAME_JPEG, header.seq, buffer, header.timestamp),
+            ]
 
         frame_data = base64.b64encode(buffer).decode('utf-8')
         response = {
             "frame": frame_data,
             "log": json.dumps(log_entry, default=str)
         }
-
-        print(f"Отправка данных клиенту: размер кадра {len(buffer)} байт, log_entry: {log_entry}")
-        await websocket.send_text(json.dumps(response))
+        return [json.dumps(response)]
 
     except Exception as e:
-        print(f"Ошибка отправки данных через WebSocket: {e}")
+        print(f"Ошибка кодирования данных для WebSocket: {e}")
+        return []
+
+
+def error_message(message, header=None):
+    """Сообщение об ошибке в протоколе, которым клиент прислал кадр."""
+    if header is not None:
+        return frame_protocol.pack_json(
+            frame_protocol.ERROR, header.seq, {"error": message}, header.timestamp)
+    return json.dumps({"error": message})
+
+
+def people_records(predictions, image_size):
+    """Упаковывает людей кадра в записи PERSON_DTYPE бинарного протокола.
+    Координаты переводятся в пиксели int16, ненайденные суставы получают -1.
+    """
+    if not isinstance(predictions, FrameResult):
+        # анализ эмоций не возвращает людей с позами
+        return np.zeros(0, dtype=frame_protocol.PERSON_DTYPE)
+    img_h, img_w = image_size
+    people = np.zeros(len(predictions), dtype=frame_protocol.PERSON_DTYPE)
+    people['id'] = predictions.ids
+    people['bbox'] = np.rint(predictions.track_bboxes)
+    coords = predictions.keypoints[:, :, 1:] * (img_w, img_h)
+    is_found = (predictions.keypoints[:, :, 1:] != 0).any(axis=2, keepdims=True)
+    people['keypoints'] = np.where(is_found, np.rint(coords), -1)
+    people['action'] = predictions.action_idx
+    people['score'] = np.rint(np.clip(predictions.action_scores, 0, 1) * 65535)
+    return people
+
+
+def encode_keypoints_data(predictions, image_size, header=None):
+    """Кодирует данные людей кадра для отрисовки на клиенте вместо кадра JPEG.
+
+    Для клиентов бинарного протокола возвращает сообщение KEYPOINTS с номером и
+    временем исходного кадра, для старых клиентов - JSON со списком людей.
+    """
+    people = people_records(predictions, image_size)
+    img_h, img_w = image_size
+    if header is not None:
+        return [frame_protocol.pack_message(
+            frame_protocol.KEYPOINTS, header.seq,
+            frame_protocol.pack_people(img_w, img_h, people), header.timestamp)]
+    return [json.dumps({
+        "width": img_w,
+        "height": img_h,
+        "people": [
+            {
+                "id": int(person['id']),
+                "bbox": person['bbox'].tolist(),
+                "keypoints": person['keypoints'].tolist(),
+                "action": int(person['action']),
+                "score": round(int(person['score']) / 65535, 4),
+            }
+            for person in people
+        ],
+    })]
+
 
+def encode_log_data(predictions, timestamp, frame_count, header=None, extra=None):
+    """Кодирует только лог кадра: METADATA для бинарного протокола, JSON для старых клиентов."""
+    log_entry = create_log_entry(predictions, timestamp, frame_count)
+    log_entry.update(extra or {})
+    if header is not None:
+        return [frame_protocol.pack_json(
+            frame_protocol.METADATA, header.seq, log_entry, header.timestamp)]
+    return [json.dumps({"log": json.dumps(log_entry, default=str)})]
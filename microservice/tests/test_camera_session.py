@@ -0,0 +1,157 @@
+import asyncio
+import importlib.util
+import threading
+import unittest
+
+import cv2
+import numpy as np
+
+from app.src import frame_protocol
+
+# the session worker imports the registry and trt_pose, only installed on the
+# inference hosts. A failed import would leave the pose estimation packages half imported
+if importlib.util.find_spec('trt_pose') is not None:
+    from app.src.camera_session import CameraSessionWorker, LatestFrameMailbox
+else:
+    CameraSessionWorker = LatestFrameMailbox = None
+
+
+class FakeWebSocket:
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def send_text(self, data):
+        self.sent.append(data)
+
+
+async def wait_until(condition, timeout=5):
+    ''' poll the condition while letting the event loop and worker threads run '''
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        if loop.time() > deadline:
+            raise AssertionError('condition not reached in time')
+        await asyncio.sleep(0.001)
+
+
+@unittest.skipIf(LatestFrameMailbox is None, 'trt_pose is not installed')
+class LatestFrameMailboxTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_latest_frame_replaces_pending(self):
+        mailbox = LatestFrameMailbox()
+        for item in ('a', 'b', 'c'):
+            mailbox.put(item)
+        self.assertTrue(mailbox.pending)
+        self.assertEqual(await mailbox.get(), 'c')
+        self.assertFalse(mailbox.pending)
+        self.assertEqual((mailbox.received, mailbox.dropped), (3, 2))
+
+        # a frame taken before the next one arrives is not dropped
+        mailbox.put('d')
+        self.assertEqual(await mailbox.get(), 'd')
+        self.assertEqual((mailbox.received, mailbox.dropped), (4, 2))
+
+    async def test_get_waits_for_put(self):
+        mailbox = LatestFrameMailbox()
+        getter = asyncio.create_task(mailbox.get())
+        await asyncio.sleep(0.01)
+        self.assertFalse(getter.done())
+        mailbox.put('frame')
+        self.assertEqual(await asyncio.wait_for(getter, 1), 'frame')
+
+    async def test_close_unblocks_waiting_get(self):
+        mailbox = LatestFrameMailbox()
+        getter = asyncio.create_task(mailbox.get())
+        await asyncio.sleep(0.01)
+        self.assertFalse(getter.done())
+        mailbox.close()
+        self.assertIsNone(await asyncio.wait_for(getter, 1))
+
+        # a frame left in the mailbox is not returned after close
+        mailbox.put('late')
+        self.assertIsNone(await asyncio.wait_for(mailbox.get(), 1))
+
+
+@unittest.skipIf(CameraSessionWorker is None, 'trt_pose is not installed')
+class CameraSessionWorkerTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.websocket = FakeWebSocket()
+        # without the pose components a frame yields no people, the log is not due yet
+        self.worker = CameraSessionWorker(
+            self.websocket, {}, send_interval=3600, response_mode='keypoints')
+        self.jpeg = cv2.imencode('.jpg', np.zeros((48, 64, 3), dtype=np.uint8))[1].tobytes()
+
+        # the first frame blocks in the session thread until released
+        self.started, self.release = threading.Event(), threading.Event()
+        process = self.worker._process
+
+        def blocking_process(header, payload):
+            self.started.set()
+            self.release.wait(5)
+            return process(header, payload)
+
+        self.worker._process = blocking_process
+
+    def tearDown(self):
+        self.release.set()
+        self.worker.close()
+
+    def submit(self, seq):
+        header = frame_protocol.FrameHeader(
+            frame_protocol.VERSION, frame_protocol.FRAME_JPEG, seq, 0.0, len(self.jpeg))
+        self.worker.submit(header, self.jpeg)
+
+    def sent_seqs(self):
+        return [frame_protocol.unpack_message(message)[0].seq for message in self.websocket.sent]
+
+    async def test_counters_and_dropped_frames(self):
+        task = asyncio.create_task(self.worker.run())
+        self.submit(1)
+        await wait_until(self.started.is_set)
+
+        # frames arriving while the first one is processed replace each other
+        for seq in (2, 3, 4):
+            self.submit(seq)
+        stats = self.worker.stats()
+        self.assertEqual((stats['received'], stats['processed'], stats['dropped']), (4, 0, 2))
+        self.assertEqual(stats['queue_depth'], 2)
+
+        self.release.set()
+        await wait_until(lambda: len(self.websocket.sent) == 2)
+        self.assertEqual(self.sent_seqs(), [1, 4])
+        stats = self.worker.stats()
+        self.assertEqual((stats['received'], stats['processed'], stats['dropped']), (4, 2, 2))
+        self.assertEqual(stats['queue_depth'], 0)
+
+        self.worker.close()
+        await asyncio.wait_for(task, 1)
+
+    async def test_close_stops_idle_worker(self):
+        task = asyncio.create_task(self.worker.run())
+        await asyncio.sleep(0.01)
+        self.assertFalse(task.done())
+        self.worker.close()
+        await asyncio.wait_for(task, 1)
+        self.assertEqual(self.worker.stats()['processed'], 0)
+
+    async def test_close_during_processing(self):
+        task = asyncio.create_task(self.worker.run())
+        self.submit(1)
+        await wait_until(self.started.is_set)
+        self.submit(2)
+
+        # the frame in flight is answered, the pending one is not processed
+        self.worker.close()
+        self.release.set()
+        await asyncio.wait_for(task, 1)
+        self.assertEqual(self.sent_seqs(), [1])
+        self.assertEqual(self.worker.stats()['processed'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+
+import numpy as np
+import torch
+from sklearn.decomposition import PCA
+
+from app.src.lib.action_classifier.dnn.classifier import (
+    FusedMLPClassifier, MLPClassifier, predict_scores)
+
+NUM_FEATURES, NUM_COMPONENTS, NUM_CLASSES = 60, 20, 9
+
+
+def random_classifier(seed):
+    ''' MLPClassifier with random weights and BatchNorm running statistics '''
+    torch.manual_seed(seed)
+    model = MLPClassifier(NUM_COMPONENTS, [32, 16], NUM_CLASSES)
+    with torch.no_grad():
+        for _, batch_norm, _ in model.hidden_layers:
+            batch_norm.running_mean.uniform_(-1, 1)
+            batch_norm.running_var.uniform_(0.5, 2)
+            batch_norm.weight.uniform_(0.5, 1.5)
+            batch_norm.bias.uniform_(-0.5, 0.5)
+    return model.eval()
+
+
+class FusedMLPClassifierTest(unittest.TestCase):
+    ''' PCA and BatchNorm folded into the MLP against PCA followed by the MLP '''
+
+    def test_matches_pca_and_mlp(self):
+        rng = np.random.default_rng(0)
+        # correlated features, like the skeleton window features
+        mixing = rng.normal(size=(NUM_FEATURES, NUM_FEATURES))
+        train = rng.normal(size=(500, NUM_FEATURES)) @ mixing + rng.normal(size=NUM_FEATURES)
+        features = rng.normal(size=(200, NUM_FEATURES)) @ mixing + rng.normal(size=NUM_FEATURES)
+
+        for whiten in (False, True):
+            pca = PCA(NUM_COMPONENTS, whiten=whiten).fit(train)
+            model = random_classifier(int(whiten))
+            fused = FusedMLPClassifier.from_mlp(model, pca)
+
+            with torch.no_grad():
+                expected = model(torch.as_tensor(pca.transform(features), dtype=torch.float32))
+                actual = fused(torch.as_tensor(features, dtype=torch.float32))
+            np.testing.assert_allclose(actual.numpy(), expected.numpy(), atol=1e-5)
+            np.testing.assert_allclose(
+                predict_scores(fused, pca, features, torch.device('cpu')), expected.numpy(),
+                atol=1e-5)
+
+
+if __name__ == '__main__':
+    unittest.main()
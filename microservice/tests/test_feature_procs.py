@@ -0,0 +1,59 @@
+import unittest
+
+import numpy as np
+
+from app.src.lib.action_classifier.dnn.feature_procs import (
+    BatchFeatureGenerator, FeatureGenerator, RingFeatureGenerator)
+
+WINDOW_SIZE = 5
+# the ring buffer generators take square roots and sums in vectorized form,
+# the features agree with FeatureGenerator up to float rounding
+RTOL = 1e-9
+ATOL = 1e-12
+
+
+def random_skeletons(rng, num_skeletons, missing=0.25):
+    ''' Openpose skeletons (N, 36) with a `missing` fraction of joints set to 0 '''
+    skeletons = rng.random((num_skeletons, 18, 2)) + 0.1
+    skeletons[rng.random((num_skeletons, 18)) < missing] = 0
+    return skeletons.reshape(num_skeletons, 36)
+
+
+class RingFeatureGeneratorTest(unittest.TestCase):
+
+    def test_matches_feature_generator(self):
+        rng = np.random.default_rng(0)
+        reference, ring = FeatureGenerator(WINDOW_SIZE), RingFeatureGenerator(WINDOW_SIZE)
+        num_features = 0
+        for skeleton in random_skeletons(rng, 2000):
+            expected_success, expected = reference.add_cur_skeleton(skeleton)
+            is_success, features = ring.add_cur_skeleton(skeleton)
+            self.assertEqual(is_success, expected_success)
+            if expected_success:
+                np.testing.assert_allclose(features, expected, rtol=RTOL, atol=ATOL)
+                num_features += 1
+        self.assertGreater(num_features, 100)
+
+    def test_batch_matches_feature_generator(self):
+        rng = np.random.default_rng(1)
+        num_tracks = 6
+        batch = BatchFeatureGenerator(WINDOW_SIZE, capacity=2)
+        slots = [batch.acquire() for _ in range(num_tracks)]
+        references = [FeatureGenerator(WINDOW_SIZE) for _ in range(num_tracks)]
+        num_features = 0
+        for _ in range(400):
+            skeletons = random_skeletons(rng, num_tracks)
+            is_success, features = batch.add_skeletons(slots, skeletons)
+            self.assertEqual(len(features), is_success.sum())
+            features = iter(features)
+            for reference, skeleton, success in zip(references, skeletons, is_success):
+                expected_success, expected = reference.add_cur_skeleton(skeleton)
+                self.assertEqual(success, expected_success)
+                if expected_success:
+                    np.testing.assert_allclose(next(features), expected, rtol=RTOL, atol=ATOL)
+                    num_features += 1
+        self.assertGreater(num_features, 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import ast
+import os
+import unittest
+
+MICROSERVICE_COPY = os.path.join(
+    os.path.dirname(__file__), os.pardir, 'app', 'src', 'frame_protocol.py')
+DJANGO_COPY = os.path.join(
+    os.path.dirname(__file__), os.pardir, os.pardir, 'videoanalytics', 'utils', 'frame_protocol.py')
+
+
+def protocol_code(path):
+    ''' dump of the module ast without its docstring, the only part the copies may differ in '''
+    with open(path, encoding='utf-8') as f:
+        module = ast.parse(f.read())
+    body = module.body
+    if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant):
+        body = body[1:]
+    return [ast.dump(node) for node in body]
+
+
+@unittest.skipIf(not os.path.isfile(DJANGO_COPY), 'django copy of the protocol is not checked out')
+class FrameProtocolCopiesTest(unittest.TestCase):
+    """ The microservice image is built without the django app, so the protocol is copied. """
+
+    def test_copies_match(self):
+        microservice, django = protocol_code(MICROSERVICE_COPY), protocol_code(DJANGO_COPY)
+        self.assertEqual(len(microservice), len(django), 'frame_protocol.py copies diverged')
+        for ours, theirs in zip(microservice, django):
+            self.assertEqual(ours, theirs, 'frame_protocol.py copies diverged')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+
+import numpy as np
+
+from app.src.lib.tracker import get_tracker
+from app.src.lib.tracker.deepsort.hsv_descriptor import HsvStripeExtractor
+
+
+def person_image(rng, colors, light=1.0, noise=12):
+    ''' rgb image of a person with one color per head, torso, thighs and shins stripe '''
+    image = np.zeros((128, 64, 3))
+    bounds = [0, 25, 70, 102, 128]
+    for color, top, bottom in zip(colors, bounds[:-1], bounds[1:]):
+        image[top:bottom] = color
+    return np.clip(image * light + rng.normal(0, noise, image.shape), 0, 255).astype(np.uint8)
+
+
+class HsvStripeExtractorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        self.extractor = HsvStripeExtractor(verbose=False)
+
+    def test_shape_and_norm(self):
+        image = self.rng.integers(0, 256, (240, 320, 3), dtype=np.uint8)
+        boxes = np.array([[0, 0, 60, 150], [100, 20, 180, 230], [300, 200, 330, 240]])
+        keypoints = self.rng.random((3, 18, 3))
+        features = self.extractor.extract(image, boxes, keypoints)
+        self.assertEqual(features.shape, (3, self.extractor.feature_dim))
+        self.assertEqual(features.dtype, np.float32)
+        np.testing.assert_allclose(np.linalg.norm(features, axis=1), 1, rtol=1e-5)
+        self.assertEqual(self.extractor.extract(image, np.zeros((0, 4))).shape,
+                         (0, self.extractor.feature_dim))
+
+    def test_same_colors_are_closer(self):
+        people = [self.rng.integers(0, 256, (4, 3)) for _ in range(50)]
+        for colors, other_colors in zip(people, people[1:]):
+            anchor, same, other = self.extractor([
+                person_image(self.rng, colors, light=0.9),
+                person_image(self.rng, colors, light=1.1),
+                person_image(self.rng, other_colors)])
+            self.assertLess(1 - anchor @ same, 1 - anchor @ other)
+
+    def test_tracker_uses_hsv_threshold(self):
+        tracker = get_tracker('deepsort', reid_name='hsv_stripes', max_dist=0.2, hsv_max_dist=0.35)
+        self.assertEqual(tracker.tracker.metric.matching_threshold, 0.35)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,201 @@
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from app.src.inference_scheduler import BatchQueue, InferenceScheduler
+
+
+def submit_all(batch_queue, requests):
+    ''' submit every request from its own thread, return the results or errors in request order '''
+    outcomes = [None] * len(requests)
+
+    def worker(idx):
+        try:
+            outcomes[idx] = batch_queue.submit(*requests[idx])
+        except Exception as e:
+            outcomes[idx] = e
+
+    threads = [threading.Thread(target=worker, args=(idx,)) for idx in range(len(requests))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    return outcomes
+
+
+class BatchQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.queues = []
+
+    def tearDown(self):
+        for batch_queue in self.queues:
+            batch_queue.close()
+
+    def make_queue(self, run_batch, **kwargs):
+        batch_queue = BatchQueue('test', run_batch, **kwargs)
+        self.queues.append(batch_queue)
+        return batch_queue
+
+    def test_fan_out_fan_in(self):
+        batch_sizes = []
+
+        def run_batch(requests):
+            batch_sizes.append(len(requests))
+            time.sleep(0.01)
+            return [(a * 10, b) for a, b in requests]
+
+        batch_queue = self.make_queue(run_batch, max_batch=4, max_wait_ms=50)
+        requests = [(idx, f'session-{idx}') for idx in range(10)]
+        outcomes = submit_all(batch_queue, requests)
+
+        self.assertEqual(outcomes, [(idx * 10, f'session-{idx}') for idx in range(10)])
+        self.assertEqual(sum(batch_sizes), 10)
+        self.assertLessEqual(max(batch_sizes), 4)
+        self.assertLess(len(batch_sizes), 10)
+        stats = batch_queue.stats()
+        self.assertEqual((stats['batches'], stats['requests'], stats['errors']),
+                         (len(batch_sizes), 10, 0))
+
+    def test_error_reaches_every_request_of_the_batch(self):
+        failing = threading.Event()
+        failing.set()
+
+        def run_batch(requests):
+            if failing.is_set():
+                raise ValueError('engine failure')
+            return [a for a, in requests]
+
+        batch_queue = self.make_queue(run_batch, max_batch=8, max_wait_ms=100)
+        outcomes = submit_all(batch_queue, [(idx,) for idx in range(5)])
+        for outcome in outcomes:
+            self.assertIsInstance(outcome, ValueError)
+            self.assertEqual(str(outcome), 'engine failure')
+        stats = batch_queue.stats()
+        self.assertGreaterEqual(stats['errors'], 1)
+        self.assertEqual(stats['last_error'], "ValueError('engine failure')")
+        self.assertEqual(stats['requests'], 0)
+
+        # the batch thread keeps serving after an error
+        failing.clear()
+        self.assertEqual(batch_queue.submit(7), 7)
+
+    def test_wrong_number_of_results_is_an_error(self):
+        batch_queue = self.make_queue(lambda requests: [], max_wait_ms=0)
+        with self.assertRaises(RuntimeError):
+            batch_queue.submit(1)
+        self.assertEqual(batch_queue.stats()['errors'], 1)
+
+    def test_timeout_skips_the_request(self):
+        release = threading.Event()
+        seen = []
+
+        def run_batch(requests):
+            seen.extend(requests)
+            release.wait(5)
+            return [a for a, in requests]
+
+        batch_queue = self.make_queue(run_batch, max_batch=1, max_wait_ms=0, timeout=0.05)
+        first = threading.Thread(target=submit_all, args=(batch_queue, [('first',)]))
+        first.start()
+        while not seen:
+            time.sleep(0.001)
+        # the batch thread is busy, the second request times out while queued
+        with self.assertRaises(TimeoutError):
+            batch_queue.submit('second')
+        release.set()
+        first.join(timeout=5)
+        batch_queue.timeout = None
+        self.assertEqual(batch_queue.submit('third'), 'third')
+        self.assertEqual(seen, [('first',), ('third',)])
+
+    def test_close_fails_pending_requests(self):
+        release = threading.Event()
+        started = threading.Event()
+
+        def run_batch(requests):
+            started.set()
+            release.wait(5)
+            return [a for a, in requests]
+
+        batch_queue = self.make_queue(run_batch, max_batch=1, max_wait_ms=0)
+        outcomes = []
+        submitter = threading.Thread(
+            target=lambda: outcomes.extend(submit_all(batch_queue, [(idx,) for idx in range(4)])))
+        submitter.start()
+        started.wait(5)
+        while batch_queue._requests.qsize() < 3:
+            time.sleep(0.001)
+
+        closer = threading.Thread(target=batch_queue.close)
+        closer.start()
+        while batch_queue._requests.qsize() < 4:  # the closed marker is queued
+            time.sleep(0.001)
+        release.set()
+        closer.join(timeout=5)
+        submitter.join(timeout=5)
+        self.assertFalse(submitter.is_alive())
+        self.assertFalse(batch_queue._thread.is_alive())
+
+        # the running batch completes, the queued requests fail
+        results = [o for o in outcomes if not isinstance(o, Exception)]
+        errors = [o for o in outcomes if isinstance(o, Exception)]
+        self.assertEqual(len(results), 1)
+        self.assertEqual(len(errors), 3)
+        for error in errors:
+            self.assertIsInstance(error, RuntimeError)
+        with self.assertRaises(RuntimeError):
+            batch_queue.submit(5)
+        batch_queue.close()
+
+
+class FakeReidExtractor:
+    ''' features are the boxes themselves, records the crops of every call '''
+
+    data_meta = {'size': (256, 128)}
+
+    def __init__(self):
+        self.calls = []
+
+    def extract_many(self, images, boxes, keypoints=None):
+        self.calls.append(sum(len(b) for b in boxes))
+        return [np.asarray(b, dtype=np.float32) if len(b) else np.array([]) for b in boxes]
+
+
+class InferenceSchedulerTest(unittest.TestCase):
+
+    def test_reid_crops_are_chunked(self):
+        extractor = FakeReidExtractor()
+        scheduler = InferenceScheduler(None, extractor, max_wait_ms=0, max_crops=4)
+        self.addCleanup(scheduler.close)
+
+        rng = np.random.default_rng(0)
+        image = np.zeros((10, 10, 3), dtype=np.uint8)
+        boxes = [rng.integers(0, 100, (n, 4)) for n in (3, 0, 9, 2, 4)]
+        requests = [(image, b, None) for b in boxes]
+        features = scheduler._run_reid(requests)
+
+        self.assertEqual(len(features), len(boxes))
+        for image_boxes, image_features in zip(boxes, features):
+            self.assertEqual(len(image_features), len(image_boxes))
+            if len(image_boxes):
+                np.testing.assert_array_equal(image_features, image_boxes)
+        self.assertEqual(sum(extractor.calls), 18)
+        self.assertLessEqual(max(extractor.calls), 4)
+
+    def test_reid_through_the_queue(self):
+        extractor = FakeReidExtractor()
+        scheduler = InferenceScheduler(None, extractor, max_wait_ms=20, max_crops=2)
+        self.addCleanup(scheduler.close)
+        image = np.zeros((10, 10, 3), dtype=np.uint8)
+        boxes = [np.full((n, 4), n) for n in (1, 3, 0)]
+        outcomes = submit_all(scheduler.reid_queue, [(image, b, None) for b in boxes])
+        for image_boxes, image_features in zip(boxes, outcomes):
+            self.assertEqual(len(image_features), len(image_boxes))
+        self.assertLessEqual(max(extractor.calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
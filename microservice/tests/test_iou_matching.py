@@ -0,0 +1,87 @@
+import unittest
+
+import numpy as np
+
+from app.src.lib.tracker.deepsort.sort import iou_matching, linear_assignment
+from app.src.lib.tracker.deepsort.sort.detection import Detection
+from app.src.lib.tracker.deepsort.sort.kalman_filter import KalmanFilter
+from app.src.lib.tracker.deepsort.sort.track import Track
+
+
+def reference_iou_cost(tracks, detections, track_indices, detection_indices):
+    ''' Per-track loop of the original iou_cost '''
+    cost_matrix = np.zeros((len(track_indices), len(detection_indices)))
+    for row, track_idx in enumerate(track_indices):
+        if tracks[track_idx].time_since_update > 1:
+            cost_matrix[row, :] = linear_assignment.INFTY_COST
+            continue
+        bbox = tracks[track_idx].to_tlwh()
+        candidates = np.asarray([detections[i].tlwh for i in detection_indices])
+        cost_matrix[row, :] = 1. - iou_matching.iou(bbox, candidates)
+    return cost_matrix
+
+
+def random_tlwh(rng, num_boxes, extent=300):
+    return np.c_[rng.random((num_boxes, 2)) * extent, rng.uniform(20, 120, (num_boxes, 2))]
+
+
+def random_tracks(rng, kf, num_tracks):
+    tracks = []
+    for track_id, (x, y, w, h) in enumerate(random_tlwh(rng, num_tracks), 1):
+        mean, covariance = kf.initiate(np.array([x + w / 2, y + h / 2, w / h, h]))
+        track = Track(mean, covariance, track_id, 3, 30)
+        track.time_since_update = int(rng.integers(0, 4))
+        tracks.append(track)
+    return tracks
+
+
+class IouCostTest(unittest.TestCase):
+    ''' Vectorized IOU cost against the per-track iou() loop '''
+
+    def test_iou_cost(self):
+        rng = np.random.default_rng(0)
+        kf = KalmanFilter()
+        for _ in range(200):
+            tracks = random_tracks(rng, kf, rng.integers(1, 20))
+            detection_tlwh = random_tlwh(rng, rng.integers(1, 20))
+            detections = [Detection(bbox, None) for bbox in detection_tlwh]
+            track_indices = sorted(rng.choice(
+                len(tracks), size=rng.integers(1, len(tracks) + 1), replace=False).tolist())
+            detection_indices = sorted(rng.choice(
+                len(detections), size=rng.integers(1, len(detections) + 1), replace=False).tolist())
+
+            expected = reference_iou_cost(tracks, detections, track_indices, detection_indices)
+            self.assertTrue(np.all((expected == linear_assignment.INFTY_COST) == np.array(
+                [[tracks[i].time_since_update > 1] for i in track_indices])))
+            track_tlwh = iou_matching.tracks_to_tlwh(tracks, list(range(len(tracks))))
+            for kwargs in ({}, {'detection_tlwh': detection_tlwh},
+                           {'track_tlwh': track_tlwh, 'detection_tlwh': detection_tlwh}):
+                cost_matrix = iou_matching.iou_cost(
+                    tracks, detections, track_indices, detection_indices, **kwargs)
+                np.testing.assert_allclose(cost_matrix, expected, rtol=1e-12, atol=1e-12)
+
+    def test_tracks_to_tlwh(self):
+        rng = np.random.default_rng(1)
+        tracks = random_tracks(rng, KalmanFilter(), 10)
+        np.testing.assert_allclose(
+            iou_matching.tracks_to_tlwh(tracks, [3, 0, 7]),
+            [tracks[i].to_tlwh() for i in (3, 0, 7)], rtol=1e-12)
+        self.assertEqual(iou_matching.tracks_to_tlwh(tracks, []).shape, (0, 4))
+
+    def test_iou_pairs(self):
+        rng = np.random.default_rng(2)
+        for _ in range(100):
+            bboxes, candidates = random_tlwh(rng, rng.integers(1, 30)), random_tlwh(rng, rng.integers(1, 30))
+            matrix = iou_matching.iou_matrix(bboxes, candidates)
+            for row, bbox in enumerate(bboxes):
+                np.testing.assert_allclose(
+                    matrix[row], iou_matching.iou(bbox, candidates), rtol=1e-12, atol=1e-15)
+            rows = rng.integers(0, len(bboxes), 50)
+            cols = rng.integers(0, len(candidates), 50)
+            np.testing.assert_allclose(
+                iou_matching.iou_pairs(bboxes, candidates, rows, cols), matrix[rows, cols],
+                rtol=1e-12, atol=1e-15)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import copy
+import unittest
+
+import numpy as np
+
+from app.src.lib.tracker.deepsort.sort.detection import Detection
+from app.src.lib.tracker.deepsort.sort.kalman_filter import KalmanFilter
+from app.src.lib.tracker.deepsort.sort.tracker import Tracker
+from app.src.lib.utils.annotation import FrameResult
+
+RTOL, ATOL = 1e-9, 1e-9
+
+
+def random_states(rng, kf, num_states):
+    ''' States after a few random predict and update steps of the scalar filter '''
+    means, covariances = [], []
+    for _ in range(num_states):
+        measurement = np.r_[rng.random(2) * 600, rng.uniform(0.3, 0.6), rng.uniform(80, 200)]
+        mean, covariance = kf.initiate(measurement)
+        for _ in range(rng.integers(0, 5)):
+            mean, covariance = kf.predict(mean, covariance)
+            if rng.random() < 0.5:
+                measurement = measurement + rng.normal(0, [3, 3, 0.01, 3])
+                mean, covariance = kf.update(mean, covariance, measurement)
+        means.append(mean)
+        covariances.append(covariance)
+    return np.stack(means), np.stack(covariances)
+
+
+class MultiKalmanFilterTest(unittest.TestCase):
+    ''' Batched Kalman filter steps against the per-state steps '''
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        self.kf = KalmanFilter()
+        self.mean, self.covariance = random_states(self.rng, self.kf, 20)
+
+    def test_multi_predict(self):
+        mean, covariance = self.kf.multi_predict(self.mean, self.covariance)
+        for i in range(len(self.mean)):
+            expected_mean, expected_covariance = self.kf.predict(self.mean[i], self.covariance[i])
+            np.testing.assert_allclose(mean[i], expected_mean, rtol=RTOL, atol=ATOL)
+            np.testing.assert_allclose(covariance[i], expected_covariance, rtol=RTOL, atol=ATOL)
+
+    def test_multi_project(self):
+        mean, covariance = self.kf.multi_project(self.mean, self.covariance)
+        for i in range(len(self.mean)):
+            expected_mean, expected_covariance = self.kf.project(self.mean[i], self.covariance[i])
+            np.testing.assert_allclose(mean[i], expected_mean, rtol=RTOL, atol=ATOL)
+            np.testing.assert_allclose(covariance[i], expected_covariance, rtol=RTOL, atol=ATOL)
+
+    def test_multi_update(self):
+        measurement = self.mean[:, :4] + self.rng.normal(0, [5, 5, 0.02, 5], (len(self.mean), 4))
+        mean, covariance = self.kf.multi_update(self.mean, self.covariance, measurement)
+        for i in range(len(self.mean)):
+            expected_mean, expected_covariance = self.kf.update(
+                self.mean[i], self.covariance[i], measurement[i])
+            np.testing.assert_allclose(mean[i], expected_mean, rtol=RTOL, atol=1e-7)
+            np.testing.assert_allclose(covariance[i], expected_covariance, rtol=RTOL, atol=1e-7)
+
+    def test_multi_gating_distance(self):
+        measurements = self.mean[:, :4] + self.rng.normal(0, 20, (len(self.mean), 4))
+        for only_position in (False, True):
+            distance = self.kf.multi_gating_distance(
+                self.mean, self.covariance, measurements, only_position)
+            for i in range(len(self.mean)):
+                np.testing.assert_allclose(distance[i], self.kf.gating_distance(
+                    self.mean[i], self.covariance[i], measurements, only_position),
+                    rtol=RTOL, atol=ATOL)
+
+
+class TrackerKalmanTest(unittest.TestCase):
+    ''' Tracker.predict and Tracker.update against Track.predict and Track.update '''
+
+    def test_matches_per_track_steps(self):
+        rng = np.random.default_rng(1)
+        tracker = Tracker(None, n_init=2)
+        num_people = 8
+        num_updates = 0
+        positions = np.c_[np.arange(num_people) * 80. + 10, rng.random(num_people) * 300]
+        for frame in range(12):
+            positions += rng.normal(0, 2, positions.shape)
+            rows = np.flatnonzero(rng.random(num_people) > 0.2)
+            tlwh = np.c_[positions[rows], np.tile([40., 100.], (len(rows), 1))]
+            detections = [Detection(bbox, None) for bbox in tlwh]
+
+            reference = copy.deepcopy(tracker.tracks)
+            for track in reference:
+                track.predict(tracker.kf)
+            tracker.predict()
+            for track, expected in zip(tracker.tracks, reference):
+                np.testing.assert_allclose(track.mean, expected.mean, rtol=RTOL, atol=ATOL)
+                np.testing.assert_allclose(track.covariance, expected.covariance, rtol=RTOL, atol=ATOL)
+
+            predictions = FrameResult(np.zeros((len(rows), 18, 3)), tlwh)
+            tracker.update(detections, predictions)
+            detection_of = {track_id: det for track_id, det in zip(predictions.ids, detections)}
+            for expected in reference:
+                if expected.track_id in detection_of:
+                    expected.update(tracker.kf, detection_of[expected.track_id])
+            tracks = {track.track_id: track for track in tracker.tracks}
+            for expected in reference:
+                if expected.track_id in tracks and expected.track_id in detection_of:
+                    track = tracks[expected.track_id]
+                    num_updates += 1
+                    np.testing.assert_allclose(track.mean, expected.mean, rtol=RTOL, atol=1e-7)
+                    np.testing.assert_allclose(
+                        track.covariance, expected.covariance, rtol=RTOL, atol=1e-7)
+        self.assertGreater(num_updates, 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
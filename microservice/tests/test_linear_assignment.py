@@ -0,0 +1,220 @@
+import types
+import unittest
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from app.src.lib.tracker.deepsort.sort import kalman_filter, linear_assignment
+from app.src.lib.tracker.deepsort.sort.detection import Detection
+from app.src.lib.tracker.deepsort.sort.track import Track
+
+
+def random_tracks(rng, kf, num_tracks, extent=600):
+    tracks = []
+    for track_id in range(1, num_tracks + 1):
+        mean, covariance = kf.initiate(
+            np.r_[rng.random(2) * extent, 0.4, 100 + rng.random() * 100])
+        for _ in range(rng.integers(1, 4)):
+            mean, covariance = kf.predict(mean, covariance)
+        tracks.append(Track(mean, covariance, track_id, 3, 30))
+    return tracks
+
+
+def random_detections(rng, num_detections, extent=600):
+    return [Detection(np.r_[rng.random(2) * extent, 40 + rng.random(2) * [20, 100]], np.zeros(4))
+            for _ in range(num_detections)]
+
+
+class GatingTest(unittest.TestCase):
+    ''' Vectorized gating against the per-track KalmanFilter.gating_distance loop '''
+
+    def test_gating_distance_matrix(self):
+        rng = np.random.default_rng(0)
+        kf = kalman_filter.KalmanFilter()
+        for _ in range(50):
+            tracks = random_tracks(rng, kf, rng.integers(0, 30))
+            detections = random_detections(rng, rng.integers(0, 30))
+            track_indices = list(range(len(tracks)))
+            detection_indices = list(range(len(detections)))
+            measurements = np.asarray(
+                [d.to_xyah() for d in detections]).reshape(-1, 4)
+            for only_position in (False, True):
+                distance = linear_assignment.gating_distance_matrix(
+                    kf, tracks, detections, track_indices, detection_indices, only_position)
+                expected = np.zeros((len(tracks), len(detections)))
+                for row, track in enumerate(tracks):
+                    if len(detections):
+                        expected[row] = kf.gating_distance(
+                            track.mean, track.covariance, measurements, only_position)
+                np.testing.assert_allclose(distance, expected, rtol=1e-9, atol=1e-9)
+
+                cost_matrix = linear_assignment.gate_cost_matrix(
+                    kf, rng.random((len(tracks), len(detections))), tracks, detections,
+                    track_indices, detection_indices, only_position=only_position)
+                gating_threshold = kalman_filter.chi2inv95[2 if only_position else 4]
+                np.testing.assert_array_equal(
+                    cost_matrix == linear_assignment.INFTY_COST, expected > gating_threshold)
+
+
+def reference_min_cost_matching(cost_matrix, max_distance, track_indices, detection_indices):
+    ''' Assignment bookkeeping with list membership scans, as before the cascade rewrite '''
+    cost_matrix = cost_matrix.copy()
+    cost_matrix[cost_matrix > max_distance] = max_distance + 1e-5
+    row_indices, col_indices = linear_sum_assignment(cost_matrix)
+    matches = []
+    unmatched_tracks = [k for row, k in enumerate(track_indices) if row not in row_indices]
+    unmatched_detections = [
+        k for col, k in enumerate(detection_indices) if col not in col_indices]
+    for row, col in zip(row_indices, col_indices):
+        if cost_matrix[row, col] > max_distance:
+            unmatched_tracks.append(track_indices[row])
+            unmatched_detections.append(detection_indices[col])
+        else:
+            matches.append((track_indices[row], detection_indices[col]))
+    return matches, unmatched_tracks, unmatched_detections
+
+
+def reference_matching_cascade(cost_table, max_distance, cascade_depth, tracks,
+                               track_indices, detection_indices):
+    ''' Cascade visiting every age level and building the cost of every level anew '''
+    unmatched_detections = detection_indices
+    matches = []
+    for level in range(cascade_depth):
+        if len(unmatched_detections) == 0:
+            break
+        track_indices_l = [
+            k for k in track_indices if tracks[k].time_since_update == 1 + level]
+        if len(track_indices_l) == 0:
+            continue
+        matches_l, _, unmatched_detections = reference_min_cost_matching(
+            cost_table[np.ix_(track_indices_l, unmatched_detections)], max_distance,
+            track_indices_l, unmatched_detections)
+        matches += matches_l
+    unmatched_tracks = list(set(track_indices) - set(k for k, _ in matches))
+    return matches, unmatched_tracks, unmatched_detections
+
+
+def random_cost_table(rng, num_tracks, num_detections, ties=False):
+    ''' Appearance costs with infeasible pairs, rounded to create tied costs '''
+    cost_table = rng.random((num_tracks, num_detections)) * 0.4
+    cost_table[rng.random(cost_table.shape) < 0.3] = linear_assignment.INFTY_COST
+    return np.round(cost_table, 1) if ties else cost_table
+
+
+class MatchingCascadeTest(unittest.TestCase):
+    ''' Cascade on a cost matrix computed once against the per-level reference '''
+
+    def test_matches_reference(self):
+        rng = np.random.default_rng(0)
+        max_distance = 0.2
+        for trial in range(1000):
+            num_tracks, num_detections = rng.integers(0, 25, size=2)
+            tracks = [types.SimpleNamespace(time_since_update=int(age))
+                      for age in rng.integers(1, 6, size=num_tracks)]
+            cost_table = random_cost_table(rng, num_tracks, num_detections, ties=trial % 3 == 0)
+            metric = lambda tracks, dets, rows, cols: cost_table[np.ix_(rows, cols)]
+            track_indices = sorted(rng.choice(
+                num_tracks, size=rng.integers(0, num_tracks + 1), replace=False).tolist())
+            detection_indices = list(range(num_detections))
+            cascade_depth = int(rng.integers(1, 7))
+
+            matches, unmatched_tracks, unmatched_detections = linear_assignment.matching_cascade(
+                metric, max_distance, cascade_depth, tracks, [None] * num_detections,
+                track_indices, detection_indices)
+            expected = reference_matching_cascade(
+                cost_table, max_distance, cascade_depth, tracks, track_indices,
+                detection_indices)
+            self.assertEqual(matches, expected[0])
+            self.assertEqual(sorted(unmatched_tracks), sorted(expected[1]))
+            self.assertEqual(list(unmatched_detections), list(expected[2]))
+
+            matches, unmatched_tracks, unmatched_detections = linear_assignment.min_cost_matching(
+                metric, max_distance, tracks, [None] * num_detections, track_indices,
+                detection_indices)
+            if len(track_indices) and num_detections:
+                expected = reference_min_cost_matching(
+                    cost_table[np.ix_(track_indices, detection_indices)], max_distance,
+                    track_indices, detection_indices)
+                self.assertEqual(matches, expected[0])
+                self.assertEqual(list(unmatched_tracks), expected[1])
+                self.assertEqual(list(unmatched_detections), expected[2])
+
+
+def dense_cost_matrix(rows, cols, costs, shape):
+    cost_matrix = np.full(shape, linear_assignment.INFTY_COST)
+    cost_matrix[rows, cols] = costs
+    return cost_matrix
+
+
+def random_pairs(rng, num_tracks, num_detections, density=0.2):
+    is_pair = rng.random((num_tracks, num_detections)) < density
+    rows, cols = np.nonzero(is_pair)
+    return rows, cols, rng.random(len(rows)) * 0.3
+
+
+class SparseMatchingTest(unittest.TestCase):
+    ''' Matching on sparse candidate pairs against the dense cost matrix '''
+
+    def test_min_cost_matching_sparse(self):
+        rng = np.random.default_rng(0)
+        max_distance = 0.2
+        for _ in range(500):
+            num_tracks, num_detections = rng.integers(1, 30, size=2)
+            rows, cols, costs = random_pairs(rng, num_tracks, num_detections)
+            track_indices = list(range(100, 100 + num_tracks))
+            detection_indices = list(range(200, 200 + num_detections))
+            cost_matrix = dense_cost_matrix(rows, cols, costs, (num_tracks, num_detections))
+
+            matches, unmatched_tracks, unmatched_detections = \
+                linear_assignment.min_cost_matching_sparse(
+                    rows, cols, costs, max_distance, track_indices, detection_indices)
+            cost_matrix[cost_matrix > max_distance] = max_distance + 1e-5
+            expected = linear_assignment.min_cost_matching_from_cost(
+                cost_matrix, max_distance, track_indices, detection_indices)
+            self.assertEqual(sorted(matches), sorted(expected[0]))
+            self.assertEqual(sorted(unmatched_tracks), sorted(expected[1]))
+            self.assertEqual(sorted(unmatched_detections), sorted(expected[2]))
+
+    def test_matching_cascade_sparse(self):
+        rng = np.random.default_rng(1)
+        max_distance, cascade_depth = 0.2, 5
+        for _ in range(500):
+            num_tracks, num_detections = rng.integers(1, 30, size=2)
+            tracks = [types.SimpleNamespace(time_since_update=int(age))
+                      for age in rng.integers(1, 7, size=num_tracks)]
+            track_indices = list(range(num_tracks))
+            detection_indices = list(range(num_detections))
+            rows, cols, costs = random_pairs(rng, num_tracks, num_detections)
+            cost_matrix = dense_cost_matrix(rows, cols, costs, (num_tracks, num_detections))
+            metric = lambda tracks, dets, rows, cols: cost_matrix[np.ix_(rows, cols)]
+
+            matches, unmatched_tracks, unmatched_detections = \
+                linear_assignment.matching_cascade_sparse(
+                    rows, cols, costs, max_distance, cascade_depth, tracks, track_indices,
+                    detection_indices)
+            expected = linear_assignment.matching_cascade(
+                metric, max_distance, cascade_depth, tracks, [None] * num_detections,
+                track_indices, detection_indices)
+            self.assertEqual(sorted(matches), sorted(expected[0]))
+            self.assertEqual(sorted(unmatched_tracks), sorted(expected[1]))
+            self.assertEqual(sorted(unmatched_detections), sorted(expected[2]))
+
+    def test_gated_pairs(self):
+        rng = np.random.default_rng(2)
+        kf = kalman_filter.KalmanFilter()
+        for _ in range(50):
+            tracks = random_tracks(rng, kf, rng.integers(0, 40), extent=300)
+            detections = random_detections(rng, rng.integers(0, 40), extent=300)
+            track_indices = list(range(len(tracks)))
+            detection_indices = list(range(len(detections)))
+            rows, cols = linear_assignment.gated_pairs(
+                kf, tracks, detections, track_indices, detection_indices)
+            distance = linear_assignment.gating_distance_matrix(
+                kf, tracks, detections, track_indices, detection_indices)
+            expected = np.argwhere(distance <= kalman_filter.chi2inv95[4])
+            self.assertEqual(sorted(zip(rows.tolist(), cols.tolist())),
+                             sorted(map(tuple, expected.tolist())))
+
+
+if __name__ == '__main__':
+    unittest.main()
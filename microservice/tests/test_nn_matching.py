@@ -0,0 +1,42 @@
+import unittest
+
+import numpy as np
+
+from app.src.lib.tracker.deepsort.sort.nn_matching import (
+    NearestNeighborDistanceMetric, compare_storage)
+
+MATCHING_THRESHOLD = 0.2
+
+
+def clustered_features(rng, num_targets=20, num_samples=50, num_queries=100, dim=512):
+    ''' Reid-like features: a center per identity plus noise '''
+    centers = rng.normal(size=(num_targets, dim))
+    noise = lambda n: 0.5 * rng.normal(size=(n, dim))
+    samples = {target + 1: (centers[target] + noise(num_samples)).astype(np.float32)
+               for target in range(num_targets)}
+    queries = centers[rng.integers(0, num_targets, num_queries)] + noise(num_queries)
+    return samples, queries.astype(np.float32)
+
+
+class CompareStorageTest(unittest.TestCase):
+    ''' Compact gallery storage against float32 match decisions '''
+
+    def test_compact_storage_keeps_matches(self):
+        samples, queries = clustered_features(np.random.default_rng(0))
+        # the decisions are not trivial: every query matches its own identity only
+        reference = NearestNeighborDistanceMetric('cosine', MATCHING_THRESHOLD, None)
+        for target, target_samples in samples.items():
+            reference.partial_fit(target_samples, [target] * len(target_samples), list(samples))
+        is_match = reference.distance(queries, list(samples)) <= MATCHING_THRESHOLD
+        np.testing.assert_array_equal(is_match.sum(axis=0), 1)
+
+        for storage, max_error in (('float16', 1e-3), ('int8', 1e-2)):
+            result = compare_storage(samples, queries, MATCHING_THRESHOLD, storage)
+            self.assertEqual(result["flipped"], 0, storage)
+            self.assertLess(result["max_abs_error"], max_error, storage)
+            self.assertLess(result["memory"]["used_bytes"],
+                            result["reference_memory"]["used_bytes"], storage)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import itertools
+import random
+import threading
+import time
+import unittest
+
+from app.src.lib.utils.pipeline import FramePipeline, Stage
+
+
+def run_pipeline(pipeline, timeout=10):
+    ''' run the pipeline in a thread, fail if it hangs, return the error it raised '''
+    outcome = {}
+
+    def target():
+        try:
+            pipeline.run()
+        except BaseException as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise AssertionError('pipeline did not shut down')
+    return outcome.get('error')
+
+
+def pipeline_threads():
+    return [t for t in threading.enumerate() if t.name.startswith('pipeline-')]
+
+
+def jittered(fn, seed, max_delay=0.005):
+    ''' worker sleeping a random time, so parallel workers finish frames out of order '''
+    rng = random.Random(seed)
+
+    def work(item):
+        time.sleep(rng.uniform(0, max_delay))
+        return fn(item)
+    return work
+
+
+class FramePipelineTest(unittest.TestCase):
+
+    def tearDown(self):
+        self.assertEqual(pipeline_threads(), [])
+
+    def test_results_in_source_order(self):
+        results = []
+        pipeline = FramePipeline(
+            range(200),
+            [
+                Stage('inference', lambda x: x * 2),
+                Stage('render', [jittered(lambda x: x + 1, seed) for seed in range(4)]),
+            ],
+            results.append,
+            queue_size=2,
+        )
+        self.assertIsNone(run_pipeline(pipeline))
+        self.assertEqual(results, [x * 2 + 1 for x in range(200)])
+
+    def test_workers_finish_out_of_order(self):
+        finished = []
+        lock = threading.Lock()
+
+        def render(item):
+            # even frames are slow, the odd frame of the other worker finishes first
+            time.sleep(0.01 if item % 2 == 0 else 0)
+            with lock:
+                finished.append(item)
+            return item
+
+        results = []
+        pipeline = FramePipeline(range(20), [Stage('render', [render, render])], results.append)
+        self.assertIsNone(run_pipeline(pipeline))
+        self.assertNotEqual(finished, sorted(finished))
+        self.assertEqual(results, list(range(20)))
+
+    def test_empty_source(self):
+        results = []
+        pipeline = FramePipeline([], [Stage('render', [lambda x: x] * 3)], results.append)
+        self.assertIsNone(run_pipeline(pipeline))
+        self.assertEqual(results, [])
+
+    def test_stage_error_is_reraised(self):
+        def infer(item):
+            if item == 5:
+                raise ValueError('bad frame')
+            return item
+
+        results = []
+        # the source never ends, the error has to stop it
+        pipeline = FramePipeline(
+            itertools.count(),
+            [Stage('inference', infer), Stage('render', [lambda x: x] * 2)],
+            results.append,
+            queue_size=1,
+        )
+        error = run_pipeline(pipeline)
+        self.assertIsInstance(error, ValueError)
+        self.assertEqual(str(error), 'bad frame')
+        self.assertEqual(results, list(range(len(results))))
+        self.assertLessEqual(len(results), 5)
+
+    def test_source_and_sink_errors_are_reraised(self):
+        def source():
+            yield from range(3)
+            raise OSError('video read failed')
+
+        error = run_pipeline(FramePipeline(source(), [Stage('render', lambda x: x)], lambda x: None))
+        self.assertIsInstance(error, OSError)
+
+        def sink(item):
+            if item == 2:
+                raise RuntimeError('encoder failed')
+
+        error = run_pipeline(FramePipeline(
+            itertools.count(), [Stage('render', [lambda x: x] * 2)], sink, queue_size=1))
+        self.assertIsInstance(error, RuntimeError)
+
+
+if __name__ == '__main__':
+    unittest.main()
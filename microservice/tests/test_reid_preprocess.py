@@ -0,0 +1,116 @@
+import unittest
+
+import numpy as np
+import torch
+from PIL import Image
+from torchvision import transforms
+
+from app.src.lib.tracker.deepsort.reid_preprocess import ReidPreprocessor
+
+try:
+    from app.src.lib.tracker.deepsort.reid_feature_extractor import FeatureExtractor
+except (ImportError, RuntimeError):  # needs a cuda device and the reid dependencies
+    FeatureExtractor = None
+
+SIZE = (256, 128)
+MEAN = [0.1736, 0.1613, 0.1606]
+STD = [0.1523, 0.1429, 0.1443]
+
+
+def reference_batch(crops):
+    ''' per crop torchvision transform the reid models were trained with '''
+    tfms = transforms.Compose([
+        transforms.Resize(SIZE),
+        transforms.ToTensor(),
+        transforms.Normalize(MEAN, STD)
+    ])
+    return torch.stack([tfms(Image.fromarray(crop)) for crop in crops]).numpy()
+
+
+def random_crops(rng, num_crops):
+    ''' smaller and larger crops than the model input, with texture '''
+    return [rng.integers(0, 256, (rng.integers(40, 400), rng.integers(20, 200), 3), dtype=np.uint8)
+            for _ in range(num_crops)]
+
+
+class ReidPreprocessorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        self.preprocessor = ReidPreprocessor(SIZE, MEAN, STD)
+
+    def test_matches_training_transform(self):
+        crops = random_crops(self.rng, 12)
+        batch = self.preprocessor(crops)
+        self.assertEqual(batch.shape, (12, 3) + SIZE)
+        self.assertEqual(batch.dtype, np.float32)
+        np.testing.assert_allclose(batch, reference_batch(crops), atol=1e-5)
+
+    def test_from_images_matches_crops(self):
+        images = [self.rng.integers(0, 256, (240, 320, 3), dtype=np.uint8) for _ in range(3)]
+        boxes = [np.array([[10, 20, 60, 200], [100, 0, 320, 240]]),
+                 np.zeros((0, 4)),
+                 np.array([[5, 5, 25, 45]])]
+        crops = [image[y1:y2, x1:x2] for image, image_boxes in zip(images, boxes)
+                 for x1, y1, x2, y2 in image_boxes.astype(int)]
+        batch = self.preprocessor.from_images(images, boxes)
+        np.testing.assert_allclose(batch, reference_batch(crops), atol=1e-5)
+
+    def test_buffer_reuse_does_not_leak_rows(self):
+        # shrinking, growing past the capacity and shrinking again reuse the buffers
+        for num_crops in (5, 2, 20, 3, 0):
+            crops = random_crops(self.rng, num_crops)
+            batch = self.preprocessor(crops)
+            self.assertEqual(len(batch), num_crops)
+            if num_crops:
+                np.testing.assert_allclose(batch, reference_batch(crops), atol=1e-5)
+                fresh = ReidPreprocessor(SIZE, MEAN, STD)(crops)
+                np.testing.assert_array_equal(batch, fresh)
+
+    def test_boxes_are_clipped(self):
+        image = self.rng.integers(0, 256, (100, 80, 3), dtype=np.uint8)
+        batch = self.preprocessor.from_image(image, [[-10, -5, 40, 300], [79, 99, 79, 99]])
+        expected = reference_batch([image[0:100, 0:40], image[99:100, 79:80]])
+        np.testing.assert_allclose(batch, expected, atol=1e-5)
+
+
+class FakeReidModel(torch.nn.Module):
+    ''' per channel means of the upper and lower halves, a stand in for the reid network '''
+
+    def forward(self, x):
+        upper, lower = x.chunk(2, dim=2)
+        return torch.cat([upper.mean(dim=(2, 3)), lower.mean(dim=(2, 3))], dim=1)
+
+
+@unittest.skipIf(FeatureExtractor is None, 'reid feature extractor needs cuda')
+class ExtractManyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        extractor = FeatureExtractor.__new__(FeatureExtractor)
+        extractor.is_trt = False
+        extractor.extractor = FakeReidModel().to('cuda')
+        extractor.preprocessor = ReidPreprocessor(SIZE, MEAN, STD)
+        self.extractor = extractor
+
+    def test_matches_extract_per_image(self):
+        images = [self.rng.integers(0, 256, (240, 320, 3), dtype=np.uint8) for _ in range(4)]
+        boxes = [np.array([[10, 20, 60, 200], [100, 0, 320, 240]]),
+                 np.zeros((0, 4)),
+                 np.array([[5, 5, 25, 45]]),
+                 np.array([[0, 0, 320, 240], [50, 50, 90, 200], [200, 10, 260, 100]])]
+        features = self.extractor.extract_many(images, boxes)
+        self.assertEqual([len(f) for f in features], [2, 0, 1, 3])
+        for image, image_boxes, image_features in zip(images, boxes, features):
+            if len(image_boxes):
+                np.testing.assert_allclose(
+                    image_features, self.extractor.extract(image, image_boxes), atol=1e-5)
+
+    def test_no_boxes(self):
+        images = [self.rng.integers(0, 256, (240, 320, 3), dtype=np.uint8) for _ in range(2)]
+        features = self.extractor.extract_many(images, [np.zeros((0, 4)), np.zeros((0, 4))])
+        self.assertEqual([len(f) for f in features], [0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
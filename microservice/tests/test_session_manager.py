@@ -0,0 +1,156 @@
+import importlib.util
+import time
+import types
+import unittest
+
+# the registry imports trt_pose, only installed on the inference hosts. A failed
+# import would leave the pose estimation packages half imported for other tests
+if importlib.util.find_spec('trt_pose') is not None:
+    from app.src.session_manager import (
+        CLOSE_GOING_AWAY, CLOSE_TRY_AGAIN_LATER, SessionManager)
+else:
+    SessionManager = None
+
+
+class FakeWebSocket:
+    ''' records the close codes, optionally fails to close like a dropped connection '''
+
+    def __init__(self, fail_close=False):
+        self.fail_close = fail_close
+        self.close_codes = []
+
+    async def close(self, code=1000):
+        self.close_codes.append(code)
+        if self.fail_close:
+            raise RuntimeError('connection already closed')
+
+
+class FakeWorker:
+    response_mode = 'keypoints'
+
+    def __init__(self):
+        self.num_closed = 0
+
+    def close(self):
+        self.num_closed += 1
+
+    def stats(self):
+        return {"frames_received": 3}
+
+
+class FakeTracker:
+    ''' tracker of a session with one confirmed and one tentative track '''
+
+    def __init__(self):
+        self.tracker = types.SimpleNamespace(tracks=[
+            types.SimpleNamespace(is_confirmed=lambda: True),
+            types.SimpleNamespace(is_confirmed=lambda: False),
+        ])
+
+    def gallery_memory_usage(self):
+        return 1024
+
+    def reid_stats(self):
+        return {"extracted": 5, "reused": 2}
+
+
+@unittest.skipIf(SessionManager is None, 'trt_pose is not installed')
+class SessionManagerTest(unittest.IsolatedAsyncioTestCase):
+
+    def open_with_worker(self, manager, model_name='skeleton'):
+        session = manager.open(FakeWebSocket(), model_name)
+        session.worker = FakeWorker()
+        session.components = {'tracker': FakeTracker()}
+        return session
+
+    async def test_admission_limit(self):
+        manager = SessionManager(max_sessions=2)
+        first = await manager.admit(FakeWebSocket(), 'skeleton')
+        second = await manager.admit(FakeWebSocket(), 'skeleton')
+        self.assertIsNotNone(first)
+        self.assertIsNotNone(second)
+        self.assertNotEqual(first.id, second.id)
+
+        rejected = FakeWebSocket()
+        self.assertIsNone(await manager.admit(rejected, 'skeleton'))
+        self.assertEqual(rejected.close_codes, [CLOSE_TRY_AGAIN_LATER])
+        self.assertEqual(len(manager), 2)
+
+        # a closed session frees its slot
+        manager.close(first.id)
+        websocket = FakeWebSocket()
+        self.assertIsNotNone(await manager.admit(websocket, 'skeleton'))
+        self.assertEqual(websocket.close_codes, [])
+
+    async def test_no_limit(self):
+        manager = SessionManager()
+        for _ in range(50):
+            self.assertIsNotNone(await manager.admit(FakeWebSocket(), 'skeleton'))
+        self.assertEqual(len(manager), 50)
+
+    async def test_evict_idle(self):
+        manager = SessionManager(idle_timeout=10)
+        idle, active = self.open_with_worker(manager), self.open_with_worker(manager)
+        idle.last_activity = time.time() - 20
+        # a dropped connection fails to close, eviction goes on
+        dropped = self.open_with_worker(manager)
+        dropped.websocket.fail_close = True
+        dropped.last_activity = time.time() - 30
+
+        evicted = await manager.evict_idle()
+        self.assertEqual(sorted(evicted), sorted([idle.id, dropped.id]))
+        self.assertEqual(list(manager.sessions), [active.id])
+        for session in (idle, dropped):
+            self.assertEqual(session.websocket.close_codes, [CLOSE_GOING_AWAY])
+            self.assertEqual(session.worker.num_closed, 1)
+            self.assertIsNone(session.components)
+        self.assertEqual(active.websocket.close_codes, [])
+        self.assertEqual(active.worker.num_closed, 0)
+
+        self.assertEqual(await manager.evict_idle(), [])
+
+    async def test_evict_without_timeout(self):
+        manager = SessionManager()
+        session = self.open_with_worker(manager)
+        session.last_activity = 0
+        self.assertEqual(await manager.evict_idle(), [])
+        self.assertEqual(len(manager), 1)
+
+    async def test_close_is_idempotent(self):
+        manager = SessionManager()
+        session = self.open_with_worker(manager)
+        self.assertIs(manager.close(session.id), session)
+        self.assertIsNone(manager.close(session.id))
+        self.assertIsNone(manager.close('unknown'))
+        self.assertEqual(session.worker.num_closed, 1)
+        self.assertIsNone(session.tracker)
+        self.assertEqual(len(manager), 0)
+        # the route closes a session that never started a worker
+        unstarted = manager.open(FakeWebSocket(), 'skeleton')
+        self.assertIs(manager.close(unstarted.id), unstarted)
+
+    async def test_stats(self):
+        manager = SessionManager(max_sessions=4)
+        session = self.open_with_worker(manager, 'emotion')
+        manager.open(FakeWebSocket(), 'skeleton')
+
+        stats = manager.stats()
+        self.assertEqual(stats['active_sessions'], 2)
+        self.assertEqual(stats['max_sessions'], 4)
+        by_id = {s['id']: s for s in stats['sessions']}
+        session_stats = by_id[session.id]
+        self.assertEqual(session_stats['model_name'], 'emotion')
+        self.assertEqual(session_stats['response_mode'], 'keypoints')
+        self.assertEqual(session_stats['tracks_alive'], 1)
+        self.assertEqual(session_stats['gallery_memory'], 1024)
+        self.assertEqual(session_stats['reid'], {"extracted": 5, "reused": 2})
+        self.assertEqual(session_stats['frames_received'], 3)
+
+        unstarted_stats = [s for s in stats['sessions'] if s['id'] != session.id][0]
+        self.assertIsNone(unstarted_stats['response_mode'])
+        self.assertEqual(unstarted_stats['tracks_alive'], 0)
+        self.assertIsNone(unstarted_stats['gallery_memory'])
+
+
+if __name__ == '__main__':
+    unittest.main()
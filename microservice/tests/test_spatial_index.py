@@ -0,0 +1,44 @@
+import unittest
+
+import numpy as np
+
+from app.src.lib.tracker.deepsort.sort import spatial_index
+
+
+def random_tlwh(rng, num_boxes, extent=1000):
+    return np.c_[rng.random((num_boxes, 2)) * extent, rng.uniform(10, 150, (num_boxes, 2))]
+
+
+class SpatialIndexTest(unittest.TestCase):
+    ''' Grid queries against brute force over all pairs '''
+
+    def test_points_in_boxes(self):
+        rng = np.random.default_rng(0)
+        for _ in range(100):
+            tlwh = random_tlwh(rng, rng.integers(0, 50))
+            boxes = np.c_[tlwh[:, :2], tlwh[:, :2] + tlwh[:, 2:]]
+            points = rng.random((rng.integers(0, 80), 2)) * 1000
+            rows, cols = spatial_index.points_in_boxes(boxes, points)
+
+            inside = np.all((points[None] >= boxes[:, None, :2]) &
+                            (points[None] <= boxes[:, None, 2:]), axis=2)
+            self.assertEqual(sorted(zip(rows.tolist(), cols.tolist())),
+                             sorted(map(tuple, np.argwhere(inside).tolist())))
+
+    def test_overlapping_pairs(self):
+        rng = np.random.default_rng(1)
+        for _ in range(100):
+            bboxes = random_tlwh(rng, rng.integers(0, 50))
+            candidates = random_tlwh(rng, rng.integers(0, 50))
+            rows, cols = spatial_index.overlapping_pairs(bboxes, candidates)
+
+            tl = np.maximum(bboxes[:, None, :2], candidates[None, :, :2])
+            br = np.minimum(bboxes[:, None, :2] + bboxes[:, None, 2:],
+                            candidates[None, :, :2] + candidates[None, :, 2:])
+            overlap = np.all(br > tl, axis=2)
+            self.assertEqual(sorted(zip(rows.tolist(), cols.tolist())),
+                             sorted(map(tuple, np.argwhere(overlap).tolist())))
+
+
+if __name__ == '__main__':
+    unittest.main()
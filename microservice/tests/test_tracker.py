@@ -0,0 +1,61 @@
+import sys
+import unittest
+
+import numpy as np
+
+from app.src.lib.tracker import get_tracker, get_tracker_name
+from app.src.lib.tracker.sort.sort import Sort
+from app.src.lib.tracker.deepsort.sort.detection import Detection
+from app.src.lib.tracker.deepsort.sort.nn_matching import NearestNeighborDistanceMetric
+from app.src.lib.tracker.deepsort.sort.tracker import Tracker
+from app.src.lib.utils.annotation import FrameResult
+
+
+class InitiateTrackTest(unittest.TestCase):
+
+    def test_reused_feature_does_not_seed_new_track(self):
+        tracker = Tracker(NearestNeighborDistanceMetric('cosine', 0.2, 100))
+        tlwh = np.array([[10., 10., 40., 100.], [300., 10., 40., 100.]])
+        features = np.eye(2, 8, dtype=np.float32)
+        detections = [Detection(tlwh[0], features[0]),
+                      Detection(tlwh[1], features[1], is_reused_feature=True)]
+        tracker.predict()
+        tracker.update(detections, FrameResult(np.zeros((2, 18, 3)), tlwh))
+
+        fresh, reused = tracker.tracks
+        np.testing.assert_array_equal(fresh.last_feature, features[0])
+        self.assertEqual(len(fresh.features), 1)
+        self.assertIsNone(reused.last_feature)
+        self.assertEqual(reused.features, [])
+
+
+class SortTest(unittest.TestCase):
+
+    def test_deepsort_without_reid_is_sort(self):
+        for reid_name in ('none', None):
+            self.assertEqual(get_tracker_name('deepsort', reid_name=reid_name), 'sort')
+        self.assertEqual(get_tracker_name('deepsort', reid_name='siamesenet'), 'deepsort')
+        tracker = get_tracker('deepsort', reid_name='none', model_path='unused')
+        self.assertIsInstance(tracker, Sort)
+        self.assertIsNone(tracker.gallery_memory_usage())
+        self.assertIsNone(tracker.reid_stats())
+        # the CNN reid extractor (and CUDA) is never imported for sort
+        self.assertNotIn('app.src.lib.tracker.deepsort.reid_feature_extractor', sys.modules)
+
+    def test_tracks_without_extractor(self):
+        tracker = get_tracker('deepsort', reid_name='none', n_init=2, max_age=5)
+        image = np.zeros((480, 640, 3), dtype=np.uint8)
+        positions = np.array([[10., 10.], [200., 50.], [400., 100.]])
+        for frame in range(10):
+            positions += [3, 1]
+            # the second person is missed for one frame
+            rows = [0, 2] if frame == 5 else [0, 1, 2]
+            predictions = FrameResult(
+                np.zeros((len(rows), 18, 3)), np.c_[positions[rows], np.tile([40, 100], (len(rows), 1))])
+            tracked, _ = tracker.predict(image, predictions)
+            if frame >= 1:
+                self.assertEqual(tracked.ids.tolist(), [[1, 2, 3][row] for row in rows])
+
+
+if __name__ == '__main__':
+    unittest.main()
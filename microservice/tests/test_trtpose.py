@@ -0,0 +1,99 @@
+import unittest
+import warnings
+
+import numpy as np
+import torch
+
+try:
+    from app.src.lib.pose_estimation.trtpose.trtpose import (
+        decode_keypoints, filter_keypoints, keypoints_to_bboxes)
+except ImportError:  # trt_pose is only installed on the inference hosts
+    decode_keypoints = None
+
+NUM_PARTS, MAX_PEAKS = 18, 100
+
+
+def reference_people(counts, objects, peaks, min_total_joints, min_leg_joints, include_head,
+                     img_w, img_h):
+    ''' Per person and per joint loop of the original TrtPose.get_keypoints '''
+    people = []
+    for cnt in range(int(counts[0])):
+        keypoints = np.zeros((NUM_PARTS, 3), dtype=np.float64)
+        human = objects[0][cnt]
+        for j in range(human.shape[0]):
+            k = int(human[j])
+            keypoints[j] = (j, 0.0, 0.0)
+            if 0 <= k < peaks.shape[2]:
+                peak = peaks[0][j][k]
+                keypoints[j] = (j, float(peak[1]), float(peak[0]))
+
+        coords = keypoints[:, 1:] if include_head else keypoints[5:, 1:]
+        if np.count_nonzero(coords) < min_total_joints or \
+                np.count_nonzero(coords[-7:-1]) < min_leg_joints:
+            continue
+
+        points = np.where(keypoints[:, 1:] != 0, keypoints[:, 1:], np.nan)
+        points[:, 0] *= img_w
+        points[:, 1] *= img_h
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)  # people without any keypoint
+            xmin, ymin = np.nanmin(points, axis=0)
+            xmax, ymax = np.nanmax(points, axis=0)
+        width, height = xmax - xmin, ymax - ymin
+        new_xmin = np.clip(xmin - 0.1 * width, 0, img_w)
+        new_xmax = np.clip(xmax + 0.1 * width, 0, img_w)
+        new_ymin = np.clip(ymin - 0.1 * height, 0, img_h)
+        new_ymax = np.clip(ymax + 0.1 * height, 0, img_h)
+        bbox = [new_xmin, new_ymin, new_xmax - new_xmin, new_ymax - new_ymin]
+        people.append((keypoints, None if bbox[2] < 1 or bbox[3] < 1 else bbox))
+    return people
+
+
+def random_parser_output(rng, count, missing=0.3):
+    ''' ParseObjects-like (counts, objects, peaks), with missing and out of range peak indices '''
+    objects = np.full((1, MAX_PEAKS, NUM_PARTS), -1, dtype=np.int32)
+    objects[0, :count] = rng.integers(0, 5, (count, NUM_PARTS))
+    objects[0, :count][rng.random((count, NUM_PARTS)) < missing] = -1
+    objects[0, :count][rng.random((count, NUM_PARTS)) < 0.02] = MAX_PEAKS + 3
+    peaks = rng.random((1, NUM_PARTS, MAX_PEAKS, 2)).astype(np.float32)
+    # some people collapse to a single point (bbox under 1 pixel) or have no joints at all
+    peaks[0, :, 4] = 0.5
+    if count > 2:
+        objects[0, 0] = 4
+        objects[0, 1] = -1
+    return (torch.tensor([count], dtype=torch.int32), torch.from_numpy(objects),
+            torch.from_numpy(peaks))
+
+
+@unittest.skipIf(decode_keypoints is None, 'trt_pose is not installed')
+class KeypointsDecodingTest(unittest.TestCase):
+    ''' Vectorized decode, filter and bbox path against the per-object loop '''
+
+    def test_matches_per_object_loop(self):
+        rng = np.random.default_rng(0)
+        img_w, img_h = 640, 480
+        for trial in range(300):
+            count = 0 if trial % 10 == 0 else int(rng.integers(1, 12))
+            counts, objects, peaks = random_parser_output(rng, count)
+            min_total_joints, min_leg_joints = int(rng.integers(0, 12)), int(rng.integers(0, 4))
+            include_head = bool(trial % 2)
+
+            keypoints = decode_keypoints(counts, objects, peaks)
+            self.assertEqual(keypoints.shape, (count, NUM_PARTS, 3))
+            keypoints = keypoints[filter_keypoints(
+                keypoints, min_total_joints, min_leg_joints, include_head)]
+            bboxes, is_valid = keypoints_to_bboxes(keypoints, img_w, img_h)
+
+            expected = reference_people(counts.numpy(), objects.numpy(), peaks.numpy(),
+                                        min_total_joints, min_leg_joints, include_head,
+                                        img_w, img_h)
+            self.assertEqual(len(keypoints), len(expected))
+            for idx, (expected_keypoints, expected_bbox) in enumerate(expected):
+                np.testing.assert_array_equal(keypoints[idx], expected_keypoints)
+                self.assertEqual(is_valid[idx], expected_bbox is not None)
+                if expected_bbox is not None:
+                    np.testing.assert_array_equal(bboxes[idx], expected_bbox)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,6 @@ from channels.generic.websocket import AsyncWebsocketConsumer
 import json
 import asyncio
 import aiohttp
-import base64
 
 class CameraConsumer(AsyncWebsocketConsumer):
     async def connect(self):
@@ -14,6 +13,10 @@ class CameraConsumer(AsyncWebsocketConsumer):
         # Подключиться к FastAPI сервису
         try:
             self.backend_url = f"ws://microservice:9000/ws/camera/{self.model_name}"
+            # параметры подключения (например, response=keypoints) передаются сервису как есть
+            query_string = self.scope.get('query_string', b'').decode()
+            if query_string:
+                self.backend_url += f"?{query_string}"
             self.session = aiohttp.ClientSession()
             self.backend_ws = await self.session.ws_connect(self.backend_url)
             
@@ -58,11 +61,8 @@ class CameraConsumer(AsyncWebsocketConsumer):
                 if msg.type == aiohttp.WSMsgType.TEXT:
                     await self.send(text_data=msg.data)
                 elif msg.type == aiohttp.WSMsgType.BINARY:
-                    # Обработка бинарных данных (фреймы видео)
-                    frame_base64 = base64.b64encode(msg.data).decode('utf-8')
-                    await self.send(text_data=json.dumps({
-                        "frame": frame_base64
-                    }))
+                    # Сообщения бинарного протокола кадров передаются клиенту как есть
+                    await self.send(bytes_data=msg.data)
                 elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
                     break
         except Exception as e:
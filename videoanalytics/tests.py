@@ -1 +1,68 @@
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase
+
+from .utils import frame_protocol
+
+
+class FrameProtocolTests(SimpleTestCase):
+    """Бинарный протокол кадров WebSocket камеры."""
+
+    def test_layout(self):
+        self.assertEqual(frame_protocol.HEADER_SIZE, 20)
+        self.assertEqual(frame_protocol.KEYPOINTS_HEADER.size, 6)
+        self.assertEqual(frame_protocol.PERSON_DTYPE.itemsize, 88)
+
+    def test_message_round_trip(self):
+        payload = bytes(range(256)) * 4
+        message = frame_protocol.pack_message(
+            frame_protocol.FRAME_JPEG, 42, payload, timestamp=1700000000.25)
+        self.assertEqual(len(message), frame_protocol.HEADER_SIZE + len(payload))
+
+        header, unpacked = frame_protocol.unpack_message(message)
+        self.assertEqual(header, frame_protocol.FrameHeader(
+            frame_protocol.VERSION, frame_protocol.FRAME_JPEG, 42, 1700000000.25, len(payload)))
+        self.assertEqual(bytes(unpacked), payload)
+
+    def test_json_round_trip(self):
+        data = {"Classes": ["walk", "stand"], "fps": 12.5}
+        header, payload = frame_protocol.unpack_message(
+            frame_protocol.pack_json(frame_protocol.METADATA, 7, data))
+        self.assertEqual(header.msg_type, frame_protocol.METADATA)
+        self.assertEqual(header.seq, 7)
+        self.assertEqual(frame_protocol.unpack_json(payload), data)
+
+    def test_seq_wraps_around(self):
+        header, _ = frame_protocol.unpack_message(
+            frame_protocol.pack_message(frame_protocol.FRAME_JPEG, 2**32 + 5, b''))
+        self.assertEqual(header.seq, 5)
+
+    def test_invalid_messages(self):
+        message = frame_protocol.pack_message(frame_protocol.FRAME_JPEG, 1, b'jpeg')
+        for invalid in (message[:10], b'XX' + message[2:], message[:2] + b'\x09' + message[3:],
+                        message + b'tail'):
+            with self.assertRaises(frame_protocol.ProtocolError):
+                frame_protocol.unpack_message(invalid)
+
+    def test_people_round_trip(self):
+        rng = np.random.default_rng(0)
+        people = np.zeros(3, dtype=frame_protocol.PERSON_DTYPE)
+        people['id'] = [1, 2, 30]
+        people['bbox'] = rng.integers(0, 1280, (3, 4))
+        people['keypoints'] = rng.integers(-1, 720, (3, 18, 2))
+        people['action'] = [0, -1, 5]
+        people['score'] = [65535, 0, 32768]
+
+        message = frame_protocol.pack_message(
+            frame_protocol.KEYPOINTS, 3, frame_protocol.pack_people(1280, 720, people))
+        header, payload = frame_protocol.unpack_message(message)
+        self.assertEqual(header.payload_len, frame_protocol.KEYPOINTS_HEADER.size + 3 * 88)
+
+        width, height, unpacked = frame_protocol.unpack_people(payload)
+        self.assertEqual((width, height), (1280, 720))
+        np.testing.assert_array_equal(unpacked, people)
+
+    def test_no_people(self):
+        payload = frame_protocol.pack_people(
+            640, 480, np.zeros(0, dtype=frame_protocol.PERSON_DTYPE))
+        width, height, people = frame_protocol.unpack_people(payload)
+        self.assertEqual((width, height, len(people)), (640, 480, 0))
@@ -4,28 +4,41 @@ import base64
 import json
 import websockets
 import time
+from collections import OrderedDict
+
 import numpy as np
 from aiohttp import ClientSession, WSMsgType
 
+from . import frame_protocol
+
 
 class WebcamStreamClient:
-    def __init__(self, websocket_url="ws://localhost:8000/ws/camera/"):
+    # кадры, ожидающие данных людей от сервера в режиме keypoints
+    max_pending_frames = 30
+
+    def __init__(self, websocket_url="ws://localhost:8000/ws/camera/", response_mode="frame"):
         """
         Клиент для передачи потока с веб-камеры на сервер обработки.
         
         Args:
             websocket_url: URL для WebSocket соединения с сервером обработки
+            response_mode: 'frame' - сервер возвращает отрисованный кадр JPEG,
+                'keypoints' - только данные людей, отрисовка выполняется клиентом
         """
         self.websocket_url = websocket_url
+        self.response_mode = response_mode
         self.running = False
         self.camera = None
         self.websocket = None
         self.current_model = 'skeleton'
+        self.classes = None
+        self._pending_frames = OrderedDict()
         
     async def connect(self, model='skeleton'):
         """Установка WebSocket соединения с сервером."""
         try:
-            self.websocket = await websockets.connect(f"{self.websocket_url}?model={model}")
+            self.websocket = await websockets.connect(
+                f"{self.websocket_url}?model={model}&response={self.response_mode}")
             print(f"Connected to {self.websocket_url} with model: {model}")
             self.current_model = model
             return True
@@ -42,12 +55,19 @@ class WebcamStreamClient:
         return True
             
     async def start_streaming(self):
-        """Запуск потоковой передачи с камеры на сервер."""
+        """Запуск потоковой передачи с камеры на сервер.
+
+        Кадры отправляются бинарными сообщениями протокола frame_protocol,
+        ответы сервера принимаются в отдельной задаче, чтобы отправка кадров
+        не ждала обработку предыдущих.
+        """
         if not self.camera or not self.websocket:
             print("Error: Camera or WebSocket connection not initialized")
             return
             
         self.running = True
+        receiver = asyncio.create_task(self.receive_results())
+        seq = 0
         try:
             while self.running:
                 # Захват кадра с камеры
@@ -56,21 +76,16 @@ class WebcamStreamClient:
                     print("Error: Cannot read from camera")
                     break
                     
-                # Кодирование и отправка кадра
+                # Кодирование и отправка кадра без base64 и JSON
                 _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-                frame_data = buffer.tobytes()
-
-                message = json.dumps({
-                    "model": self.current_model,
-                    "frame": frame_data
-                })
-                
-                # Отправка кадра на сервер
-                await self.websocket.send(frame_data)
-                
-                # Получение результатов обработки
-                response = await self.websocket.recv()
-                self.handle_server_response(response)
+                await self.websocket.send(
+                    frame_protocol.pack_message(frame_protocol.FRAME_JPEG, seq, buffer))
+                if self.response_mode == 'keypoints':
+                    # исходный кадр нужен для отрисовки ответа сервера
+                    self._pending_frames[seq] = frame
+                    while len(self._pending_frames) > self.max_pending_frames:
+                        self._pending_frames.popitem(last=False)
+                seq += 1
                 
                 # Небольшая задержка для контроля FPS
                 await asyncio.sleep(0.03)  # ~30 FPS
@@ -80,37 +95,95 @@ class WebcamStreamClient:
         except Exception as e:
             print(f"Streaming error: {e}")
         finally:
+            receiver.cancel()
             await self.stop_streaming()
+
+    async def receive_results(self):
+        """Приём ответов сервера, пока идёт стриминг."""
+        try:
+            async for response in self.websocket:
+                self.handle_server_response(response)
+                if not self.running:
+                    break
+        except websockets.exceptions.ConnectionClosed:
+            self.running = False
     
     def handle_server_response(self, response):
         """Обработка ответа от сервера."""
         try:
-            # Предполагаем, что ответ приходит в формате JSON
-            data = json.loads(response)
-            
-            # Обработка распознанных действий из логов
-            if "log" in data:
-                log_data = json.loads(data["log"])
-                print(f"Actions detected: {log_data.get('Actions', [])}")
-                
-            # Обработка обработанного кадра
-            if "frame" in data:
-                processed_frame_base64 = data["frame"]
-                processed_frame_bytes = base64.b64decode(processed_frame_base64)
-                
-                # Конвертируем байты в массив numpy
-                nparr = np.frombuffer(processed_frame_bytes, np.uint8)
-                processed_frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                
-                # Показываем обработанный кадр
-                cv2.imshow("Processed Frame", processed_frame)
-                
-                # Обработка нажатия клавиш (q для выхода)
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    self.running = False
+            if isinstance(response, str):
+                # старый формат: JSON с кадром в base64
+                self._handle_json_response(json.loads(response))
+                return
+
+            header, payload = frame_protocol.unpack_message(response)
+            latency = time.time() - header.timestamp
+            if header.msg_type == frame_protocol.METADATA:
+                log_data = frame_protocol.unpack_json(payload)
+                self.classes = log_data.get('Classes') or self.classes
+                print(f"Actions detected (frame {header.seq}, {latency * 1000:.0f} ms): "
+                      f"{log_data.get('Actions', [])}")
+            elif header.msg_type == frame_protocol.FRAME_JPEG:
+                self.show_frame(np.frombuffer(payload, np.uint8))
+            elif header.msg_type == frame_protocol.KEYPOINTS:
+                frame = self._pending_frames.pop(header.seq, None)
+                # более старые кадры сервер уже не обработает
+                for seq in [s for s in self._pending_frames if s < header.seq]:
+                    del self._pending_frames[seq]
+                if frame is not None:
+                    _, _, people = frame_protocol.unpack_people(payload)
+                    self.show_image(self.draw_people(frame, people))
+            elif header.msg_type == frame_protocol.ERROR:
+                print(f"Server error (frame {header.seq}): {frame_protocol.unpack_json(payload)}")
                     
         except Exception as e:
             print(f"Error handling server response: {e}")
+
+    def _handle_json_response(self, data):
+        # Обработка распознанных действий из логов
+        if "log" in data:
+            log_data = json.loads(data["log"])
+            print(f"Actions detected: {log_data.get('Actions', [])}")
+
+        # Обработка обработанного кадра
+        if "frame" in data:
+            processed_frame_bytes = base64.b64decode(data["frame"])
+            self.show_frame(np.frombuffer(processed_frame_bytes, np.uint8))
+
+        if "error" in data:
+            print(f"Server error: {data['error']}")
+
+    def show_frame(self, jpeg):
+        """Показывает обработанный кадр из JPEG буфера."""
+        processed_frame = cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
+        if processed_frame is None:
+            print("Error: Cannot decode processed frame")
+            return
+        self.show_image(processed_frame)
+
+    def draw_people(self, frame, people):
+        """Рисует рамки, суставы, id и действия людей из записей PERSON_DTYPE."""
+        image = frame.copy()
+        for person in people:
+            x1, y1, x2, y2 = person['bbox'].tolist()
+            cv2.rectangle(image, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            for x, y in person['keypoints'].tolist():
+                if x >= 0:
+                    cv2.circle(image, (x, y), 3, (0, 0, 255), -1)
+            label = f"{person['id']}"
+            if person['action'] >= 0 and self.classes:
+                label += f": {self.classes[person['action']]} {person['score'] / 65535:.2f}"
+            cv2.putText(image, label, (x1, max(y1 - 5, 0)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+        return image
+
+    def show_image(self, processed_frame):
+        """Показывает изображение, q завершает стриминг."""
+        cv2.imshow("Processed Frame", processed_frame)
+
+        # Обработка нажатия клавиш (q для выхода)
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            self.running = False
     
     async def stop_streaming(self):
         """Остановка стриминга и освобождение ресурсов."""